@@ -1,142 +1,658 @@
 import argparse
+import hashlib
+import json
+import os
 import re
 import sys
 from pathlib import Path
 from uuid import uuid4
 
-from openpyxl import load_workbook
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.profiling import Profiler, add_profile_arguments
+from audit_common.reader import HeaderIndex, iter_records, iter_values, open_workbook, read_header
 
 
 HEADER_ALIASES = {
     "old_name": ["old_name", "old", "原文件名", "旧文件名", "原名称", "旧名称"],
     "new_name": ["new_name", "new", "新文件名", "新名称"],
 }
+MAPPING_COLUMNS = HeaderIndex(HEADER_ALIASES)
+RULE_ALIASES = {
+    "pattern": ["pattern", "regex", "匹配规则", "正则", "原文件名规则"],
+    "replacement": ["replacement", "replace", "替换为", "新文件名规则"],
+    "prefix": ["prefix", "前缀"],
+    "suffix": ["suffix", "后缀"],
+}
+RULE_COLUMNS = HeaderIndex(RULE_ALIASES)
+RULE_SHEET = "Rules"
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+JOURNAL_NAME = ".rename_journal.jsonl"
+JOURNAL_BATCH = 256
+HASH_INDEX_NAME = ".rename_hashes.json"
+DIGEST_SIZE = 20
+# A hash in old_name needs the prefix, so a file named like one stays a file.
+CONTENT_HASH = re.compile(r"blake2:([0-9a-fA-F]{40})", re.IGNORECASE)
+HASH_BLOCK = 1 << 20
+HASH_WORKERS = 8
+
 
+def read_mapping(xlsx_path, sheet_name):
+    wb = open_workbook(xlsx_path)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.active
+        columns = MAPPING_COLUMNS.resolve(read_header(ws))
+        if not columns.has("old_name", "new_name"):
+            raise ValueError("Missing required columns: old_name/new_name (或 原文件名/新文件名)")
 
-def normalize_header(value):
+        mapping = []
+        for row_idx, row in iter_records(ws, columns):
+            if row.old_name is None and row.new_name is None:
+                continue
+            if not row.old_name or not row.new_name:
+                raise ValueError(f"Row {row_idx} has empty old_name or new_name.")
+            mapping.append((str(row.old_name).strip(), str(row.new_name).strip()))
+    finally:
+        wb.close()
+
+    return mapping
+
+
+def cell_text(value):
     if value is None:
         return ""
-    text = str(value).strip().lower()
-    text = text.replace("（", "(").replace("）", ")")
-    text = re.sub(r"\s+", "", text)
-    text = re.sub(r"[()（）\[\]【】:%/\\-]", "", text)
-    return text
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
 
 
-def find_header_index(headers, aliases):
-    alias_norms = [normalize_header(a) for a in aliases]
-    for alias in alias_norms:
-        if alias in headers:
-            return headers.index(alias)
-    for idx, header in enumerate(headers):
-        for alias in alias_norms:
-            if alias and alias in header:
-                return idx
-    return None
+class Lookups:
+    # Every sheet besides the rules is a lookup table: the first header names
+    # the regex group used as key, other headers become {placeholders}.
+    def __init__(self):
+        self.columns = {}
 
+    def add_sheet(self, ws):
+        header = [cell_text(value) for value in read_header(ws)]
+        if len(header) < 2 or not header[0]:
+            return
+        tables = {name: {} for name in header[1:] if name}
+        for _, row in iter_values(ws, width=len(header)):
+            key = cell_text(row[0])
+            for name, value in zip(header[1:], row[1:]):
+                if name and key:
+                    tables[name][key] = cell_text(value)
+        for name, table in tables.items():
+            self.columns[name] = (header[0], table)
 
-def read_mapping(xlsx_path, sheet_name):
-    wb = load_workbook(xlsx_path, data_only=True)
-    ws = wb[sheet_name] if sheet_name else wb.active
-    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-    headers = [normalize_header(value) for value in header_row]
-
-    old_idx = find_header_index(headers, HEADER_ALIASES["old_name"])
-    new_idx = find_header_index(headers, HEADER_ALIASES["new_name"])
-    if old_idx is None or new_idx is None:
-        raise ValueError("Missing required columns: old_name/new_name (或 原文件名/新文件名)")
-
-    mapping = []
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        old_val = row[old_idx]
-        new_val = row[new_idx]
-        if old_val is None and new_val is None:
+    def resolve(self, name, match, filename):
+        if name in self.columns:
+            group, table = self.columns[name]
+            try:
+                key = match.group(group)
+            except IndexError:
+                raise ValueError(f"Lookup {{{name}}} needs a (?P<{group}>...) group in the pattern.") from None
+            value = table.get(key)
+            if value is None:
+                # Numeric keys typed into Excel lose their leading zeros.
+                value = table.get(key.lstrip("0") or "0")
+            if value is None:
+                raise ValueError(f"No {name} for {group}={key} ({filename})")
+            return value
+        try:
+            return match.group(name) or ""
+        except IndexError:
+            raise ValueError(f"Unknown placeholder {{{name}}} in rule for {filename}") from None
+
+
+class RenameRule:
+    def __init__(self, row_idx, pattern, replacement, prefix, suffix):
+        try:
+            self.regex = re.compile(pattern or ".*")
+        except re.error as exc:
+            raise ValueError(f"Row {row_idx} has an invalid pattern: {exc}") from None
+        self.replacement = replacement
+        self.prefix = prefix
+        self.suffix = suffix
+
+    def apply(self, name, lookups):
+        match = self.regex.fullmatch(name)
+        if match is None:
+            return None
+        new = match.expand(self.replacement) if self.replacement else name
+        new = PLACEHOLDER.sub(lambda m: lookups.resolve(m.group(1), match, name), new)
+        stem, ext = os.path.splitext(new)
+        new = f"{self.prefix}{stem}{self.suffix}{ext}"
+        if not new or os.sep in new or (os.altsep and os.altsep in new):
+            raise ValueError(f"Rule for {name} produced an invalid file name: {new!r}")
+        return new
+
+
+def read_rules(xlsx_path, sheet_name):
+    wb = open_workbook(xlsx_path)
+    try:
+        if not sheet_name:
+            sheet_name = RULE_SHEET if RULE_SHEET in wb.sheetnames else wb.active.title
+        ws = wb[sheet_name]
+        columns = RULE_COLUMNS.resolve(read_header(ws))
+        if not (columns.has("pattern") or columns.has("prefix") or columns.has("suffix")):
+            raise ValueError("Missing rule columns: pattern/replacement, prefix or suffix (或 匹配规则/替换为、前缀、后缀)")
+
+        rules = []
+        for row_idx, row in iter_records(ws, columns):
+            pattern, replacement = cell_text(row.pattern), cell_text(row.replacement)
+            prefix, suffix = cell_text(row.prefix), cell_text(row.suffix)
+            if pattern or replacement or prefix or suffix:
+                rules.append(RenameRule(row_idx, pattern, replacement, prefix, suffix))
+
+        lookups = Lookups()
+        for name in wb.sheetnames:
+            if name != sheet_name:
+                lookups.add_sheet(wb[name])
+    finally:
+        wb.close()
+
+    return rules, lookups
+
+
+def plan_rules(folder, rules, lookups, recursive, index):
+    # First matching rule wins; files no rule matches keep their names.
+    plan = []
+    for path in walk_files(folder, recursive, index):
+        for rule in rules:
+            new = rule.apply(path.name, lookups)
+            if new is not None:
+                if new != path.name:
+                    plan.append((path, path.with_name(new)))
+                break
+    return plan
+
+
+def content_digest(path):
+    # Same as `b2sum -l 160`, so hashes can also be computed outside this tool.
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashIndex:
+    # Content digests of the folder's files, kept in a sidecar keyed by name,
+    # size and mtime so reruns only hash new or changed files. Names seen in
+    # earlier runs are remembered, so the mapping may use a file's old name.
+    # The folder listing comes from the FolderIndex that validates the plan.
+    def __init__(self, folder, index):
+        self.folder = Path(folder)
+        self.path = self.folder / HASH_INDEX_NAME
+        self.files = {}
+        self.known = {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.files = data.get("files", {})
+            self.known = data.get("known", {})
+        except (OSError, ValueError):
+            pass
+        self.current = {}
+        for entry in index.entries(self.folder):
+            if is_plain_file(entry.name) and entry.is_file():
+                stat = entry.stat()
+                self.current[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+    def locate(self, wanted):
+        # wanted maps digest -> size (None if unknown); only files of a wanted
+        # size are hashed, in a thread pool since hashing is I/O bound.
+        from concurrent.futures import ThreadPoolExecutor
+
+        sizes = set(wanted.values())
+        found = {}
+        to_hash = []
+        for name, (size, mtime) in self.current.items():
+            cached = self.files.get(name)
+            if cached and cached[0] == size and cached[1] == mtime:
+                found.setdefault(cached[2], []).append(name)
+            elif None in sizes or size in sizes:
+                to_hash.append((name, size, mtime))
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            digests = pool.map(content_digest, [self.folder / name for name, _, _ in to_hash])
+            for (name, size, mtime), digest in zip(to_hash, digests):
+                self.files[name] = [size, mtime, digest]
+                found.setdefault(digest, []).append(name)
+        return {digest: sorted(names) for digest, names in found.items() if digest in wanted}
+
+    def save(self, renamed=()):
+        files = {name: self.files[name] for name in self.current if name in self.files}
+        for src, dst in renamed:
+            entry = files.pop(src.name, None)
+            if entry is not None:
+                files[dst.name] = entry
+        for name, (size, _, digest) in files.items():
+            self.known[name] = [size, digest]
+        data = {"files": files, "known": self.known}
+        self.path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def resolve_by_content(folder, mapping, hashes):
+    # old_name may be a file in the folder, a content hash, a name recorded in
+    # the hash index by an earlier run, or a reference file elsewhere.
+    plan = []
+    pending = []
+    for old, new in mapping:
+        marked = CONTENT_HASH.fullmatch(old)
+        if marked:
+            digest, size = marked.group(1).lower(), None
+        elif old in hashes.current:
+            plan.append((folder / old, folder / new))
             continue
-        if not old_val or not new_val:
-            raise ValueError(f"Row {row_idx} has empty old_name or new_name.")
-        mapping.append((str(old_val).strip(), str(new_val).strip()))
+        elif old in hashes.known:
+            size, digest = hashes.known[old]
+        elif Path(old).is_file():
+            digest, size = content_digest(old), Path(old).stat().st_size
+        else:
+            raise FileNotFoundError(f"Source not found: {folder / old}")
+        pending.append((old, digest, size, new))
+
+    matches = hashes.locate({digest: size for _, digest, size, _ in pending}) if pending else {}
+    for old, digest, _, new in pending:
+        names = matches.get(digest, [])
+        if not names:
+            raise FileNotFoundError(f"No file in {folder} has the content of {old}")
+        if len(names) > 1:
+            raise ValueError(f"Content of {old} matches several files: {', '.join(names)}")
+        plan.append((folder / names[0], folder / new))
+    return plan
+
+
+def path_key(path):
+    # Case-folded on Windows, so collisions match what the filesystem sees.
+    return os.path.normcase(os.path.abspath(path))
+
+
+class FolderIndex:
+    # Directory listings are read once with os.scandir and kept in memory, so a
+    # plan is validated without per-file stat calls.
+    def __init__(self):
+        self._listings = {}
+        self._entries = {}
+
+    def _listing(self, directory):
+        listing = self._listings.get(directory)
+        if listing is None:
+            entries = []
+            try:
+                with os.scandir(directory) as scan:
+                    entries = list(scan)
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+            listing = self._store(directory, entries)
+        return listing
+
+    def _store(self, key, entries):
+        listing = self._listings[key] = {os.path.normcase(entry.name): entry.is_dir() for entry in entries}
+        self._entries[key] = entries
+        return listing
+
+    def record(self, directory, entries):
+        self._store(path_key(directory), entries)
+
+    def entries(self, directory):
+        # The DirEntry objects of one directory, from the same single scan.
+        key = path_key(directory)
+        self._listing(key)
+        return self._entries[key]
+
+    def lookup(self, key):
+        # None if the path does not exist, otherwise whether it is a directory.
+        directory, name = os.path.split(key)
+        return self._listing(directory).get(name)
+
+
+def is_plain_file(name):
+    return name not in (JOURNAL_NAME, HASH_INDEX_NAME) and ".renametmp_" not in name
 
-    return mapping
 
+def walk_files(folder, recursive, index):
+    # One scandir per directory; the listings also seed the index used to
+    # validate the plan, so no directory is read twice.
+    pending = [str(folder)]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        index.record(directory, entries)
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.path)
+            elif is_plain_file(entry.name):
+                yield Path(entry.path)
+        if recursive:
+            pending.extend(reversed(subdirs))
 
-def validate_plan(plan, overwrite):
-    targets = []
+
+def _repeated(paths):
+    seen = set()
+    repeated = set()
+    for path in paths:
+        key = path_key(path)
+        if key in seen:
+            repeated.add(str(path))
+        seen.add(key)
+    return repeated
+
+
+def validate_plan(plan, overwrite, index=None):
+    index = index or FolderIndex()
+    moves = []
     for src, dst in plan:
-        if src.resolve() == dst.resolve():
+        if os.path.abspath(src) == os.path.abspath(dst):
             continue
-        if not src.exists():
+        moves.append((src, dst, path_key(src), path_key(dst)))
+    repeated = _repeated(src for src, _, _, _ in moves)
+    if repeated:
+        raise ValueError("Duplicate source names: " + ", ".join(sorted(repeated)))
+
+    sources = {src_key for _, _, src_key, _ in moves}
+
+    for src, dst, src_key, dst_key in moves:
+        is_dir = index.lookup(src_key)
+        if is_dir is None:
             raise FileNotFoundError(f"Source not found: {src}")
-        if src.is_dir():
+        if is_dir:
             raise IsADirectoryError(f"Source is a directory, not a file: {src}")
-        if dst.exists() and not overwrite:
+        # A target that another row renames away (a->b, b->a) is free by phase two.
+        target_is_dir = None if dst_key in sources else index.lookup(dst_key)
+        if target_is_dir is not None and not overwrite:
             raise FileExistsError(f"Target already exists: {dst}")
-        if dst.exists() and overwrite and dst.is_dir():
+        if target_is_dir:
             raise IsADirectoryError(f"Target is a directory: {dst}")
-        targets.append(str(dst.resolve()))
 
-    duplicates = set()
-    seen = set()
-    for t in targets:
-        if t in seen:
-            duplicates.add(t)
-        seen.add(t)
+    duplicates = _repeated(dst for _, dst, _, _ in moves)
     if duplicates:
         raise ValueError("Duplicate target names: " + ", ".join(sorted(duplicates)))
+    return [(src, dst) for src, dst, _, _ in moves]
 
 
-def rename_files(plan, overwrite):
-    temp_map = []
-    # Two-phase rename avoids collisions (e.g., a->b and b->a).
-    for src, dst in plan:
-        if src.resolve() == dst.resolve():
-            continue
-        temp = src.with_name(src.name + ".renametmp_" + uuid4().hex)
-        src.rename(temp)
-        temp_map.append((temp, dst))
+class RenameJournal:
+    # Write-ahead log of one run, kept in the target folder. The full plan is
+    # fsynced before the first rename and progress is marked after every batch,
+    # so an interrupted run can be finished (--resume) or undone (--rollback).
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = []
+        self.overwrite = False
+        self.planned = False
+        self.marks = {}
+        self.state = None
+        self._handle = None
+
+    @classmethod
+    def load(cls, folder):
+        journal = cls(Path(folder) / JOURNAL_NAME)
+        if not journal.path.is_file():
+            return None
+        with open(journal.path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write.
+                    break
+                kind = record["type"]
+                if kind == "begin":
+                    journal.overwrite = record["overwrite"]
+                elif kind == "move":
+                    journal.entries.append((Path(record["src"]), Path(record["temp"]), Path(record["dst"])))
+                elif kind == "planned":
+                    journal.planned = True
+                elif kind == "mark":
+                    journal.marks[record["step"]] = (record["done"], record["of"])
+                elif kind == "end":
+                    journal.state = record["state"]
+        return journal
+
+    def start(self, entries, overwrite):
+        self.entries = entries
+        self.overwrite = overwrite
+        self._handle = open(self.path, "w", encoding="utf-8")
+        self._write({"type": "begin", "overwrite": overwrite, "count": len(entries)})
+        for start in range(0, len(entries), JOURNAL_BATCH):
+            batch = entries[start : start + JOURNAL_BATCH]
+            records = (
+                {"type": "move", "src": os.path.abspath(src), "temp": os.path.abspath(temp), "dst": os.path.abspath(dst)}
+                for src, temp, dst in batch
+            )
+            self._write(*records, sync=False)
+        self._write({"type": "planned"})
+        self.planned = True
+
+    def reopen(self):
+        self._handle = open(self.path, "a", encoding="utf-8")
+
+    def complete(self, step):
+        done, total = self.marks.get(step, (None, None))
+        return done is not None and done == total
+
+    def mark(self, step, done, total):
+        self.marks[step] = (done, total)
+        self._write({"type": "mark", "step": step, "done": done, "of": total})
+
+    def finish(self, state):
+        self.state = state
+        self._write({"type": "end", "state": state})
+        self._handle.close()
+        self._handle = None
+        # Every entry is settled, so nothing is left to recover.
+        self.path.unlink()
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _write(self, *records, sync=True):
+        for record in records:
+            self._handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if sync:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+
+
+def run_step(journal, step, renames, replace=False):
+    total = len(renames)
+    for done, (old, new) in enumerate(renames, start=1):
+        if replace:
+            old.replace(new)
+        else:
+            old.rename(new)
+        if journal is not None and done % JOURNAL_BATCH == 0 and done < total:
+            journal.mark(step, done, total)
+    if journal is not None:
+        journal.mark(step, total, total)
+
+
+def rename_files(plan, overwrite, journal=None):
+    entries = [
+        (src, src.with_name(src.name + ".renametmp_" + uuid4().hex), dst)
+        for src, dst in plan
+        if os.path.abspath(src) != os.path.abspath(dst)
+    ]
+    if journal is not None:
+        journal.start(entries, overwrite)
+    try:
+        # Two-phase rename avoids collisions (e.g., a->b and b->a).
+        run_step(journal, "stage", [(src, temp) for src, temp, _ in entries])
+        # The plan was validated against the folder index, so existing targets
+        # are only replaced when --overwrite was given.
+        run_step(journal, "commit", [(temp, dst) for _, temp, dst in entries], replace=overwrite)
+        if journal is not None:
+            journal.finish("done")
+    finally:
+        if journal is not None:
+            journal.close()
+    return len(entries)
 
-    for temp, dst in temp_map:
-        if dst.exists() and overwrite:
-            if dst.is_file():
-                dst.unlink()
-            else:
-                raise IsADirectoryError(f"Target is a directory: {dst}")
-        temp.rename(dst)
 
+def _staged(entries):
+    # Entries whose file currently sits under its temp name.
+    index = FolderIndex()
+    return [entry for entry in entries if index.lookup(path_key(entry[1])) is not None]
 
-def main():
+
+def resume_journal(journal):
+    entries = journal.entries
+    journal.reopen()
+    try:
+        if not journal.complete("stage"):
+            # Nothing has reached a target name yet: each file is at its source or temp name.
+            index = FolderIndex()
+            pending = [(src, temp) for src, temp, _ in entries if index.lookup(path_key(temp)) is None]
+            missing = [src for src, _ in pending if index.lookup(path_key(src)) is None]
+            if missing:
+                raise FileNotFoundError(f"Source not found: {missing[0]}")
+            run_step(journal, "stage", pending)
+            remaining = entries
+        else:
+            remaining = _staged(entries)
+        run_step(journal, "commit", [(temp, dst) for _, temp, dst in remaining], replace=journal.overwrite)
+        journal.finish("done")
+    finally:
+        journal.close()
+    return len(remaining)
+
+
+def rollback_journal(journal):
+    entries = journal.entries
+    journal.reopen()
+    try:
+        # Once phase one is complete, files may already sit at target names:
+        # park them under their temp names first so swaps unwind safely.
+        if journal.complete("stage") and not journal.complete("undo"):
+            index = FolderIndex()
+            committed = [
+                (dst, temp)
+                for _, temp, dst in entries
+                if index.lookup(path_key(temp)) is None and index.lookup(path_key(dst)) is not None
+            ]
+            run_step(journal, "undo", committed)
+        restored = [(temp, src) for src, temp, _ in _staged(entries)]
+        run_step(journal, "restore", restored)
+        journal.finish("rolled_back")
+    finally:
+        journal.close()
+    return len(restored)
+
+
+def recover(args, folder, journal, profiler):
+    if journal is None or not journal.planned:
+        if journal is not None:
+            journal.path.unlink()
+        print(f"ERROR: No interrupted rename to {'resume' if args.resume else 'roll back'} in {folder}", file=sys.stderr)
+        return 1
+    if args.resume and journal.state is not None:
+        print(f"ERROR: The last rename in {folder} already finished ({journal.state}).", file=sys.stderr)
+        return 1
+    if args.rollback and journal.state == "rolled_back":
+        print(f"ERROR: The last rename in {folder} was already rolled back.", file=sys.stderr)
+        return 1
+
+    try:
+        with profiler.stage("write") as stage:
+            count = resume_journal(journal) if args.resume else rollback_journal(journal)
+            stage.add_rows(count)
+    except Exception as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        return 1
+    print(f"{'Resumed' if args.resume else 'Rolled back'} {count} file(s).")
+    profiler.write(folder, resume=args.resume, rollback=args.rollback)
+    return 0
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Rename files from an Excel mapping list.")
-    parser.add_argument("--input", default="input.xlsx", help="Mapping .xlsx file (default: input.xlsx).")
+    parser.add_argument(
+        "--input", default="input.xlsx", help="Mapping .xlsx, .csv or .parquet file (default: input.xlsx)."
+    )
     parser.add_argument("--folder", default="files", help="Target folder (default: files).")
     parser.add_argument("--sheet", default="", help="Sheet name (default: first sheet).")
     parser.add_argument("--dry-run", action="store_true", help="Print changes without renaming.")
     parser.add_argument("--overwrite", action="store_true", help="Allow overwriting existing files.")
-    args = parser.parse_args()
+    parser.add_argument("--rules", action="store_true", help="The sheet lists rename rules instead of file names.")
+    parser.add_argument("--recursive", action="store_true", help="With --rules, also rename files in subfolders.")
+    parser.add_argument(
+        "--match-content",
+        action="store_true",
+        help="Find sources by content when old_name is missing, a hash or a reference file.",
+    )
+    recovery = parser.add_mutually_exclusive_group()
+    recovery.add_argument("--resume", action="store_true", help="Finish an interrupted rename from its journal.")
+    recovery.add_argument(
+        "--rollback", action="store_true", help="Restore the original names after an interrupted rename."
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    profiler = Profiler.from_args(args, "rename")
+
+    folder = Path(args.folder)
+    if not folder.is_dir():
+        print(f"ERROR: Folder not found: {folder}", file=sys.stderr)
+        return 1
+    journal = RenameJournal.load(folder)
+    if args.resume or args.rollback:
+        return recover(args, folder, journal, profiler)
+    if journal is not None and journal.planned and journal.state is None and not args.dry_run:
+        print(
+            f"ERROR: An interrupted rename was found in {folder}; run again with --resume or --rollback.",
+            file=sys.stderr,
+        )
+        return 1
 
     try:
-        mapping = read_mapping(args.input, args.sheet or None)
-        folder = Path(args.folder)
-        if not folder.exists():
-            raise FileNotFoundError(f"Folder not found: {folder}")
-        plan = [(folder / old, folder / new) for old, new in mapping]
-        validate_plan(plan, args.overwrite)
+        if args.rules:
+            with profiler.stage("parse") as stage:
+                rules, lookups = read_rules(args.input, args.sheet or None)
+                stage.add_rows(len(rules))
+            with profiler.stage("compute"):
+                index = FolderIndex()
+                plan = plan_rules(folder, rules, lookups, args.recursive, index)
+                plan = validate_plan(plan, args.overwrite, index)
+        else:
+            with profiler.stage("parse") as stage:
+                mapping = read_mapping(args.input, args.sheet or None)
+                stage.add_rows(len(mapping))
+            with profiler.stage("compute"):
+                index = FolderIndex()
+                if args.match_content:
+                    hashes = HashIndex(folder, index)
+                    plan = resolve_by_content(folder, mapping, hashes)
+                    # A dry run must leave the folder untouched.
+                    if not args.dry_run:
+                        hashes.save()
+                else:
+                    plan = [(folder / old, folder / new) for old, new in mapping]
+                plan = validate_plan(plan, args.overwrite, index)
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
 
     if args.dry_run:
         for src, dst in plan:
-            if src.resolve() == dst.resolve():
-                continue
             print(f"{src} -> {dst}")
+        profiler.write(folder, input=args.input, dry_run=True)
         return 0
 
     try:
-        rename_files(plan, args.overwrite)
+        with profiler.stage("write") as stage:
+            stage.add_rows(rename_files(plan, args.overwrite, RenameJournal(folder / JOURNAL_NAME)))
+        if args.match_content and not args.rules:
+            hashes.save(plan)
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
+        print(f"Run again with --resume or --rollback to recover {folder}.", file=sys.stderr)
         return 1
 
     print(f"Renamed {len(plan)} file(s).")
+    profiler.write(folder, input=args.input)
     return 0
 
 
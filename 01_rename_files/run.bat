@@ -1,5 +1,10 @@
 @echo off
 setlocal
 cd /d "%~dp0"
-python rename_files.py --input input.xlsx --folder files
+rem Without the shared audit.py next to the folder, run the script itself.
+if exist ..\audit.py (
+    python ..\audit.py rename --input input.xlsx --folder files
+) else (
+    python rename_files.py --input input.xlsx --folder files
+)
 pause
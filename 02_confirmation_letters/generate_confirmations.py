@@ -1,11 +1,24 @@
 ﻿import argparse
+import hashlib
+import io
+import json
+import os
+import posixpath
 import re
 import sys
+from bisect import bisect_right
 from datetime import date, datetime
+from itertools import accumulate
 from pathlib import Path
 
-from docx import Document
-from openpyxl import Workbook, load_workbook
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.cache import file_digest
+from audit_common.memo import RunManifest, add_memo_arguments, code_version
+from audit_common.profiling import Profiler, add_profile_arguments
+from audit_common.programs import call_function, function_ref
+from audit_common.reader import HeaderIndex, iter_records, open_workbook, read_header
+from audit_common.writer import OutputWorkbook
 
 
 COLUMN_ALIASES = {
@@ -47,28 +60,39 @@ COLUMN_ALIASES = {
     "currency": ["currency", "币种", "币别"],
     "remarks": ["remarks", "备注", "说明"],
 }
+REQUIRED_COLUMNS = ["party_name", "amount", "balance_date"]
+LETTER_COLUMNS = HeaderIndex(COLUMN_ALIASES)
+# {{name}} or {{name:spec}}: a format() spec for numbers, strftime for dates.
+PLACEHOLDER = re.compile(r"\{\{(\w+)(?::([^{}<]*))?\}\}")
+LETTER_FIELDS = (
+    "party_name",
+    "address",
+    "contact",
+    "currency",
+    "remarks",
+    "amount",
+    "amount_formatted",
+    "balance_date",
+)
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d")
+TEXT_PARTS = re.compile(r"word/(document|header\d*|footer\d*)\.xml")
+XML_INVALID = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+XML_BREAKS = {"\t": '</w:t><w:tab/><w:t xml:space="preserve">', "\n": '</w:t><w:br/><w:t xml:space="preserve">'}
+ENGINES = ("ooxml", "docx")
+ARCHIVE_NAME = "letters.zip"
+LETTER_MANIFEST = ".letters_manifest.json"
+MERGED_NAME = "letters"
+SAMPLE_METHODS = ("stratified", "mus", "top")
+SAMPLE_NAME = "sample.xlsx"
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS = "word/_rels/document.xml.rels"
+CONTENT_TYPES = "[Content_Types].xml"
+HEADER_REF = re.compile(r'(<w:(?:header|footer)Reference\b[^>]*?\br:id=")([^"]+)(")')
+DOCPR_ID = re.compile(r'(<wp:docPr\b[^>]*?\bid=")(\d+)(")')
+PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
 
-
-def normalize_header(value):
-    if value is None:
-        return ""
-    text = str(value).strip().lower()
-    text = text.replace("（", "(").replace("）", ")")
-    text = re.sub(r"\s+", "", text)
-    text = re.sub(r"[()（）\[\]【】:%/\\-]", "", text)
-    return text
-
-
-def find_header_index(headers, aliases):
-    alias_norms = [normalize_header(a) for a in aliases]
-    for alias in alias_norms:
-        if alias in headers:
-            return headers.index(alias)
-    for idx, header in enumerate(headers):
-        for alias in alias_norms:
-            if alias and alias in header:
-                return idx
-    return None
+_worker_template = None
 
 
 def format_amount(value):
@@ -90,6 +114,49 @@ def format_date(value):
     return str(value).strip()
 
 
+def as_date(value):
+    if isinstance(value, (datetime, date)):
+        return value
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {value}")
+
+
+def as_number(value):
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        # Text specs such as {{party_name:>20}} apply to the text itself.
+        return str(value)
+
+
+def format_value(value, spec=None):
+    # A spec with a %-directive formats dates ({{balance_date:%Y年%m月%d日}}),
+    # anything else goes to format() ({{amount:,.2f}}). Values that do not
+    # fit the spec are shown as without one.
+    if spec is not None:
+        try:
+            if "%" in spec[:-1]:
+                return as_date(value).strftime(spec)
+            return format(as_number(value), spec)
+        except (TypeError, ValueError):
+            pass
+    if isinstance(value, (datetime, date)):
+        return format_date(value)
+    return str(value)
+
+
+def render_piece(piece, data):
+    key, spec, token = piece
+    return format_value(data[key], spec) if key in data else token
+
+
 def sanitize_filename(name):
     name = name.strip()
     name = re.sub(r'[<>:"/\\|?*]', "_", name)
@@ -98,6 +165,8 @@ def sanitize_filename(name):
 
 
 def build_default_template():
+    from docx import Document
+
     doc = Document()
     doc.add_heading("Confirmation Letter", level=1)
     doc.add_paragraph("To: {{party_name}}")
@@ -118,106 +187,834 @@ def make_template(path):
     doc.save(path)
 
 
-def replace_placeholders_in_paragraph(paragraph, data):
-    if "{{" not in paragraph.text:
-        return
-    replaced = False
-    for run in paragraph.runs:
+def iter_paragraphs(doc):
+    # Body, table cells, headers and footers; merged cells and linked headers
+    # repeat the same paragraph, so each one is yielded once.
+    seen = set()
+
+    def tables(items):
+        for table in items:
+            for row in table.rows:
+                for cell in row.cells:
+                    yield from cell.paragraphs
+
+    def parts():
+        yield from doc.paragraphs
+        yield from tables(doc.tables)
+        for section in doc.sections:
+            for part in (section.header, section.footer):
+                # Reading a missing header would add an empty one to the document.
+                if part.is_linked_to_previous:
+                    continue
+                yield from part.paragraphs
+                yield from tables(part.tables)
+
+    for paragraph in parts():
+        if paragraph._p not in seen:
+            seen.add(paragraph._p)
+            yield paragraph
+
+
+def compile_paragraph(paragraph):
+    # Each placeholder is written into the run where it starts, keeping that
+    # run's formatting; the rest of a placeholder split across runs is dropped.
+    runs = paragraph.runs
+    starts, ends, texts = [], [], []
+    for run in runs:
         text = run.text
-        if "{{" not in text:
-            continue
-        for key, val in data.items():
-            text = text.replace(f"{{{{{key}}}}}", str(val))
-        if text != run.text:
-            run.text = text
-            replaced = True
-    if "{{" in paragraph.text and not replaced:
-        text = paragraph.text
-        for key, val in data.items():
-            text = text.replace(f"{{{{{key}}}}}", str(val))
-        paragraph.text = text
+        starts.append(ends[-1] if ends else 0)
+        ends.append(starts[-1] + len(text))
+        texts.append(text)
+    full = "".join(texts)
+    if "{{" not in full:
+        return []
+    matches = list(PLACEHOLDER.finditer(full))
+    touched = set()
+    for match in matches:
+        touched.update(range(bisect_right(ends, match.start()), bisect_right(ends, match.end() - 1) + 1))
+
+    slots = []
+    for i in sorted(touched):
+        pieces = []
+        cursor = starts[i]
+        for match in matches:
+            if match.end() <= starts[i] or match.start() >= ends[i]:
+                continue
+            if match.start() > cursor:
+                pieces.append(full[cursor : match.start()])
+            if match.start() >= starts[i]:
+                pieces.append((match.group(1), match.group(2), match.group(0)))
+            cursor = min(match.end(), ends[i])
+        if cursor < ends[i]:
+            pieces.append(full[cursor : ends[i]])
+        slots.append((runs[i], pieces))
+    return slots
+
+
+class LetterTemplate:
+    # The template is parsed once and its placeholders compiled into slots
+    # (run, pieces). A letter rewrites only those runs in place, always from
+    # the template text, so the same document is reused for every party.
+    engine = "docx"
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.slots = []
+        for paragraph in iter_paragraphs(doc):
+            self.slots.extend(compile_paragraph(paragraph))
+        self.placeholders = {piece[0] for _, pieces in self.slots for piece in pieces if not isinstance(piece, str)}
+
+    @classmethod
+    def load(cls, path):
+        from docx import Document
+
+        if not path:
+            template = cls(build_default_template())
+            template.source = template.to_bytes({})
+            return template
+        template = cls(Document(path))
+        template.source = Path(path).read_bytes()
+        return template
+
+    def render(self, data):
+        for run, pieces in self.slots:
+            run.text = "".join(piece if isinstance(piece, str) else render_piece(piece, data) for piece in pieces)
+        return self.doc
+
+    def to_bytes(self, data):
+        buffer = io.BytesIO()
+        self.render(data).save(buffer)
+        return buffer.getvalue()
+
+    def render_parts(self, data):
+        from lxml import etree
+
+        self.render(data)
+        parts = {run.part.partname: run.part for run, _ in self.slots}
+        parts[self.doc.part.partname] = self.doc.part
+        return {str(name).lstrip("/"): etree.tostring(part.element, encoding="unicode") for name, part in parts.items()}
 
 
 def fill_placeholders(doc, data):
-    for paragraph in doc.paragraphs:
-        replace_placeholders_in_paragraph(paragraph, data)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    replace_placeholders_in_paragraph(paragraph, data)
-    for section in doc.sections:
-        for paragraph in section.header.paragraphs:
-            replace_placeholders_in_paragraph(paragraph, data)
-        for table in section.header.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        replace_placeholders_in_paragraph(paragraph, data)
-        for paragraph in section.footer.paragraphs:
-            replace_placeholders_in_paragraph(paragraph, data)
-        for table in section.footer.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        replace_placeholders_in_paragraph(paragraph, data)
+    LetterTemplate(doc).render(data)
+
+
+def escape_xml(text):
+    # The three entities saxutils.escape handles, without importing it (and
+    # the urllib/email modules it pulls in) when the program starts.
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def unescape_xml(text):
+    return text.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+
+def xml_text(value):
+    text = escape_xml(XML_INVALID.sub("", str(value))).replace("\r", "\n")
+    for char, markup in XML_BREAKS.items():
+        text = text.replace(char, markup)
+    return text
+
+
+def paragraph_texts(xml):
+    # The text of each <w:p> as Word shows it, joined across its runs. Text
+    # of a paragraph nested in another (e.g. a text box) is kept apart.
+    from xml.etree import ElementTree
+
+    texts = []
+
+    def walk(element, buffer):
+        for child in element:
+            if child.tag == W_NS + "p":
+                inner = []
+                walk(child, inner)
+                texts.append("".join(inner))
+            elif child.tag == W_NS + "t":
+                buffer.append(child.text or "")
+            else:
+                walk(child, buffer)
+
+    walk(ElementTree.fromstring(xml), [])
+    return texts
+
+
+def compile_xml(xml, name):
+    # Splits a part into literal text and (key, spec, token) pieces. Only whole
+    # placeholders inside a <w:t> element are supported; anything else (e.g.
+    # a placeholder split across runs) is left to the python-docx renderer.
+    pieces = []
+    cursor = 0
+    matches = list(PLACEHOLDER.finditer(xml))
+    joined = sum(len(PLACEHOLDER.findall(text)) for text in paragraph_texts(xml)) if "{" in xml else 0
+    if xml.count("{{") != len(matches) or joined != len(matches):
+        raise ValueError(f"{name} has a placeholder split across runs")
+    for match in matches:
+        tag = xml.rfind("<", 0, match.start())
+        if not (xml.startswith("<w:t>", tag) or xml.startswith("<w:t ", tag)):
+            raise ValueError(f"{name} has a placeholder outside of text")
+        if tag >= cursor and "xml:space" not in xml[tag : xml.index(">", tag)]:
+            # Values may start or end with spaces, which Word drops otherwise.
+            pieces.append(xml[cursor:tag] + '<w:t xml:space="preserve"')
+            cursor = tag + len("<w:t")
+        pieces.append(xml[cursor : match.start()])
+        spec = unescape_xml(match.group(2)) if match.group(2) is not None else None
+        pieces.append((match.group(1), spec, match.group(0)))
+        cursor = match.end()
+    pieces.append(xml[cursor:])
+    return pieces
+
+
+def dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def zip_entry(info, crc, size, data, method):
+    # Local file header + data; the central directory record is built by the
+    # caller once the entry's offset is known.
+    import struct
+
+    name = info.filename.encode("utf-8")
+    flags = 0x800 if not info.filename.isascii() else 0
+    time, day = dos_datetime(info.date_time)
+    fields = (flags, method, time, day, crc, len(data), size, len(name))
+    header = struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, *fields, 0) + name
+    return header + data, fields, name
+
+
+def raw_member(source, info):
+    # The member's compressed bytes exactly as stored in the template.
+    import struct
+
+    if info.flag_bits & 0x1:
+        raise ValueError(f"{info.filename} is encrypted")
+    offset = info.header_offset
+    signature, *fields = struct.unpack("<IHHHHHIIIHH", source[offset : offset + 30])
+    if signature != 0x04034B50:
+        raise ValueError(f"{info.filename} has a bad zip header")
+    start = offset + 30 + fields[-2] + fields[-1]
+    return source[start : start + info.compress_size]
+
+
+class OoxmlTemplate:
+    # Renders letters straight from the template's zip members: untouched
+    # parts are copied as their original compressed bytes, and placeholders
+    # in the body, header and footer XML are substituted as text.
+    engine = "ooxml"
+
+    def __init__(self, source):
+        import zipfile
+
+        self.source = source
+        self.members = []
+        self.placeholders = set()
+        with zipfile.ZipFile(io.BytesIO(source)) as zf:
+            for info in zf.infolist():
+                if TEXT_PARTS.fullmatch(info.filename):
+                    pieces = compile_xml(zf.read(info).decode("utf-8"), info.filename)
+                    if len(pieces) > 1:
+                        self.members.append((info, pieces))
+                        self.placeholders.update(piece[0] for piece in pieces if not isinstance(piece, str))
+                        continue
+                data = raw_member(source, info)
+                self.members.append(zip_entry(info, info.CRC, info.file_size, data, info.compress_type))
+
+    @classmethod
+    def load(cls, path):
+        if path:
+            return cls(Path(path).read_bytes())
+        buffer = io.BytesIO()
+        build_default_template().save(buffer)
+        return cls(buffer.getvalue())
+
+    def render_xml(self, pieces, data):
+        return "".join(
+            piece if isinstance(piece, str) else xml_text(render_piece(piece, data)) if piece[0] in data else piece[2]
+            for piece in pieces
+        )
+
+    def render_parts(self, data):
+        return {
+            member[0].filename: self.render_xml(member[1], data) for member in self.members if isinstance(member[1], list)
+        }
+
+    def to_bytes(self, data):
+        import struct
+        import zipfile
+        import zlib
+
+        out = bytearray()
+        central = bytearray()
+        for member in self.members:
+            if isinstance(member[1], list):
+                info, pieces = member
+                xml = self.render_xml(pieces, data).encode("utf-8")
+                compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                compressed = compressor.compress(xml) + compressor.flush()
+                member = zip_entry(info, zlib.crc32(xml), len(xml), compressed, zipfile.ZIP_DEFLATED)
+            entry, fields, name = member
+            central += struct.pack("<IHH", 0x02014B50, 20, 20)
+            central += struct.pack("<HHHHIIIHHHHHII", *fields, 0, 0, 0, 0, 0, len(out)) + name
+            out += entry
+        count = len(self.members)
+        out += central + struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, len(central), len(out), 0)
+        return bytes(out)
+
+
+def split_body(xml):
+    # (head, body content, final sectPr, tail) of a document.xml.
+    start = xml.index(">", xml.index("<w:body")) + 1
+    end = xml.rindex("</w:body>")
+    sect = xml.rfind("<w:sectPr", start, end)
+    if sect == -1 or xml.rfind("</w:p>", start, end) > sect:
+        sect = end
+    return xml[:start], xml[start:sect], xml[sect:end], xml[end:]
+
+
+def letter_pages(body):
+    # An estimate: Word lays pages out when the file is opened, so this
+    # assumes a letter takes as many pages as its explicit page and section
+    # breaks imply. Text that overflows a page shifts the later letters.
+    return 1 + body.count('w:type="page"') + body.count("<w:sectPr")
+
+
+class MergedLetters:
+    # The template package for mail-merge documents: letter bodies are
+    # appended to one document.xml with section breaks in between, and
+    # headers/footers with placeholders get one rendered copy per letter.
+    def __init__(self, source):
+        import zipfile
+        from xml.etree import ElementTree
+
+        self.source = source
+        with zipfile.ZipFile(io.BytesIO(source)) as zf:
+            self.names = zf.namelist()
+            self.document = zf.read(DOCUMENT_PART).decode("utf-8")
+            self.rels = zf.read(DOCUMENT_RELS).decode("utf-8")
+            self.types = zf.read(CONTENT_TYPES).decode("utf-8")
+        self.rel_ids = {}
+        for rel in ElementTree.fromstring(self.rels):
+            target = rel.get("Target", "")
+            name = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("word", target))
+            self.rel_ids[name] = (rel.get("Id"), rel.get("Type"))
+        self.content_types = {
+            item.get("PartName", "").lstrip("/"): item.get("ContentType") for item in ElementTree.fromstring(self.types)
+        }
+
+
+class MergedDocument:
+    # One merged .docx being written. Letter bodies are spooled to a temp
+    # file and header/footer copies go straight into the zip, so only the
+    # letter being added is held in memory.
+    def __init__(self, merger, path):
+        import tempfile
+        import zipfile
+
+        self.merger = merger
+        self.path = path
+        self.source = zipfile.ZipFile(io.BytesIO(merger.source))
+        self.out = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        self.body = tempfile.TemporaryFile()
+        # Drawing ids must stay unique once the letters share one document.
+        self.ids = iter(range(1, 1 << 31))
+        self.count = 0
+        self.head = self.sect = self.tail = ""
+        self.rels = []
+        self.types = []
+
+    def add(self, parts):
+        # parts: one letter's rendered parts, as returned by render_parts.
+        merger = self.merger
+        self.count += 1
+        number = self.count
+        head, content, sect, self.tail = split_body(parts.get(DOCUMENT_PART, merger.document))
+        if number == 1:
+            self.head = head
+        renamed = {}
+        for name, xml in parts.items():
+            if name == DOCUMENT_PART or name not in merger.rel_ids:
+                continue
+            rel_id, rel_type = merger.rel_ids[name]
+            stem, ext = posixpath.splitext(name)
+            copy = f"{stem}_{number}{ext}"
+            renamed[rel_id] = f"{rel_id}_{number}"
+            self.out.writestr(copy, xml.encode("utf-8"))
+            part_rels = posixpath.join(posixpath.dirname(name), "_rels", posixpath.basename(name) + ".rels")
+            if part_rels in merger.names:
+                copy_rels = posixpath.join(posixpath.dirname(copy), "_rels", posixpath.basename(copy) + ".rels")
+                self.out.writestr(copy_rels, self.source.read(part_rels))
+            target = posixpath.relpath(copy, "word")
+            self.rels.append(f'<Relationship Id="{renamed[rel_id]}" Type="{rel_type}" Target="{target}"/>')
+            self.types.append(f'<Override PartName="/{copy}" ContentType="{merger.content_types.get(name, "")}"/>')
+        if renamed:
+            content, sect = [
+                HEADER_REF.sub(lambda m: m.group(1) + renamed.get(m.group(2), m.group(2)) + m.group(3), text)
+                for text in (content, sect)
+            ]
+        if number > 1:
+            # The previous letter's section ends where this one starts.
+            self.write_body(f"<w:p><w:pPr>{self.sect}</w:pPr></w:p>" if self.sect else PAGE_BREAK)
+        self.write_body(content)
+        self.sect = sect
+
+    def write_body(self, xml):
+        xml = DOCPR_ID.sub(lambda m: f"{m.group(1)}{next(self.ids)}{m.group(3)}", xml)
+        self.body.write(xml.encode("utf-8"))
+
+    def close(self, ok=True):
+        import shutil
+
+        try:
+            if ok:
+                self.write_body(self.sect)
+                merger = self.merger
+                replaced = {
+                    DOCUMENT_RELS: merger.rels.replace("</Relationships>", "".join(self.rels) + "</Relationships>"),
+                    CONTENT_TYPES: merger.types.replace("</Types>", "".join(self.types) + "</Types>"),
+                }
+                for name in merger.names:
+                    if name == DOCUMENT_PART:
+                        self.body.seek(0)
+                        with self.out.open(name, "w") as handle:
+                            handle.write(self.head.encode("utf-8"))
+                            shutil.copyfileobj(self.body, handle)
+                            handle.write(self.tail.encode("utf-8"))
+                    elif name in replaced:
+                        self.out.writestr(name, replaced[name].encode("utf-8"))
+                    else:
+                        self.out.writestr(name, self.source.read(name))
+        finally:
+            self.out.close()
+            self.source.close()
+            self.body.close()
+            if not ok:
+                Path(self.path).unlink(missing_ok=True)
+
+
+def merge_letters(template, output_dir, datas, pages_per_file):
+    # Returns (file name, first page, last page) per letter, in input order.
+    # Letters are rendered and written one at a time.
+    merger = MergedLetters(template.source)
+    ranges = []
+    document = None
+    files = pages = 0
+    try:
+        for data in datas:
+            parts = template.render_parts(data)
+            count = letter_pages(split_body(parts.get(DOCUMENT_PART, merger.document))[1])
+            if document is None or (pages_per_file and pages + count > pages_per_file and document.count):
+                if document is not None:
+                    document.close()
+                files += 1
+                filename = f"{MERGED_NAME}_{files:03d}.docx" if pages_per_file else f"{MERGED_NAME}.docx"
+                document = MergedDocument(merger, output_dir / filename)
+                pages = 0
+            document.add(parts)
+            ranges.append((filename, pages + 1, pages + count))
+            pages += count
+    except BaseException:
+        if document is not None:
+            document.close(ok=False)
+        # A failed run leaves no partial set of merged documents behind.
+        for filename in {filename for filename, _, _ in ranges}:
+            (output_dir / filename).unlink(missing_ok=True)
+        raise
+    if document is not None:
+        document.close()
+    return ranges
+
+
+def load_renderer(path, engine):
+    import zipfile
+
+    if engine == "ooxml":
+        try:
+            return OoxmlTemplate.load(path)
+        except (ValueError, zipfile.BadZipFile, UnicodeDecodeError) as exc:
+            print(f"Note: {exc}; using the python-docx renderer.")
+    return LetterTemplate.load(path)
+
+
+class LetterSink:
+    # Letters go to the output folder, or into one zip archive with --archive.
+    # The archive is rebuilt next to the old one, copying unchanged letters.
+    def __init__(self, output_dir, archive):
+        self.output_dir = output_dir
+        self.archive = None
+        self.previous = None
+        if archive:
+            import zipfile
+
+            self.path = output_dir / ARCHIVE_NAME
+            self.temp = output_dir / f"{ARCHIVE_NAME}.tmp"
+            if self.path.is_file():
+                try:
+                    self.previous = zipfile.ZipFile(self.path)
+                except zipfile.BadZipFile:
+                    pass
+            # Stored, not deflated: .docx files are already compressed.
+            self.archive = zipfile.ZipFile(self.temp, "w")
+
+    def has(self, filename):
+        if self.archive is None:
+            return (self.output_dir / filename).is_file()
+        return self.previous is not None and filename in self.previous.NameToInfo
+
+    def keep(self, filename):
+        if self.archive is not None:
+            self.write(filename, self.previous.read(filename))
+
+    def write(self, filename, payload):
+        if self.archive is not None:
+            self.archive.writestr(filename, payload)
+        else:
+            (self.output_dir / filename).write_bytes(payload)
+
+    def remove(self, filename):
+        if self.archive is None:
+            (self.output_dir / filename).unlink(missing_ok=True)
+
+    def close(self, ok=True):
+        if self.archive is None:
+            return
+        self.archive.close()
+        if self.previous is not None:
+            self.previous.close()
+        if ok:
+            os.replace(self.temp, self.path)
+        else:
+            self.temp.unlink(missing_ok=True)
+
+
+def data_digest(data):
+    text = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class LetterManifest:
+    # Kept in the output folder: the template/code key plus a hash of each
+    # letter's data, so a rerun only rewrites letters that changed.
+    def __init__(self, output_dir, key, force=False):
+        self.path = output_dir / LETTER_MANIFEST
+        self.key = key
+        try:
+            recorded = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            recorded = {}
+        self.recorded = recorded.get("letters", {})
+        self.current = {} if force or recorded.get("key") != key else self.recorded
+        self.archive = (recorded.get("key") or {}).get("archive")
+
+    def unchanged(self, filename, digest):
+        return self.current.get(filename) == digest
+
+    def removed(self, letters):
+        return [name for name in self.recorded if os.path.normcase(name) not in letters]
+
+    def stale_output(self, output_dir, archive):
+        # Output the last run wrote in the other layout (loose files or the
+        # archive); the new letters replace it.
+        if self.archive is None or self.archive == archive:
+            return []
+        paths = [output_dir / name for name in self.recorded] if archive else [output_dir / ARCHIVE_NAME]
+        return [path for path in paths if path.is_file()]
+
+    def save(self, letters):
+        data = {"key": self.key, "letters": letters}
+        self.path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
 
 
 def read_rows(ws):
-    required = ["party_name", "amount", "balance_date"]
-    optional = ["address", "contact", "currency", "remarks"]
-    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-    headers = [normalize_header(value) for value in header_row]
-
-    indices = {}
-    for key in required + optional:
-        idx = find_header_index(headers, COLUMN_ALIASES.get(key, [key]))
-        if key in required and idx is None:
+    columns = LETTER_COLUMNS.resolve(read_header(ws))
+    for key in REQUIRED_COLUMNS:
+        if columns[key] is None:
             raise ValueError(f"Missing required column: {key}")
-        indices[key] = idx
 
     rows = []
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if all(v is None for v in row):
-            continue
-        data = {}
-        for key in required + optional:
-            idx = indices.get(key)
-            data[key] = row[idx] if idx is not None else None
-        if not data["party_name"]:
+    for row_idx, row in iter_records(ws, columns):
+        if not row.party_name:
             raise ValueError(f"Row {row_idx} missing party_name.")
-        rows.append(data)
+        record = row._asdict()
+        record["source_row"] = row_idx
+        rows.append(record)
     return rows
 
 
-def write_index(output_dir, rows):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Index"
-    ws.append(["party_name", "amount", "balance_date", "file"])
-    for row in rows:
-        ws.append(row)
-    wb.save(output_dir / "index.xlsx")
+def sample_value(amount):
+    if isinstance(amount, (int, float)):
+        return abs(float(amount))
+    try:
+        return abs(float(str(amount).replace(",", "").strip()))
+    except ValueError:
+        return 0.0
+
+
+def select_mus(values, size, rng):
+    # Monetary-unit sampling: one cumulative-sum pass, then each selection
+    # point start + k * interval is mapped to its row by binary search.
+    cumulative = list(accumulate(values))
+    total = cumulative[-1] if cumulative else 0.0
+    interval = total / size
+    start = rng.uniform(0, interval)
+    picked = {}
+    for k in range(size):
+        idx = min(bisect_right(cumulative, start + k * interval), len(values) - 1)
+        picked[idx] = picked.get(idx, 0) + 1
+    notes = {idx: f"MUS x{hits}" if hits > 1 else "MUS" for idx, hits in picked.items()}
+    summary = [
+        ["Sampling interval", interval],
+        ["Random start", start],
+        ["Items hit more than once", sum(1 for hits in picked.values() if hits > 1)],
+    ]
+    return notes, summary, []
+
+
+def select_stratified(values, size, strata, rng):
+    # Strata of roughly equal value: boundaries are found by binary search
+    # on the cumulative balance of the rows sorted by balance.
+    order = sorted((idx for idx, value in enumerate(values) if value > 0), key=values.__getitem__)
+    cumulative = list(accumulate(values[idx] for idx in order))
+    total = cumulative[-1]
+    # An item that completes a stratum's share of the value stays in it.
+    bounds = [0] + [bisect_right(cumulative, total * h / strata) for h in range(1, strata)] + [len(order)]
+    notes = {}
+    table = []
+    for h in range(strata):
+        members = order[bounds[h] : bounds[h + 1]]
+        if not members:
+            continue
+        value = sum(values[idx] for idx in members)
+        count = min(len(members), max(1, round(size * value / total)))
+        for idx in rng.sample(members, count):
+            notes[idx] = f"Stratum {h + 1}"
+        table.append([h + 1, values[members[0]], values[members[-1]], len(members), value, count])
+    return notes, [["Strata", len(table)]], table
+
+
+def select_top(values, size, top, rng):
+    # The largest balances are always selected; the rest is a simple random sample.
+    order = sorted(range(len(values)), key=lambda idx: -values[idx])
+    notes = {idx: "Top" for idx in order[:top]}
+    rest = order[top:]
+    for idx in rng.sample(rest, min(len(rest), max(0, size - top))):
+        notes[idx] = "Random"
+    threshold = values[order[top - 1]] if 0 < top <= len(order) else None
+    return notes, [["Top items", min(top, len(order))], ["Top threshold", threshold]], []
+
+
+def draw_sample(rows, method, size, top, strata, seed):
+    # Returns the selected rows in input order plus the workpaper contents.
+    import random
+
+    values = [sample_value(row["amount"]) for row in rows]
+    total = sum(values)
+    if size <= 0:
+        raise ValueError("--sample needs a positive --sample-size")
+    if total <= 0 and method != "top":
+        raise ValueError("No party has a non-zero balance to sample")
+    rng = random.Random(seed)
+    if method == "mus":
+        notes, details, table = select_mus(values, size, rng)
+    elif method == "stratified":
+        notes, details, table = select_stratified(values, size, max(1, strata), rng)
+    else:
+        notes, details, table = select_top(values, size, top, rng)
+
+    picked = sorted(notes)
+    selected_value = sum(values[idx] for idx in picked)
+    summary = [
+        ["Method", method],
+        ["Seed", seed],
+        ["Population items", len(rows)],
+        ["Population value", total],
+        ["Items with zero or non-numeric balance", sum(1 for value in values if value == 0)],
+        ["Requested sample size", size],
+        ["Selected items", len(picked)],
+        ["Selected value", selected_value],
+        ["Value coverage", selected_value / total if total else None],
+    ] + details
+    return [(idx, notes[idx]) for idx in picked], summary, table
+
+
+def write_sample(output_dir, rows, selected, summary, table):
+    with OutputWorkbook(output_dir / SAMPLE_NAME) as out:
+        ws = out.add_sheet("Sample", ["source_row", "party_name", "amount", "balance_date", "selection"])
+        for idx, note in selected:
+            row = rows[idx]
+            ws.append([row["source_row"], row["party_name"], row["amount"], format_date(row["balance_date"]), note])
+        ws = out.add_sheet("Workpaper", ["item", "value"])
+        for row in summary:
+            ws.append(row)
+        if table:
+            ws = out.add_sheet("Strata", ["stratum", "lower", "upper", "items", "value", "sample"])
+            for row in table:
+                ws.append(row)
+        out.save()
+
+
+def letter_context(idx, row):
+    party_name = str(row["party_name"]).strip()
+    amount = row["amount"]
+    balance_date = row["balance_date"]
+
+    data = {
+        "party_name": party_name,
+        "address": row.get("address") or "",
+        "contact": row.get("contact") or "",
+        "currency": row.get("currency") or "",
+        "remarks": row.get("remarks") or "",
+        "amount": amount if amount is not None else "",
+        "amount_formatted": format_amount(amount),
+        # Kept as a date when it is one, so {{balance_date:%Y年%m月%d日}} works.
+        "balance_date": balance_date if isinstance(balance_date, (datetime, date)) else format_date(balance_date),
+    }
+
+    safe_name = sanitize_filename(party_name) or f"party_{idx}"
+    filename = f"{safe_name}.docx"
+    return data, filename, [party_name, amount, format_date(balance_date), filename]
+
+
+def init_worker(template_path, engine):
+    global _worker_template
+    _worker_template = load_renderer(template_path, engine)
+
+
+def render_letter(data):
+    return _worker_template.to_bytes(data)
+
+
+def render_parallel(template_path, engine, letters, workers):
+    # Each worker parses the template once and returns the letter bytes in
+    # input order, so the output does not depend on worker scheduling.
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    chunksize = max(1, len(letters) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=call_function, initargs=(function_ref(init_worker), template_path, engine)
+    ) as pool:
+        yield from pool.map(partial(call_function, function_ref(render_letter)), letters, chunksize=chunksize)
+
 
+def write_index(output_dir, rows, pages=None):
+    with OutputWorkbook(output_dir / "index.xlsx") as out:
+        ws = out.add_sheet("Index", ["party_name", "amount", "balance_date", "file"])
+        for row in rows:
+            ws.append(row)
+        if pages is not None:
+            ws = out.add_sheet("Pages", ["party_name", "file", "est_first_page", "est_last_page"])
+            for row in pages:
+                ws.append(row)
+        out.save()
 
-def main():
+
+def write_letter_files(args, template, output_dir, letters, profiler):
+    key = {
+        "template": file_digest(args.template) if args.template else "",
+        "code": code_version(__file__),
+        "archive": args.archive,
+    }
+    letter_manifest = LetterManifest(output_dir, key, args.force)
+    sink = LetterSink(output_dir, args.archive)
+    plan = []
+    for data, filename in letters.values():
+        digest = data_digest(data)
+        plan.append((data, filename, digest, not (letter_manifest.unchanged(filename, digest) and sink.has(filename))))
+    changed = [data for data, _, _, fresh in plan if fresh]
+    removed = letter_manifest.removed(letters)
+
+    workers = min(args.workers, len(changed))
+    try:
+        payloads = render_parallel(args.template, template.engine, changed, workers) if workers > 1 else None
+        for data, filename, _, fresh in plan:
+            if not fresh:
+                with profiler.stage("write"):
+                    sink.keep(filename)
+                continue
+            with profiler.stage("compute") as stage:
+                payload = next(payloads) if payloads else template.to_bytes(data)
+                stage.add_rows(1)
+            with profiler.stage("write") as stage:
+                sink.write(filename, payload)
+                stage.add_rows(1)
+        for filename in removed:
+            sink.remove(filename)
+    except Exception:
+        sink.close(ok=False)
+        raise
+    sink.close()
+    stale = letter_manifest.stale_output(output_dir, args.archive)
+    for path in stale:
+        path.unlink()
+    letter_manifest.save({filename: digest for _, filename, digest, _ in plan})
+
+    destination = output_dir / ARCHIVE_NAME if args.archive else output_dir
+    if len(changed) == len(plan) and not removed:
+        message = f"Generated {len(plan)} letter(s) in {destination}"
+    else:
+        message = (
+            f"Generated {len(changed)} of {len(plan)} letter(s) in {destination} "
+            f"({len(plan) - len(changed)} unchanged, {len(removed)} removed)"
+        )
+    if stale:
+        message += f"; removed {len(stale)} file(s) left by the previous {'loose' if args.archive else 'archive'} output"
+    return message
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Generate confirmation letters from Excel.")
-    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx (default: input.xlsx).")
+    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx, .csv or .parquet (default: input.xlsx).")
     parser.add_argument("--output", default="output", help="Output folder (default: output).")
     parser.add_argument("--sheet", default="", help="Sheet name (default: first sheet).")
     parser.add_argument("--template", default="", help="Template .docx with {{placeholders}}.")
     parser.add_argument("--make-template", default="", help="Create a sample template and exit.")
-    args = parser.parse_args()
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for writing letters (default: 1).")
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="ooxml",
+        help="ooxml edits the .docx XML directly (falls back to docx when it cannot); docx uses python-docx.",
+    )
+    parser.add_argument("--archive", action="store_true", help=f"Write all letters into {ARCHIVE_NAME}.")
+    parser.add_argument("--merge", action="store_true", help=f"Write all letters into one {MERGED_NAME}.docx.")
+    parser.add_argument(
+        "--pages-per-file", type=int, default=0, help="With --merge, start a new document after this many pages."
+    )
+    parser.add_argument("--sample", choices=SAMPLE_METHODS, help="Write letters only for a sample of the parties.")
+    parser.add_argument("--sample-size", type=int, default=0, help="Number of parties to sample.")
+    parser.add_argument("--top", type=int, default=0, help="With --sample top, always take the N largest balances.")
+    parser.add_argument("--strata", type=int, default=3, help="With --sample stratified, number of strata (default: 3).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for sampling (default: 1).")
+    add_memo_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    merge = args.merge or args.pages_per_file > 0
+    if merge and args.archive:
+        parser.error("--merge cannot be combined with --archive")
+    if merge and args.workers > 1:
+        print("Note: --workers is ignored with --merge; letters are merged one at a time.")
+    profiler = Profiler.from_args(args, "confirm")
 
     if args.make_template:
         make_template(args.make_template)
         print(f"Template saved: {args.make_template}")
         return 0
 
+    manifest = RunManifest("confirm", __file__, args, [args.input, args.template], args.output)
+    cached = manifest.cached_exit_code()
+    if cached is not None:
+        return cached
+
     try:
-        wb = load_workbook(args.input, data_only=True)
-        ws = wb[args.sheet] if args.sheet else wb.active
-        rows = read_rows(ws)
+        with profiler.stage("load"):
+            wb = open_workbook(args.input)
+        try:
+            with profiler.stage("parse") as stage:
+                ws = wb[args.sheet] if args.sheet else wb.active
+                rows = read_rows(ws)
+                stage.add_rows(len(rows))
+        finally:
+            wb.close()
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
@@ -225,36 +1022,66 @@ def main():
     output_dir = Path(args.output)
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    try:
+        with profiler.stage("load"):
+            template = load_renderer(args.template, args.engine)
+    except Exception as exc:
+        print(f"ERROR: Cannot read template {args.template}: {exc}", file=sys.stderr)
+        return 1
+    unknown = sorted(template.placeholders - set(LETTER_FIELDS))
+    if unknown:
+        names = ", ".join(f"{{{{{name}}}}}" for name in unknown)
+        print(f"Warning: unknown placeholder(s) left as is: {names}", file=sys.stderr)
+
+    numbered = list(enumerate(rows, start=1))
+    if args.sample:
+        try:
+            with profiler.stage("compute") as stage:
+                selected, summary, table = draw_sample(
+                    rows, args.sample, args.sample_size, args.top, args.strata, args.seed
+                )
+                stage.add_rows(len(rows))
+            with profiler.stage("write"):
+                write_sample(output_dir, rows, selected, summary, table)
+        except ValueError as exc:
+            print(f"ERROR: {exc}", file=sys.stderr)
+            return 1
+        numbered = [numbered[idx] for idx, _ in selected]
+        print(f"Sampled {len(numbered)} of {len(rows)} parties ({args.sample}); see {output_dir / SAMPLE_NAME}")
+
     index_rows = []
-    for idx, data in enumerate(rows, start=1):
-        party_name = str(data["party_name"]).strip()
-        amount = data["amount"]
-        balance_date = data["balance_date"]
-
-        data = {
-            "party_name": party_name,
-            "address": data.get("address") or "",
-            "contact": data.get("contact") or "",
-            "currency": data.get("currency") or "",
-            "remarks": data.get("remarks") or "",
-            "amount": amount if amount is not None else "",
-            "amount_formatted": format_amount(amount),
-            "balance_date": format_date(balance_date),
-        }
+    datas = []
+    letters = {}
+    for idx, row in numbered:
+        data, filename, index_row = letter_context(idx, row)
+        datas.append(data)
+        # A later party with the same file name overwrites the earlier letter.
+        letters[os.path.normcase(filename)] = (data, filename)
+        index_rows.append(index_row)
 
-        if args.template:
-            doc = Document(args.template)
+    try:
+        if merge:
+            with profiler.stage("write") as stage:
+                ranges = merge_letters(template, output_dir, datas, args.pages_per_file)
+                stage.add_rows(len(ranges))
+            pages = []
+            for index_row, (filename, first, last) in zip(index_rows, ranges):
+                index_row[3] = filename
+                pages.append([index_row[0], filename, first, last])
+            files = len({filename for filename, _, _ in ranges})
+            message = f"Merged {len(ranges)} letter(s) into {files} document(s) in {output_dir}"
         else:
-            doc = build_default_template()
-        fill_placeholders(doc, data)
-
-        safe_name = sanitize_filename(party_name) or f"party_{idx}"
-        filename = f"{safe_name}.docx"
-        doc.save(output_dir / filename)
-        index_rows.append([party_name, amount, format_date(balance_date), filename])
+            pages = None
+            message = write_letter_files(args, template, output_dir, letters, profiler)
+    except Exception as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        return 1
 
-    write_index(output_dir, index_rows)
-    print(f"Generated {len(index_rows)} letter(s) in {output_dir}")
+    with profiler.stage("write"):
+        write_index(output_dir, index_rows, pages)
+    print(message)
+    profiler.write(output_dir, input=args.input)
+    manifest.save()
     return 0
 
 
@@ -1,5 +1,10 @@
 @echo off
 setlocal
 cd /d "%~dp0"
-python generate_confirmations.py --input input.xlsx --output output
+rem Without the shared audit.py next to the folder, run the script itself.
+if exist ..\audit.py (
+    python ..\audit.py confirm --input input.xlsx --output output
+) else (
+    python generate_confirmations.py --input input.xlsx --output output
+)
 pause
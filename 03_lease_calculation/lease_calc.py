@@ -1,11 +1,18 @@
 import argparse
 import calendar
-import re
 import sys
-from datetime import date, datetime
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from itertools import repeat
 from pathlib import Path
 
-from openpyxl import Workbook, load_workbook
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.cache import RowCache, add_cache_arguments
+from audit_common.memo import RunManifest, add_memo_arguments
+from audit_common.profiling import Profiler, add_profile_arguments
+from audit_common.reader import HeaderIndex, iter_records, open_workbook, read_header
+from audit_common.writer import OutputWorkbook
 
 
 HEADER_ALIASES = {
@@ -18,28 +25,97 @@ HEADER_ALIASES = {
     "payment_timing": ["payment_timing", "付款时点", "期初期末", "期初/期末"],
     "currency": ["currency", "币种", "币别"],
 }
-
-
-def normalize_header(value):
-    if value is None:
-        return ""
-    text = str(value).strip().lower()
-    text = text.replace("（", "(").replace("）", ")")
-    text = re.sub(r"\s+", "", text)
-    text = re.sub(r"[()（）\[\]【】:%/\\-]", "", text)
-    return text
-
-
-def find_header_index(headers, aliases):
-    alias_norms = [normalize_header(a) for a in aliases]
-    for alias in alias_norms:
-        if alias in headers:
-            return headers.index(alias)
-    for idx, header in enumerate(headers):
-        for alias in alias_norms:
-            if alias and alias in header:
-                return idx
-    return None
+REQUIRED_COLUMNS = [
+    "contract_id",
+    "lease_start",
+    "lease_end",
+    "payment_amount",
+    "payment_frequency",
+    "discount_rate",
+    "payment_timing",
+]
+LEASE_COLUMNS = HeaderIndex(HEADER_ALIASES)
+MODIFICATION_ALIASES = {
+    "contract_id": HEADER_ALIASES["contract_id"],
+    "effective_date": ["effective_date", "生效日期", "变更日期", "修改日期"],
+    "payment_amount": ["new_payment", "新租金", *HEADER_ALIASES["payment_amount"]],
+    "discount_rate": ["new_rate", "新折现率", *HEADER_ALIASES["discount_rate"]],
+    "lease_end": ["new_end", "新结束日期", "新到期日", *HEADER_ALIASES["lease_end"]],
+}
+MODIFICATION_COLUMNS = HeaderIndex(MODIFICATION_ALIASES)
+ENGINES = ("python", "numpy")
+VECTOR_CHUNK = 4096
+ROLLFORWARD_MONTHS = {"M": 1, "Q": 3, "A": 12}
+# The portfolio total's label carries the reporting currency, e.g.
+# "Total (CNY)", so it cannot be mistaken for a currency of its own.
+PORTFOLIO = "Total ({})"
+
+SUMMARY_HEADER = [
+    "contract_id",
+    "currency",
+    "payment_amount",
+    "periods",
+    "annual_rate",
+    "initial_liability",
+    "total_interest",
+    "ending_balance",
+    "rou_cost",
+]
+
+BALANCE_HEADER = [
+    "contract_id",
+    "currency",
+    "as_of",
+    "payments_made",
+    "carrying_amount",
+    "interest_to_date",
+    "current",
+    "non_current",
+    "status",
+]
+
+MODIFICATION_HEADER = [
+    "contract_id",
+    "effective_date",
+    "first_period",
+    "carrying_amount",
+    "remeasured_amount",
+    "adjustment",
+    "payment_amount",
+    "annual_rate",
+    "lease_end",
+    "remaining_periods",
+    "rou_adjustment",
+]
+
+SCHEDULE_HEADER = [
+    "contract_id",
+    "period",
+    "payment_date",
+    "opening_balance",
+    "payment",
+    "interest",
+    "principal",
+    "closing_balance",
+    "depreciation",
+    "rou_nbv",
+]
+
+ROLLFORWARD_HEADER = [
+    "currency",
+    "period",
+    "liability_opening",
+    "additions",
+    "remeasurements",
+    "interest",
+    "payments",
+    "liability_closing",
+    "rou_opening",
+    "rou_additions",
+    "rou_remeasurements",
+    "depreciation",
+    "rou_closing",
+]
 
 
 def parse_date(value):
@@ -91,6 +167,20 @@ def parse_rate(value):
     return num
 
 
+def parse_fx_rates(text):
+    # "USD=7.1,HKD=0.91": units of the reporting currency per unit of each.
+    rates = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        code, sep, value = item.partition("=")
+        rate = parse_number(value) if sep else None
+        if not code.strip() or rate is None or rate <= 0:
+            raise ValueError(f"Invalid FX rate: {item.strip()} (expected CODE=rate)")
+        rates[code.strip().upper()] = rate
+    return rates
+
+
 def parse_number(value):
     if value is None:
         return None
@@ -109,39 +199,52 @@ def parse_number(value):
 
 
 def read_leases(ws):
-    required = [
-        "contract_id",
-        "lease_start",
-        "lease_end",
-        "payment_amount",
-        "payment_frequency",
-        "discount_rate",
-        "payment_timing",
-    ]
-    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-    headers = [normalize_header(value) for value in header_row]
-    indices = {}
-    for key in required:
-        idx = find_header_index(headers, HEADER_ALIASES.get(key, [key]))
-        if idx is None:
+    columns = LEASE_COLUMNS.resolve(read_header(ws))
+    for key in REQUIRED_COLUMNS:
+        if columns[key] is None:
             raise ValueError(f"Missing required column: {key}")
-        indices[key] = idx
-    currency_idx = find_header_index(headers, HEADER_ALIASES["currency"])
 
     leases = []
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if all(v is None for v in row):
-            continue
-        lease = {}
-        for key in required:
-            lease[key] = row[indices[key]]
-        lease["currency"] = row[currency_idx] if currency_idx is not None else ""
+    for row_idx, row in iter_records(ws, columns):
+        lease = row._asdict()
+        if columns["currency"] is None:
+            lease["currency"] = ""
         if not lease["contract_id"]:
             raise ValueError(f"Row {row_idx} missing contract_id.")
         leases.append(lease)
     return leases
 
 
+def read_modifications(ws):
+    columns = MODIFICATION_COLUMNS.resolve(read_header(ws))
+    for key in ("contract_id", "effective_date"):
+        if columns[key] is None:
+            raise ValueError(f"Missing required modification column: {key}")
+
+    events = {}
+    for row_idx, row in iter_records(ws, columns):
+        if not row.contract_id:
+            raise ValueError(f"Modification row {row_idx} missing contract_id.")
+        effective = parse_date(row.effective_date)
+        if effective is None:
+            raise ValueError(f"Modification row {row_idx} missing effective_date.")
+        payment = parse_number(row.payment_amount)
+        if row.payment_amount not in (None, "") and payment is None:
+            raise ValueError(f"Modification row {row_idx} has an invalid payment_amount: {row.payment_amount}")
+        events.setdefault(row.contract_id, []).append(
+            {
+                "row": row_idx,
+                "effective_date": effective,
+                "payment_amount": payment,
+                "discount_rate": parse_rate(row.discount_rate) if row.discount_rate not in (None, "") else None,
+                "lease_end": parse_date(row.lease_end) if row.lease_end not in (None, "") else None,
+            }
+        )
+    for contract_events in events.values():
+        contract_events.sort(key=lambda event: event["effective_date"])
+    return events
+
+
 def generate_payment_dates(start, end, freq_months, timing):
     dates = []
     if timing == "begin":
@@ -154,7 +257,7 @@ def generate_payment_dates(start, end, freq_months, timing):
     return dates
 
 
-def calculate_schedule(lease):
+def lease_terms(lease):
     start = parse_date(lease["lease_start"])
     end = parse_date(lease["lease_end"])
     if not start or not end or end < start:
@@ -172,26 +275,42 @@ def calculate_schedule(lease):
         timing = "end"
     if timing not in ("begin", "end"):
         raise ValueError(f"Invalid payment_timing for {lease['contract_id']}: {timing}")
+    return start, end, payment, freq_months, annual_rate, timing
 
+
+def periodic_rate_of(annual_rate, freq_months):
+    periods_per_year = 12 / freq_months
+    return annual_rate / periods_per_year if periods_per_year else 0.0
+
+
+def annuity_value(payment, periodic_rate, periods, timing):
+    if periodic_rate == 0:
+        return payment * periods
+    value = payment * (1 - (1 + periodic_rate) ** (-periods)) / periodic_rate
+    if timing == "begin":
+        value = value * (1 + periodic_rate)
+    return value
+
+
+def calculate_schedule(lease):
+    start, end, payment, freq_months, annual_rate, timing = lease_terms(lease)
     dates = generate_payment_dates(start, end, freq_months, timing)
     if not dates:
         raise ValueError(f"No payment dates for {lease['contract_id']}")
 
-    periods_per_year = 12 / freq_months
-    periodic_rate = annual_rate / periods_per_year if periods_per_year else 0.0
+    periodic_rate = periodic_rate_of(annual_rate, freq_months)
     n = len(dates)
+    pv = annuity_value(payment, periodic_rate, n, timing)
+    schedule = roll_forward(pv, pv, payment, periodic_rate, timing, dates)
+    return pv, sum(row["interest"] for row in schedule), schedule
 
-    if periodic_rate == 0:
-        pv = payment * n
-    else:
-        pv = payment * (1 - (1 + periodic_rate) ** (-n)) / periodic_rate
-        if timing == "begin":
-            pv = pv * (1 + periodic_rate)
 
+def roll_forward(opening, asset, payment, periodic_rate, timing, dates, first_period=1, periods=None):
+    # The right-of-use asset is depreciated straight-line over the periods;
+    # `periods` is their number when only the first of them are rolled.
     schedule = []
-    opening = pv
-    total_interest = 0.0
-    for idx, pay_date in enumerate(dates, start=1):
+    count = periods or len(dates)
+    for idx, pay_date in enumerate(dates, start=first_period):
         if timing == "begin":
             principal = payment
             balance_after_payment = opening - principal
@@ -211,108 +330,613 @@ def calculate_schedule(lease):
                 "interest": interest,
                 "principal": principal,
                 "closing_balance": closing,
+                "depreciation": asset / count,
+                "rou_nbv": asset * (count - (idx - first_period + 1)) / count,
             }
         )
-        total_interest += interest
         opening = closing
-
-    return pv, total_interest, schedule
-
-
-def write_output(path, results):
-    wb = Workbook()
-    ws_summary = wb.active
-    ws_summary.title = "Summary"
-    ws_summary.append(
-        [
-            "contract_id",
-            "currency",
-            "payment_amount",
-            "periods",
-            "annual_rate",
-            "initial_liability",
-            "total_interest",
-            "ending_balance",
+    return schedule
+
+
+def iter_schedule_rows(schedule):
+    for row in schedule:
+        yield [
+            row["period"],
+            row["payment_date"],
+            row["opening_balance"],
+            row["payment"],
+            row["interest"],
+            row["principal"],
+            row["closing_balance"],
+            row["depreciation"],
+            row["rou_nbv"],
         ]
-    )
 
-    ws_schedule = wb.create_sheet("Schedule")
-    ws_schedule.append(
-        [
-            "contract_id",
-            "period",
-            "payment_date",
-            "opening_balance",
-            "payment",
-            "interest",
-            "principal",
-            "closing_balance",
-        ]
-    )
 
-    for result in results:
-        lease = result["lease"]
-        pv = result["pv"]
-        total_interest = result["total_interest"]
-        schedule = result["schedule"]
-        ending_balance = schedule[-1]["closing_balance"] if schedule else 0
-        ws_summary.append(
+def lease_segments(lease, events=()):
+    # Terms in force from inception and after each modification. A segment is
+    # an annuity over its payments, valued at the last payment before it takes
+    # effect, so positions inside it have a closed form. first_slot counts
+    # the payment dates before the segment; made_before counts the periods
+    # paid before it, which is smaller when a lease is extended after expiry.
+    start, end, payment, freq_months, annual_rate, timing = lease_terms(lease)
+    n = payments_through(start, freq_months, timing, end)
+    if not n:
+        raise ValueError(f"No payment dates for {lease['contract_id']}")
+    rate = periodic_rate_of(annual_rate, freq_months)
+    value = annuity_value(payment, rate, n, timing)
+    segment = {
+        "effective": date.min,
+        "first_slot": 0,
+        "made_before": 0,
+        "payments": n,
+        "payment": payment,
+        "rate": rate,
+        "value": value,
+        "interest_before": 0.0,
+        "asset": value,
+    }
+    segments = [segment]
+    adjustments = []
+    for event in events:
+        effective = event["effective_date"]
+        # Payments dated before the effective date stay under the old terms.
+        slots = payments_through(start, freq_months, timing, effective - timedelta(days=1))
+        paid = segment_made(segment, slots)
+        made = segment["made_before"] + paid
+        carrying, interest = segment_position(segment, paid, timing)
+        nbv = asset_position(segment, paid)
+        if event["payment_amount"] is not None:
+            payment = event["payment_amount"]
+        if event["discount_rate"] is not None:
+            annual_rate = event["discount_rate"]
+        if event["lease_end"] is not None:
+            end = event["lease_end"]
+        remaining = max(payments_through(start, freq_months, timing, end) - slots, 0)
+        rate = periodic_rate_of(annual_rate, freq_months)
+        value = annuity_value(payment, rate, remaining, timing)
+        segment = {
+            "effective": effective,
+            "first_slot": slots,
+            "made_before": made,
+            "payments": remaining,
+            "payment": payment,
+            "rate": rate,
+            "value": value,
+            "interest_before": interest,
+            # The liability adjustment goes to the asset, which cannot go below
+            # zero; a lease with no payments left is written off.
+            "asset": max(nbv + value - carrying, 0.0) if remaining else 0.0,
+        }
+        segments.append(segment)
+        adjustments.append(
             [
                 lease["contract_id"],
-                lease.get("currency", ""),
-                float(lease["payment_amount"]),
-                len(schedule),
-                parse_rate(lease["discount_rate"]),
-                pv,
-                total_interest,
-                ending_balance,
+                effective,
+                made + 1,
+                carrying,
+                segment["value"],
+                segment["value"] - carrying,
+                payment,
+                annual_rate,
+                end,
+                remaining,
+                segment["asset"] - nbv,
             ]
         )
-        for row in schedule:
-            ws_schedule.append(
+    return (start, freq_months, timing), segments, adjustments
+
+
+def segment_made(segment, slots):
+    # Payments of the segment among the first `slots` payment dates.
+    return min(max(slots - segment["first_slot"], 0), segment["payments"])
+
+
+def segment_position(segment, made, timing):
+    # Liability and interest to date after `made` of the segment's payments.
+    balance = annuity_value(segment["payment"], segment["rate"], segment["payments"] - made, timing)
+    interest = segment["interest_before"] + segment["payment"] * made - (segment["value"] - balance)
+    return balance, interest
+
+
+def asset_position(segment, made):
+    # Right-of-use net book value after `made` of the segment's periods.
+    if not segment["payments"]:
+        return segment["asset"]
+    return segment["asset"] * (segment["payments"] - made) / segment["payments"]
+
+
+def modified_result(lease, events):
+    # Each segment is rolled forward only up to the period the next
+    # modification takes over, so no period is computed and then dropped.
+    (start, freq_months, timing), segments, adjustments = lease_segments(lease, events)
+    schedule = []
+    for segment, following in zip(segments, segments[1:] + [None]):
+        made = segment["made_before"]
+        count = segment["payments"] if following is None else following["made_before"] - made
+        current = payment_date_at(start, freq_months, timing, segment["first_slot"])
+        dates = []
+        for _ in range(count):
+            dates.append(current)
+            current = add_months(current, freq_months)
+        schedule.extend(
+            roll_forward(
+                segment["value"],
+                segment["asset"],
+                segment["payment"],
+                segment["rate"],
+                timing,
+                dates,
+                made + 1,
+                segment["payments"],
+            )
+        )
+    return {
+        "lease": lease,
+        "pv": segments[0]["value"],
+        "total_interest": sum(row["interest"] for row in schedule),
+        "periods": len(schedule),
+        # A lease terminated early ends at its remeasured value of zero.
+        "ending_balance": schedule[-1]["closing_balance"] if segments[-1]["payments"] else segments[-1]["value"],
+        "rows": iter_schedule_rows(schedule),
+        "adjustments": adjustments,
+    }
+
+
+def iter_results(leases, modifications=None):
+    for lease in leases:
+        events = modifications.get(lease["contract_id"]) if modifications else None
+        if events:
+            yield modified_result(lease, events)
+            continue
+        pv, total_interest, schedule = calculate_schedule(lease)
+        yield {
+            "lease": lease,
+            "pv": pv,
+            "total_interest": total_interest,
+            "periods": len(schedule),
+            "ending_balance": schedule[-1]["closing_balance"] if schedule else 0,
+            "rows": iter_schedule_rows(schedule),
+            "adjustments": (),
+        }
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The numpy engine requires numpy (pip install numpy).") from None
+    return numpy
+
+
+def payment_date_array(np, start, end, freq_months, timing):
+    # Same dates as generate_payment_dates: each step adds freq_months and
+    # clamps the day to the month length, so the day is a running minimum.
+    first = 0 if timing == "begin" else freq_months
+    months_between = (end.year - start.year) * 12 + end.month - start.month
+    count = max(0, (months_between - first) // freq_months + 1)
+    months = np.datetime64(f"{start.year:04d}-{start.month:02d}", "M") + first + freq_months * np.arange(count)
+    month_starts = months.astype("datetime64[D]")
+    month_days = ((months + 1).astype("datetime64[D]") - month_starts).astype(np.int64)
+    days = np.minimum.accumulate(np.minimum(month_days, start.day))
+    dates = month_starts + (days - 1)
+    return dates[dates <= np.datetime64(end)]
+
+
+def vector_schedules(np, payments, rates, n, timing):
+    # Schedules of k leases with the same period count and timing as (k, n)
+    # arrays; each period is one array step, in the scalar path's order.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pv = np.where(rates == 0, payments * n, payments * (1 - (1 + rates) ** (-n)) / rates)
+    if timing == "begin":
+        pv = pv * (1 + rates)
+    opening = np.empty((len(payments), n))
+    interest = np.empty_like(opening)
+    principal = np.empty_like(opening)
+    closing = np.empty_like(opening)
+    balance = pv
+    for t in range(n):
+        opening[:, t] = balance
+        if timing == "begin":
+            principal[:, t] = payments
+            after_payment = balance - payments
+            interest[:, t] = after_payment * rates
+            closing[:, t] = after_payment + interest[:, t]
+        else:
+            interest[:, t] = balance * rates
+            principal[:, t] = payments - interest[:, t]
+            closing[:, t] = balance - principal[:, t]
+        balance = closing[:, t]
+    return pv, opening, interest, principal, closing
+
+
+def iter_vector_chunk(np, leases, modifications=None):
+    terms = []
+    groups = {}
+    for lease in leases:
+        if modifications and lease["contract_id"] in modifications:
+            # Modified leases are remeasured one by one.
+            terms.append(None)
+            continue
+        start, end, payment, freq_months, annual_rate, timing = lease_terms(lease)
+        dates = payment_date_array(np, start, end, freq_months, timing)
+        if not len(dates):
+            raise ValueError(f"No payment dates for {lease['contract_id']}")
+        key = (len(dates), timing)
+        group = groups.setdefault(key, [])
+        terms.append((key, len(group), payment, dates))
+        group.append((payment, periodic_rate_of(annual_rate, freq_months)))
+
+    computed = {}
+    for (n, timing), group in groups.items():
+        payments = np.array([payment for payment, _ in group])
+        rates = np.array([rate for _, rate in group])
+        computed[(n, timing)] = vector_schedules(np, payments, rates, n, timing)
+
+    for lease, term in zip(leases, terms):
+        if term is None:
+            yield modified_result(lease, modifications[lease["contract_id"]])
+            continue
+        key, i, payment, dates = term
+        pv, opening, interest, principal, closing = computed[key]
+        n = key[0]
+        asset = float(pv[i])
+        yield {
+            "lease": lease,
+            "pv": asset,
+            # cumsum adds in period order, like the scalar running total.
+            "total_interest": float(np.cumsum(interest[i])[-1]),
+            "periods": n,
+            "ending_balance": float(closing[i, -1]),
+            "rows": zip(
+                range(1, n + 1),
+                dates.tolist(),
+                opening[i].tolist(),
+                repeat(payment, n),
+                interest[i].tolist(),
+                principal[i].tolist(),
+                closing[i].tolist(),
+                repeat(asset / n, n),
+                [asset * (n - t) / n for t in range(1, n + 1)],
+            ),
+            "adjustments": (),
+        }
+
+
+def iter_vector_results(leases, modifications=None):
+    # Leases are taken in chunks so memory stays bounded, and results are
+    # yielded in input order.
+    np = import_numpy()
+    for offset in range(0, len(leases), VECTOR_CHUNK):
+        yield from iter_vector_chunk(np, leases[offset : offset + VECTOR_CHUNK], modifications)
+
+
+def payment_day(start, freq_months, first, count):
+    # Each step of generate_payment_dates clamps the day to the month length,
+    # so a payment falls on the shortest month seen so far. Month lengths
+    # repeat within four years, so only that many steps are looked at.
+    day = start.day
+    if day > 28:
+        for step in range(min(count, 48 // freq_months + 1)):
+            month = start.month - 1 + first + step * freq_months
+            day = min(day, calendar.monthrange(start.year + month // 12, month % 12 + 1)[1])
+            if day == 28:
+                break
+    return day
+
+
+def payment_date_at(start, freq_months, timing, slot):
+    # The payment date after `slot` others, as generate_payment_dates gives it.
+    first = 0 if timing == "begin" else freq_months
+    month = start.month - 1 + first + slot * freq_months
+    return date(start.year + month // 12, month % 12 + 1, payment_day(start, freq_months, first, slot + 1))
+
+
+def payments_through(start, freq_months, timing, as_of):
+    # Number of payment dates on or before as_of, without generating them.
+    first = 0 if timing == "begin" else freq_months
+    months = (as_of.year - start.year) * 12 + as_of.month - start.month - first
+    if months < 0:
+        return 0
+    count = months // freq_months + 1
+    if months % freq_months == 0 and payment_day(start, freq_months, first, count) > as_of.day:
+        count -= 1
+    return count
+
+
+def lease_balances(lease, dates, events=()):
+    # Position at each date in closed form: after k payments the liability is
+    # the annuity value of the payments left under the terms then in force,
+    # as in the Schedule sheet.
+    (start, freq_months, timing), segments, _ = lease_segments(lease, events)
+    effective_dates = [segment["effective"] for segment in segments]
+    for as_of in dates:
+        if as_of < start:
+            # Not commenced yet: no liability.
+            yield as_of, 0, 0.0, 0.0, 0.0, 0.0, "not started"
+            continue
+        segment = segments[bisect_right(effective_dates, as_of) - 1]
+        made = segment_made(segment, payments_through(start, freq_months, timing, as_of))
+        due_within_year = segment_made(segment, payments_through(start, freq_months, timing, add_months(as_of, 12)))
+        balance, interest = segment_position(segment, made, timing)
+        non_current, _ = segment_position(segment, due_within_year, timing)
+        status = "ended" if made == segment["payments"] and segment is segments[-1] else "active"
+        yield as_of, segment["made_before"] + made, balance, interest, balance - non_current, non_current, status
+
+
+def iter_balances(leases, dates, modifications=None):
+    for lease in leases:
+        events = modifications.get(lease["contract_id"], ()) if modifications else ()
+        for as_of, *position in lease_balances(lease, dates, events):
+            yield [lease["contract_id"], lease.get("currency", ""), as_of, *position]
+
+
+class RollForward:
+    # Movements are summed per currency and period while schedule rows stream
+    # past, so no schedule is kept; balances are rebuilt from them at the end.
+    # Amounts: additions, remeasurements, interest, payments, ROU additions,
+    # ROU remeasurements, depreciation. A portfolio total needs a reporting
+    # currency; every other currency is converted at one rate from `rates`.
+    def __init__(self, frequency, reporting="", rates=None):
+        self.months = ROLLFORWARD_MONTHS[frequency]
+        self.movements = {}
+        self.reporting = reporting.strip().upper()
+        self.rates = rates or {}
+
+    def rate(self, currency):
+        # Leases without a currency are taken to be in the reporting currency.
+        code = str(currency or "").strip().upper()
+        if not code or code == self.reporting:
+            return 1.0
+        return self.rates.get(code)
+
+    def missing_rates(self, currencies):
+        if not self.reporting:
+            return []
+        return sorted({str(currency).strip().upper() for currency in currencies if self.rate(currency) is None})
+
+    def _amounts(self, currency, day):
+        key = (currency or "", day.year, (day.month - 1) // self.months)
+        amounts = self.movements.get(key)
+        if amounts is None:
+            amounts = self.movements[key] = [0.0] * 7
+        return amounts
+
+    def add_lease(self, currency, start, pv):
+        amounts = self._amounts(currency, start)
+        amounts[0] += pv
+        amounts[4] += pv
+
+    def add_row(self, currency, row):
+        _, payment_date, _, payment, interest, _, _, depreciation, _ = row
+        amounts = self._amounts(currency, payment_date)
+        amounts[2] += interest
+        amounts[3] += payment
+        amounts[6] += depreciation
+
+    def add_adjustment(self, currency, effective, liability, asset):
+        amounts = self._amounts(currency, effective)
+        amounts[1] += liability
+        amounts[5] += asset
+
+    def label(self, year, index):
+        if self.months == 12:
+            return str(year)
+        if self.months == 3:
+            return f"{year}-Q{index + 1}"
+        return f"{year}-{index + 1:02d}"
+
+    def currencies(self):
+        return sorted({currency for currency, _, _ in self.movements})
+
+    def rows(self):
+        by_currency = {}
+        converted = {}
+        for (currency, year, index), amounts in self.movements.items():
+            by_currency.setdefault(currency, {})[(year, index)] = amounts
+            if self.reporting:
+                rate = self.rate(currency)
+                total = converted.setdefault((year, index), [0.0] * 7)
+                for pos, amount in enumerate(amounts):
+                    total[pos] += amount * rate
+        # The total is keyed None, which no currency can be.
+        if converted:
+            by_currency[None] = converted
+
+        # Each currency runs over every period from its first to its last
+        # movement, the portfolio total last.
+        for name in sorted(by_currency, key=lambda name: (name is None, name or "")):
+            periods = by_currency[name]
+            year, index = min(periods)
+            last = max(periods)
+            liability = asset = 0.0
+            while (year, index) <= last:
+                additions, remeasurements, interest, payments, rou_additions, rou_remeasurements, depreciation = (
+                    periods.get((year, index), [0.0] * 7)
+                )
+                closing = liability + additions + remeasurements + interest - payments
+                rou_closing = asset + rou_additions + rou_remeasurements - depreciation
+                yield [
+                    PORTFOLIO.format(self.reporting) if name is None else name,
+                    self.label(year, index),
+                    liability,
+                    additions,
+                    remeasurements,
+                    interest,
+                    payments,
+                    closing,
+                    asset,
+                    rou_additions,
+                    rou_remeasurements,
+                    depreciation,
+                    rou_closing,
+                ]
+                liability, asset = closing, rou_closing
+                index += 1
+                if index * self.months == 12:
+                    year, index = year + 1, 0
+
+
+def write_output(path, results, modifications=False, rollforward=None):
+    with OutputWorkbook(path) as out:
+        ws_summary = out.add_sheet("Summary", SUMMARY_HEADER)
+        ws_schedule = out.add_sheet("Schedule", SCHEDULE_HEADER)
+        ws_modifications = out.add_sheet("Modifications", MODIFICATION_HEADER) if modifications else None
+        ws_rollforward = out.add_sheet("RollForward", ROLLFORWARD_HEADER) if rollforward else None
+
+        schedule_rows = 0
+        for result in results:
+            lease = result["lease"]
+            currency = lease.get("currency", "")
+            ws_summary.append(
                 [
                     lease["contract_id"],
-                    row["period"],
-                    row["payment_date"],
-                    row["opening_balance"],
-                    row["payment"],
-                    row["interest"],
-                    row["principal"],
-                    row["closing_balance"],
+                    lease.get("currency", ""),
+                    parse_number(lease["payment_amount"]),
+                    result["periods"],
+                    parse_rate(lease["discount_rate"]),
+                    result["pv"],
+                    result["total_interest"],
+                    result["ending_balance"],
+                    # Cost after remeasurements: each adds its ROU adjustment.
+                    result["pv"] + sum(row[10] for row in result["adjustments"]),
                 ]
             )
-
-    wb.save(path)
-
-
-def main():
+            for row in result["rows"]:
+                ws_schedule.append([lease["contract_id"], *row])
+                if rollforward:
+                    rollforward.add_row(currency, row)
+            if rollforward:
+                start = parse_date(lease["lease_start"])
+                rollforward.add_lease(currency, start, result["pv"])
+            for row in result["adjustments"]:
+                ws_modifications.append(row)
+                if rollforward:
+                    rollforward.add_adjustment(currency, max(row[1], start), row[5], row[10])
+            schedule_rows += result["periods"]
+
+        if rollforward:
+            for row in rollforward.rows():
+                ws_rollforward.append(row)
+        out.save()
+    return schedule_rows
+
+
+def write_balances(path, rows):
+    with OutputWorkbook(path) as out:
+        ws = out.add_sheet("Balances", BALANCE_HEADER)
+        count = 0
+        for row in rows:
+            ws.append(row)
+            count += 1
+        out.save()
+    return count
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Lease amortization schedule generator.")
-    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx (default: input.xlsx).")
+    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx, .csv or .parquet (default: input.xlsx).")
     parser.add_argument("--output", default="output.xlsx", help="Output .xlsx (default: output.xlsx).")
     parser.add_argument("--sheet", default="Leases", help="Sheet name (default: Leases).")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="python",
+        help="python computes lease by lease; numpy computes many leases at once (needs numpy).",
+    )
+    parser.add_argument(
+        "--as-of",
+        default="",
+        help="Reporting date(s), comma-separated: write each lease's balance at these dates instead of schedules.",
+    )
+    parser.add_argument(
+        "--modifications",
+        default="Modifications",
+        help="Sheet of lease modifications, used when present (default: Modifications).",
+    )
+    parser.add_argument(
+        "--rollforward",
+        choices=tuple(ROLLFORWARD_MONTHS),
+        default="",
+        help="Add a RollForward sheet of liability and ROU asset movements by month (M), quarter (Q) or year (A).",
+    )
+    parser.add_argument(
+        "--reporting-currency",
+        default="",
+        help="With --rollforward, add a portfolio total in this currency (other currencies need --fx-rates).",
+    )
+    parser.add_argument(
+        "--fx-rates",
+        default="",
+        help="Rates into the reporting currency, e.g. USD=7.1,HKD=0.91.",
+    )
+    add_cache_arguments(parser)
+    add_memo_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.reporting_currency and not args.rollforward:
+        parser.error("--reporting-currency needs --rollforward")
+    if args.fx_rates and not args.reporting_currency:
+        parser.error("--fx-rates needs --reporting-currency")
+    if args.as_of and args.rollforward:
+        parser.error("--rollforward does not apply to --as-of")
+    if args.as_of and args.engine != "python":
+        parser.error("--engine does not apply to --as-of")
+    try:
+        rates = parse_fx_rates(args.fx_rates)
+    except ValueError as exc:
+        parser.error(str(exc))
+    profiler = Profiler.from_args(args, "lease")
+
+    manifest = RunManifest("lease", __file__, args, [args.input], args.output)
+    cached = manifest.cached_exit_code()
+    if cached is not None:
+        return cached
 
     try:
-        wb = load_workbook(args.input, data_only=True)
-        ws = wb[args.sheet] if args.sheet in wb.sheetnames else wb.active
-        leases = read_leases(ws)
+        as_of_dates = [parse_date(text.strip()) for text in args.as_of.split(",") if text.strip()]
+        with profiler.stage("load"):
+            wb = open_workbook(args.input, RowCache.from_args(args))
+        try:
+            with profiler.stage("parse") as stage:
+                ws = wb[args.sheet] if args.sheet in wb.sheetnames else wb.active
+                leases = read_leases(ws)
+                modifications = {}
+                if args.modifications in wb.sheetnames and args.modifications != ws.title:
+                    modifications = read_modifications(wb[args.modifications])
+                unknown = sorted(map(str, modifications.keys() - {lease["contract_id"] for lease in leases}))
+                if unknown:
+                    raise ValueError(f"Modifications for unknown contract_id: {', '.join(unknown)}")
+                rollforward = None
+                if args.rollforward:
+                    rollforward = RollForward(args.rollforward, args.reporting_currency, rates)
+                    missing = rollforward.missing_rates(lease.get("currency", "") for lease in leases)
+                    if missing:
+                        raise ValueError(f"No --fx-rates into {rollforward.reporting} for: {', '.join(missing)}")
+                stage.add_rows(len(leases))
+        finally:
+            wb.close()
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
 
-    results = []
     try:
-        for lease in leases:
-            pv, total_interest, schedule = calculate_schedule(lease)
-            results.append(
-                {"lease": lease, "pv": pv, "total_interest": total_interest, "schedule": schedule}
-            )
+        with profiler.stage("write") as stage:
+            if as_of_dates:
+                rows = profiler.iterate("compute", iter_balances(leases, as_of_dates, modifications))
+                stage.add_rows(write_balances(Path(args.output), rows))
+            else:
+                engine = iter_vector_results if args.engine == "numpy" else iter_results
+                results = profiler.iterate("compute", engine(leases, modifications))
+                stage.add_rows(write_output(Path(args.output), results, bool(modifications), rollforward))
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
-
-    write_output(Path(args.output), results)
+    if rollforward and not rollforward.reporting and len(rollforward.currencies()) > 1:
+        print("Note: the RollForward sheet has no portfolio total; add one with --reporting-currency and --fx-rates.")
     print(f"Saved output: {args.output}")
+    profiler.write(args.output, input=args.input)
+    manifest.save()
     return 0
 
 
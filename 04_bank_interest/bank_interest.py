@@ -1,9 +1,16 @@
 import argparse
-import re
 import sys
 from datetime import date, datetime
+from pathlib import Path
 
-from openpyxl import Workbook, load_workbook
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.batch import add_batch_arguments, run_batch
+from audit_common.cache import RowCache, add_cache_arguments
+from audit_common.memo import RunManifest, add_memo_arguments
+from audit_common.profiling import Profiler, add_profile_arguments
+from audit_common.reader import HeaderIndex, iter_values, open_workbook, read_header
+from audit_common.writer import OutputWorkbook
 
 
 COLUMN_ALIASES = {
@@ -16,28 +23,7 @@ COLUMN_ALIASES = {
     "account": ["account", "账号", "账户", "银行账号", "账户号"],
     "direction": ["direction", "余额方向", "借贷方向", "方向"],
 }
-
-
-def normalize_header(value):
-    if value is None:
-        return ""
-    text = str(value).strip().lower()
-    text = text.replace("（", "(").replace("）", ")")
-    text = re.sub(r"\s+", "", text)
-    text = re.sub(r"[()（）\[\]【】:%/\\-]", "", text)
-    return text
-
-
-def find_header_index(headers, aliases):
-    alias_norms = [normalize_header(a) for a in aliases]
-    for alias in alias_norms:
-        if alias in headers:
-            return headers.index(alias)
-    for idx, header in enumerate(headers):
-        for alias in alias_norms:
-            if alias and alias in header:
-                return idx
-    return None
+DEPOSIT_COLUMNS = HeaderIndex(COLUMN_ALIASES)
 
 
 def parse_date(value):
@@ -83,82 +69,101 @@ def parse_number(value):
 
 
 def read_rows(ws):
-    required = ["principal", "annual_rate"]
-    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-    headers = [normalize_header(value) for value in header_row]
-    indices = {}
-    for key in required:
-        idx = find_header_index(headers, COLUMN_ALIASES[key])
-        if idx is None:
+    header_row = read_header(ws)
+    columns = DEPOSIT_COLUMNS.resolve(header_row)
+    for key in ("principal", "annual_rate"):
+        if columns[key] is None:
             raise ValueError(f"Missing required column: {key}")
-        indices[key] = idx
-    for key in ("days", "start_date", "end_date", "day_count", "account", "direction"):
-        indices[key] = find_header_index(headers, COLUMN_ALIASES[key])
-    return indices
+    rows = ((row_idx, row, columns.record(row)) for row_idx, row in iter_values(ws, width=len(header_row)))
+    return header_row, rows
+
+
+def calculate_interest(row_idx, deposit):
+    if deposit.principal is None or deposit.annual_rate is None:
+        raise ValueError(f"Row {row_idx} missing principal or annual_rate.")
 
+    principal = parse_number(deposit.principal)
+    if principal is None:
+        raise ValueError(f"Row {row_idx} invalid principal.")
+    annual_rate = parse_rate(deposit.annual_rate)
 
-def main():
+    day_count = int(deposit.day_count) if deposit.day_count else 365
+
+    if deposit.days is not None:
+        days = int(deposit.days)
+    else:
+        start_date = parse_date(deposit.start_date)
+        end_date = parse_date(deposit.end_date)
+        if not start_date or not end_date:
+            raise ValueError(
+                f"Row {row_idx} requires days or start_date/end_date."
+            )
+        days = (end_date - start_date).days
+
+    interest = principal * annual_rate * days / day_count
+    maturity = principal + interest
+    return days, interest, maturity
+
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Bank deposit interest calculator.")
-    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx (default: input.xlsx).")
+    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx, .csv or .parquet (default: input.xlsx).")
     parser.add_argument("--output", default="output.xlsx", help="Output .xlsx (default: output.xlsx).")
     parser.add_argument("--sheet", default="Deposits", help="Sheet name (default: Deposits).")
-    args = parser.parse_args()
+    add_batch_arguments(parser)
+    add_cache_arguments(parser)
+    add_memo_arguments(parser)
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
 
+def run(args):
+    profiler = Profiler.from_args(args, "interest")
+
+    manifest = RunManifest("interest", __file__, args, [args.input], args.output)
+    cached = manifest.cached_exit_code()
+    if cached is not None:
+        return cached
     try:
-        wb = load_workbook(args.input, data_only=True)
-        ws = wb[args.sheet] if args.sheet in wb.sheetnames else wb.active
-        headers = read_rows(ws)
+        with profiler.stage("load"):
+            wb = open_workbook(args.input, RowCache.from_args(args))
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
 
-    wb_out = Workbook()
-    ws_out = wb_out.active
-    ws_out.title = ws.title
-
-    header_values = [cell.value for cell in ws[1]]
-    ws_out.append(header_values + ["days_calc", "interest", "maturity_amount"])
-
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if all(v is None for v in row):
-            continue
+    try:
+        with profiler.stage("parse"):
+            ws = wb[args.sheet] if args.sheet in wb.sheetnames else wb.active
+            header_values, rows = read_rows(ws)
+
+        with profiler.stage("write"):
+            with OutputWorkbook(args.output) as out:
+                ws_out = out.add_sheet(ws.title, list(header_values) + ["days_calc", "interest", "maturity_amount"])
+
+                for row_idx, row, deposit in profiler.iterate("parse", rows):
+                    with profiler.stage("compute") as stage:
+                        days, interest, maturity = calculate_interest(row_idx, deposit)
+                        stage.add_rows(1)
+                    ws_out.append(list(row) + [days, interest, maturity])
+                out.save()
+    except Exception as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        wb.close()
 
-        principal = row[headers["principal"]]
-        annual_rate = row[headers["annual_rate"]]
-        if principal is None or annual_rate is None:
-            raise ValueError(f"Row {row_idx} missing principal or annual_rate.")
-
-        principal = parse_number(principal)
-        if principal is None:
-            raise ValueError(f"Row {row_idx} invalid principal.")
-        annual_rate = parse_rate(annual_rate)
-
-        days_val = row[headers.get("days")] if headers.get("days") is not None else None
-        start_val = row[headers.get("start_date")] if headers.get("start_date") is not None else None
-        end_val = row[headers.get("end_date")] if headers.get("end_date") is not None else None
-        day_count = row[headers.get("day_count")] if headers.get("day_count") is not None else None
-        day_count = int(day_count) if day_count else 365
-
-        if days_val is not None:
-            days = int(days_val)
-        else:
-            start_date = parse_date(start_val)
-            end_date = parse_date(end_val)
-            if not start_date or not end_date:
-                raise ValueError(
-                    f"Row {row_idx} requires days or start_date/end_date."
-                )
-            days = (end_date - start_date).days
-
-        interest = principal * annual_rate * days / day_count
-        maturity = principal + interest
-
-        ws_out.append(list(row) + [days, interest, maturity])
-
-    wb_out.save(args.output)
     print(f"Saved output: {args.output}")
+    profiler.write(args.output, input=args.input)
+    manifest.save()
     return 0
 
 
+def main(argv=None):
+    args = parse_args(argv)
+    if args.batch_dir:
+        return run_batch(run, args)
+    return run(args)
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -1,5 +1,10 @@
 @echo off
 setlocal
 cd /d "%~dp0"
-python bank_interest.py --input input.xlsx --output output.xlsx
+rem Without the shared audit.py next to the folder, run the script itself.
+if exist ..\audit.py (
+    python ..\audit.py interest --input input.xlsx --output output.xlsx
+) else (
+    python bank_interest.py --input input.xlsx --output output.xlsx
+)
 pause
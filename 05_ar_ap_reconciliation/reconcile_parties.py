@@ -1,9 +1,16 @@
 import argparse
-import re
 import sys
 from collections import defaultdict
+from pathlib import Path
 
-from openpyxl import Workbook, load_workbook
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.batch import add_batch_arguments, run_batch
+from audit_common.cache import RowCache, add_cache_arguments
+from audit_common.memo import RunManifest, add_memo_arguments
+from audit_common.profiling import Profiler, add_profile_arguments
+from audit_common.reader import HeaderIndex, iter_records, normalize_header, open_workbook, read_header
+from audit_common.writer import OutputWorkbook
 
 
 PARTY_HEADERS = [
@@ -27,6 +34,30 @@ ACCOUNT_HEADERS = ["account_name", "account", "科目名称", "科目", "会计
 CODE_HEADERS = ["account_code", "account", "code", "科目编码", "科目代码", "科目编号"]
 DIRECTION_HEADERS = ["direction", "余额方向", "借贷方向", "方向"]
 
+LEDGER_COLUMNS = HeaderIndex(
+    {
+        "party": PARTY_HEADERS,
+        "amount": AMOUNT_HEADERS,
+        "debit": DEBIT_HEADERS,
+        "credit": CREDIT_HEADERS,
+        "account": ACCOUNT_HEADERS,
+        "code": CODE_HEADERS,
+        "direction": DIRECTION_HEADERS,
+    }
+)
+
+SUMMARY_HEADER = [
+    "party",
+    "AR",
+    "AP",
+    "OtherAR",
+    "OtherAP",
+    "receivable_total",
+    "payable_total",
+    "net_receivable",
+    "has_both",
+]
+
 SHEET_ALIASES = {
     "AR": ["AR", "应收账款", "应收", "客户应收"],
     "AP": ["AP", "应付账款", "应付", "供应商应付"],
@@ -35,28 +66,6 @@ SHEET_ALIASES = {
 }
 
 
-def normalize_header(value):
-    if value is None:
-        return ""
-    text = str(value).strip().lower()
-    text = text.replace("（", "(").replace("）", ")")
-    text = re.sub(r"\s+", "", text)
-    text = re.sub(r"[()（）\[\]【】:%/\\-]", "", text)
-    return text
-
-
-def find_header_index(headers, options):
-    option_norms = [normalize_header(o) for o in options]
-    for option in option_norms:
-        if option in headers:
-            return headers.index(option)
-    for idx, header in enumerate(headers):
-        for option in option_norms:
-            if option and option in header:
-                return idx
-    return None
-
-
 def parse_number(value):
     if value is None:
         return None
@@ -108,19 +117,12 @@ def classify_account(account_name, account_code):
 
 
 def read_sheet(ws, category=None):
-    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-    headers = [normalize_header(value) for value in header_row]
-    party_idx = find_header_index(headers, PARTY_HEADERS)
-    amount_idx = find_header_index(headers, AMOUNT_HEADERS)
-    debit_idx = find_header_index(headers, DEBIT_HEADERS)
-    credit_idx = find_header_index(headers, CREDIT_HEADERS)
-    account_idx = find_header_index(headers, ACCOUNT_HEADERS)
-    code_idx = find_header_index(headers, CODE_HEADERS)
-    direction_idx = find_header_index(headers, DIRECTION_HEADERS)
-
-    if party_idx is None:
+    columns = LEDGER_COLUMNS.resolve(read_header(ws))
+    split_columns = columns.has("debit", "credit")
+
+    if columns["party"] is None:
         raise ValueError(f"Missing party column in sheet {ws.title}")
-    if amount_idx is None and (debit_idx is None or credit_idx is None):
+    if columns["amount"] is None and not split_columns:
         raise ValueError(f"Missing amount columns in sheet {ws.title}")
 
     if category:
@@ -134,36 +136,31 @@ def read_sheet(ws, category=None):
         }
     unclassified = []
 
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if all(v is None for v in row):
-            continue
-        party = row[party_idx]
-        if party is None:
+    for _, row in iter_records(ws, columns):
+        if row.party is None:
             continue
-        party_key = str(party).strip()
+        party_key = str(row.party).strip()
         if not party_key:
             continue
 
-        amount = None
-        if amount_idx is not None:
-            amount = parse_number(row[amount_idx])
-        if amount is None and debit_idx is not None and credit_idx is not None:
-            debit = parse_number(row[debit_idx]) or 0.0
-            credit = parse_number(row[credit_idx]) or 0.0
+        amount = parse_number(row.amount)
+        if amount is None and split_columns:
+            debit = parse_number(row.debit) or 0.0
+            credit = parse_number(row.credit) or 0.0
             amount = debit - credit
         if amount is None:
             continue
 
-        if direction_idx is not None and amount >= 0:
-            sign = direction_sign(row[direction_idx])
+        if amount >= 0:
+            sign = direction_sign(row.direction)
             if sign is not None:
                 amount = amount * sign
 
         if category:
             totals_by_category[category][party_key] += amount
         else:
-            account_name = row[account_idx] if account_idx is not None else ""
-            account_code = row[code_idx] if code_idx is not None else ""
+            account_name = row.account if columns["account"] is not None else ""
+            account_code = row.code if columns["code"] is not None else ""
             cat = classify_account(account_name, account_code)
             if not cat:
                 unclassified.append((party_key, account_code, account_name, amount))
@@ -173,126 +170,141 @@ def read_sheet(ws, category=None):
     return totals_by_category, unclassified
 
 
-def main():
+def pick_sheet_map(wb):
+    sheet_map = {}
+    normalized = {name: normalize_header(name) for name in wb.sheetnames}
+    for category, aliases in SHEET_ALIASES.items():
+        alias_norms = [normalize_header(a) for a in aliases]
+        for sheet, norm in normalized.items():
+            if sheet in sheet_map:
+                continue
+            for alias in alias_norms:
+                if alias and (norm == alias or alias in norm):
+                    sheet_map[sheet] = category
+                    break
+    return sheet_map
+
+
+def collect_totals(wb):
+    sheet_map = pick_sheet_map(wb)
+    if not sheet_map:
+        return read_sheet(wb.active, category=None)
+
+    totals = {
+        "AR": defaultdict(float),
+        "AP": defaultdict(float),
+        "OtherAR": defaultdict(float),
+        "OtherAP": defaultdict(float),
+    }
+    unclassified_rows = []
+    for sheet, category in sheet_map.items():
+        sheet_totals, unclassified = read_sheet(wb[sheet], category=category)
+        for key, values in sheet_totals.items():
+            for party, amount in values.items():
+                totals[key][party] += amount
+        unclassified_rows.extend(unclassified)
+    return totals, unclassified_rows
+
+
+def summarize(totals):
+    ar = totals.get("AR", {})
+    ap = totals.get("AP", {})
+    other_ar = totals.get("OtherAR", {})
+    other_ap = totals.get("OtherAP", {})
+    parties = set(ar) | set(ap) | set(other_ar) | set(other_ap)
+
+    for party in sorted(parties):
+        ar_val = ar.get(party, 0.0)
+        ap_val = ap.get(party, 0.0)
+        other_ar_val = other_ar.get(party, 0.0)
+        other_ap_val = other_ap.get(party, 0.0)
+        receivable = ar_val + other_ar_val
+        payable = ap_val + other_ap_val
+        net = receivable - payable
+        has_both = "Y" if receivable > 0 and payable > 0 else "N"
+        yield [
+            party,
+            ar_val,
+            ap_val,
+            other_ar_val,
+            other_ap_val,
+            receivable,
+            payable,
+            net,
+            has_both,
+        ]
+
+
+def write_output(path, summary_rows, unclassified_rows):
+    with OutputWorkbook(path) as out:
+        ws_summary = out.add_sheet("Summary", SUMMARY_HEADER)
+        ws_issues = out.add_sheet("Issues", ["party", "receivable_total", "payable_total", "net_receivable"])
+
+        for row in summary_rows:
+            ws_summary.append(row)
+            if row[-1] == "Y":
+                ws_issues.append([row[0], row[5], row[6], row[7]])
+
+        ws_unclassified = out.add_sheet("Unclassified", ["party", "account_code", "account_name", "amount"])
+        for row in unclassified_rows:
+            ws_unclassified.append(list(row))
+
+        out.save()
+
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="AR/AP reconciliation by party.")
-    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx (default: input.xlsx).")
+    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx, .csv or .parquet (default: input.xlsx).")
     parser.add_argument("--output", default="output.xlsx", help="Output .xlsx (default: output.xlsx).")
     parser.add_argument("--ar-sheet", default="AR", help="AR sheet name.")
     parser.add_argument("--ap-sheet", default="AP", help="AP sheet name.")
     parser.add_argument("--other-ar-sheet", default="OtherAR", help="Other AR sheet name.")
     parser.add_argument("--other-ap-sheet", default="OtherAP", help="Other AP sheet name.")
-    args = parser.parse_args()
+    add_batch_arguments(parser)
+    add_cache_arguments(parser)
+    add_memo_arguments(parser)
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
 
+
+def run(args):
+    profiler = Profiler.from_args(args, "reconcile")
+
+    manifest = RunManifest("reconcile", __file__, args, [args.input], args.output)
+    cached = manifest.cached_exit_code()
+    if cached is not None:
+        return cached
     try:
-        wb = load_workbook(args.input, data_only=True)
+        with profiler.stage("load"):
+            wb = open_workbook(args.input, RowCache.from_args(args))
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
 
-    def normalize_sheet_name(name):
-        return normalize_header(name)
-
-    def pick_sheet_map():
-        sheet_map = {}
-        normalized = {name: normalize_sheet_name(name) for name in wb.sheetnames}
-        for category, aliases in SHEET_ALIASES.items():
-            alias_norms = [normalize_sheet_name(a) for a in aliases]
-            for sheet, norm in normalized.items():
-                if sheet in sheet_map:
-                    continue
-                for alias in alias_norms:
-                    if alias and (norm == alias or alias in norm):
-                        sheet_map[sheet] = category
-                        break
-        return sheet_map
-
     try:
-        sheet_map = pick_sheet_map()
-        unclassified_rows = []
-        if sheet_map:
-            totals = {
-                "AR": defaultdict(float),
-                "AP": defaultdict(float),
-                "OtherAR": defaultdict(float),
-                "OtherAP": defaultdict(float),
-            }
-            for sheet, category in sheet_map.items():
-                sheet_totals, unclassified = read_sheet(wb[sheet], category=category)
-                for key, values in sheet_totals.items():
-                    for party, amount in values.items():
-                        totals[key][party] += amount
-                unclassified_rows.extend(unclassified)
-        else:
-            totals, unclassified_rows = read_sheet(wb.active, category=None)
-        ar = totals.get("AR", defaultdict(float))
-        ap = totals.get("AP", defaultdict(float))
-        other_ar = totals.get("OtherAR", defaultdict(float))
-        other_ap = totals.get("OtherAP", defaultdict(float))
+        # Rows are aggregated while streaming, so parse covers the per-party totals too.
+        with profiler.stage("parse"):
+            totals, unclassified_rows = collect_totals(wb)
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
+    finally:
+        wb.close()
 
-    parties = set(ar) | set(ap) | set(other_ar) | set(other_ap)
-
-    wb_out = Workbook()
-    ws_summary = wb_out.active
-    ws_summary.title = "Summary"
-    ws_summary.append(
-        [
-            "party",
-            "AR",
-            "AP",
-            "OtherAR",
-            "OtherAP",
-            "receivable_total",
-            "payable_total",
-            "net_receivable",
-            "has_both",
-        ]
-    )
-
-    ws_issues = wb_out.create_sheet("Issues")
-    ws_issues.append(
-        ["party", "receivable_total", "payable_total", "net_receivable"]
-    )
-
-    ws_unclassified = wb_out.create_sheet("Unclassified")
-    ws_unclassified.append(["party", "account_code", "account_name", "amount"])
-
-    for party in sorted(parties):
-        ar_val = ar.get(party, 0.0)
-        ap_val = ap.get(party, 0.0)
-        other_ar_val = other_ar.get(party, 0.0)
-        other_ap_val = other_ap.get(party, 0.0)
-        receivable = ar_val + other_ar_val
-        payable = ap_val + other_ap_val
-        net = receivable - payable
-        has_both = "Y" if receivable > 0 and payable > 0 else "N"
-
-        ws_summary.append(
-            [
-                party,
-                ar_val,
-                ap_val,
-                other_ar_val,
-                other_ap_val,
-                receivable,
-                payable,
-                net,
-                has_both,
-            ]
-        )
-
-        if has_both == "Y":
-            ws_issues.append([party, receivable, payable, net])
-
-    for row in unclassified_rows:
-        ws_unclassified.append(list(row))
-
-    wb_out.save(args.output)
+    with profiler.stage("write"):
+        write_output(args.output, profiler.iterate("compute", summarize(totals)), unclassified_rows)
     print(f"Saved output: {args.output}")
+    profiler.write(args.output, input=args.input)
+    manifest.save()
     return 0
 
 
+def main(argv=None):
+    args = parse_args(argv)
+    if args.batch_dir:
+        return run_batch(run, args)
+    return run(args)
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -2,8 +2,16 @@
 import re
 import sys
 from collections import defaultdict
+from pathlib import Path
 
-from openpyxl import Workbook, load_workbook
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.batch import add_batch_arguments, run_batch
+from audit_common.cache import RowCache, add_cache_arguments
+from audit_common.memo import RunManifest, add_memo_arguments
+from audit_common.profiling import Profiler, add_profile_arguments
+from audit_common.reader import HeaderIndex, iter_records, normalize_header, open_workbook, read_header
+from audit_common.writer import OutputWorkbook
 
 
 TB_SHEET_CANDIDATES = [
@@ -47,6 +55,31 @@ MAPPING_LINE_HEADERS = ["line_item", "line", "item", "项目", "行项目", "报
 MAPPING_CODE_HEADERS = ["account_code", "account", "code", "科目编码", "科目代码", "科目编号"]
 MAPPING_SIGN_HEADERS = ["sign", "符号", "系数", "正负"]
 
+TB_COLUMNS = HeaderIndex(
+    {
+        "code": CODE_HEADERS,
+        "name": NAME_HEADERS,
+        "type": TYPE_HEADERS,
+        "end_balance": END_BALANCE_HEADERS,
+        "end_debit": END_DEBIT_HEADERS,
+        "end_credit": END_CREDIT_HEADERS,
+        "begin_balance": BEGIN_BALANCE_HEADERS,
+        "begin_debit": BEGIN_DEBIT_HEADERS,
+        "begin_credit": BEGIN_CREDIT_HEADERS,
+        "direction": DIRECTION_HEADERS,
+    }
+)
+
+MAPPING_COLUMNS = HeaderIndex(
+    {
+        "statement": MAPPING_STATEMENT_HEADERS,
+        "section": MAPPING_SECTION_HEADERS,
+        "line_item": MAPPING_LINE_HEADERS,
+        "code": MAPPING_CODE_HEADERS,
+        "sign": MAPPING_SIGN_HEADERS,
+    }
+)
+
 PARAM_KEY_ALIASES = {
     "cash_begin": ["cash_begin", "期初现金", "现金期初", "期初货币资金", "期初现金及现金等价物"],
     "cash_end": ["cash_end", "期末现金", "现金期末", "期末货币资金", "期末现金及现金等价物"],
@@ -86,28 +119,6 @@ CASH_KEYWORDS = ["现金", "银行存款", "库存现金", "货币资金", "现
 CASH_CODE_PREFIXES = ("1001", "1002", "1012")
 
 
-def normalize_header(value):
-    if value is None:
-        return ""
-    text = str(value).strip().lower()
-    text = text.replace("（", "(").replace("）", ")")
-    text = re.sub(r"\s+", "", text)
-    text = re.sub(r"[()（）\[\]【】:%/\\-]", "", text)
-    return text
-
-
-def find_header_index(headers, options):
-    option_norms = [normalize_header(o) for o in options]
-    for option in option_norms:
-        if option in headers:
-            return headers.index(option)
-    for idx, header in enumerate(headers):
-        for option in option_norms:
-            if option and option in header:
-                return idx
-    return None
-
-
 def parse_number(value):
     if value is None:
         return None
@@ -156,14 +167,14 @@ def pick_sheet(wb, candidates):
     return None
 
 
+def has_tb_columns(columns):
+    return columns["code"] is not None and (
+        columns["end_balance"] is not None or columns.has("end_debit", "end_credit")
+    )
+
+
 def sheet_has_tb_headers(ws):
-    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-    headers = [normalize_header(value) for value in header_row]
-    code_idx = find_header_index(headers, CODE_HEADERS)
-    bal_idx = find_header_index(headers, END_BALANCE_HEADERS)
-    debit_idx = find_header_index(headers, END_DEBIT_HEADERS)
-    credit_idx = find_header_index(headers, END_CREDIT_HEADERS)
-    return code_idx is not None and (bal_idx is not None or (debit_idx is not None and credit_idx is not None))
+    return has_tb_columns(TB_COLUMNS.resolve(read_header(ws)))
 
 
 def pick_tb_sheet(wb):
@@ -176,54 +187,43 @@ def pick_tb_sheet(wb):
     return wb.sheetnames[0]
 
 
-def compute_balance(row, balance_idx, debit_idx, credit_idx, direction_idx):
-    if debit_idx is not None and credit_idx is not None:
-        debit = parse_number(row[debit_idx]) or 0.0
-        credit = parse_number(row[credit_idx]) or 0.0
+def compute_balance(balance, debit, credit, direction, split_columns):
+    if split_columns:
+        debit = parse_number(debit) or 0.0
+        credit = parse_number(credit) or 0.0
         return debit - credit
-    if balance_idx is None:
-        return None
-    value = parse_number(row[balance_idx])
+    value = parse_number(balance)
     if value is None:
         return None
-    if direction_idx is not None:
-        sign = direction_sign(row[direction_idx])
-        if sign is not None and value >= 0:
-            value *= sign
+    sign = direction_sign(direction)
+    if sign is not None and value >= 0:
+        value *= sign
     return value
 
 
 def read_tb(ws):
-    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-    headers = [normalize_header(value) for value in header_row]
-    code_idx = find_header_index(headers, CODE_HEADERS)
-    name_idx = find_header_index(headers, NAME_HEADERS)
-    type_idx = find_header_index(headers, TYPE_HEADERS)
-    end_bal_idx = find_header_index(headers, END_BALANCE_HEADERS)
-    end_debit_idx = find_header_index(headers, END_DEBIT_HEADERS)
-    end_credit_idx = find_header_index(headers, END_CREDIT_HEADERS)
-    begin_bal_idx = find_header_index(headers, BEGIN_BALANCE_HEADERS)
-    begin_debit_idx = find_header_index(headers, BEGIN_DEBIT_HEADERS)
-    begin_credit_idx = find_header_index(headers, BEGIN_CREDIT_HEADERS)
-    direction_idx = find_header_index(headers, DIRECTION_HEADERS)
-
-    if code_idx is None:
+    columns = TB_COLUMNS.resolve(read_header(ws))
+    if columns["code"] is None:
         raise ValueError(f"Missing account_code column in {ws.title}")
-    if end_bal_idx is None and (end_debit_idx is None or end_credit_idx is None):
+    if not has_tb_columns(columns):
         raise ValueError(f"Missing ending balance columns in {ws.title}")
+    end_split = columns.has("end_debit", "end_credit")
+    begin_split = columns.has("begin_debit", "begin_credit")
 
     accounts = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if all(v is None for v in row):
-            continue
-        code = code_to_str(row[code_idx])
+    for _, row in iter_records(ws, columns):
+        code = code_to_str(row.code)
         if not code:
             continue
-        name = str(row[name_idx]).strip() if name_idx is not None and row[name_idx] else ""
-        acc_type = str(row[type_idx]).strip() if type_idx is not None and row[type_idx] else ""
+        name = str(row.name).strip() if row.name else ""
+        acc_type = str(row.type).strip() if row.type else ""
 
-        end_balance = compute_balance(row, end_bal_idx, end_debit_idx, end_credit_idx, direction_idx)
-        begin_balance = compute_balance(row, begin_bal_idx, begin_debit_idx, begin_credit_idx, direction_idx)
+        end_balance = compute_balance(
+            row.end_balance, row.end_debit, row.end_credit, row.direction, end_split
+        )
+        begin_balance = compute_balance(
+            row.begin_balance, row.begin_debit, row.begin_credit, row.direction, begin_split
+        )
         if end_balance is None:
             continue
 
@@ -298,25 +298,17 @@ def iter_matching_codes(token, tb_balances):
 
 
 def read_mapping(ws):
-    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-    headers = [normalize_header(value) for value in header_row]
-    stmt_idx = find_header_index(headers, MAPPING_STATEMENT_HEADERS)
-    sec_idx = find_header_index(headers, MAPPING_SECTION_HEADERS)
-    line_idx = find_header_index(headers, MAPPING_LINE_HEADERS)
-    code_idx = find_header_index(headers, MAPPING_CODE_HEADERS)
-    sign_idx = find_header_index(headers, MAPPING_SIGN_HEADERS)
-    if None in (stmt_idx, sec_idx, line_idx, code_idx):
+    columns = MAPPING_COLUMNS.resolve(read_header(ws))
+    if columns.missing(("statement", "section", "line_item", "code")):
         raise ValueError(f"Missing required mapping columns in {ws.title}")
 
     rows = []
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if all(v is None for v in row):
-            continue
-        statement = normalize_statement(row[stmt_idx]) if row[stmt_idx] else ""
-        section = str(row[sec_idx]).strip() if row[sec_idx] else ""
-        line_item = str(row[line_idx]).strip() if row[line_idx] else ""
-        code_cell = row[code_idx]
-        sign = parse_number(row[sign_idx]) if sign_idx is not None else 1.0
+    for row_idx, row in iter_records(ws, columns):
+        statement = normalize_statement(row.statement) if row.statement else ""
+        section = str(row.section).strip() if row.section else ""
+        line_item = str(row.line_item).strip() if row.line_item else ""
+        code_cell = row.code
+        sign = parse_number(row.sign)
         sign = sign if sign is not None else 1.0
         if not statement or not section or not line_item or code_cell is None:
             raise ValueError(f"Row {row_idx} missing mapping values.")
@@ -350,7 +342,14 @@ def read_parameters(wb, sheet_name):
             continue
         raw_key = normalize_header(row[0])
         key = alias_map.get(raw_key, raw_key)
-        params[key] = row[1] if len(row) > 1 else None
+        value = row[1] if len(row) > 1 else None
+        if key in PARAM_KEY_ALIASES:
+            # Amounts such as "1,000" or "(50)" from CSV parse like the TB.
+            number = parse_number(value)
+            if number is None and value is not None and str(value).strip():
+                raise ValueError(f"Invalid {key} in {ws.title}: {value}")
+            value = number
+        params[key] = value
     return params
 
 
@@ -465,46 +464,23 @@ def apply_mapping(tb_balances, mapping_rows):
     return section_order, line_order, line_totals, section_totals, used_accounts, missing_accounts
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Financial statements generator with checks.")
-    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx (default: input.xlsx).")
-    parser.add_argument("--output", default="output.xlsx", help="Output .xlsx (default: output.xlsx).")
-    args = parser.parse_args()
-
-    try:
-        wb = load_workbook(args.input, data_only=True)
-    except Exception as exc:
-        print(f"ERROR: {exc}", file=sys.stderr)
-        return 1
-
-    tb_sheet_name = pick_tb_sheet(wb)
-    mapping_sheet_name = pick_sheet(wb, MAPPING_SHEET_CANDIDATES)
-    param_sheet_name = pick_sheet(wb, PARAMETERS_SHEET_CANDIDATES)
-
-    try:
-        accounts = read_tb(wb[tb_sheet_name])
-    except Exception as exc:
-        print(f"ERROR: {exc}", file=sys.stderr)
-        return 1
-
-    if not accounts:
-        print("ERROR: No usable rows found in TB sheet.", file=sys.stderr)
-        return 1
-
+def build_statements(accounts, mapping_rows, params):
     tb_balances, _ = build_tb_dict(accounts)
-    params = read_parameters(wb, param_sheet_name)
 
     tolerance = params.get("tolerance")
-    tolerance = float(tolerance) if tolerance is not None else 0.01
+    if tolerance is None:
+        tolerance = 0.01
 
     checks = []
-    has_error = False
+    sheets = []
 
     def add_check(severity, message):
-        nonlocal has_error
         checks.append((severity, message))
-        if severity == "ERROR":
-            has_error = True
+
+    def add_sheet(title, header):
+        rows = []
+        sheets.append((title, header, rows))
+        return rows
 
     tb_sum = sum(acc["end_balance"] for acc in accounts if acc.get("end_balance") is not None)
     if abs(tb_sum) > tolerance:
@@ -513,19 +489,12 @@ def main():
     derived_cash_begin, derived_cash_end = compute_cash_totals(accounts)
     cash_begin = params.get("cash_begin")
     cash_end = params.get("cash_end")
-    cash_begin = float(cash_begin) if cash_begin is not None else derived_cash_begin
-    cash_end = float(cash_end) if cash_end is not None else derived_cash_end
-
-    wb_out = Workbook()
-    wb_out.remove(wb_out.active)
-
-    if mapping_sheet_name:
-        try:
-            mapping_rows = read_mapping(wb[mapping_sheet_name])
-        except Exception as exc:
-            print(f"ERROR: {exc}", file=sys.stderr)
-            return 1
+    if cash_begin is None:
+        cash_begin = derived_cash_begin
+    if cash_end is None:
+        cash_end = derived_cash_end
 
+    if mapping_rows is not None:
         (
             section_order,
             line_order,
@@ -586,20 +555,19 @@ def main():
             add_check("WARN", "cash_begin/cash_end not provided; CF check skipped.")
 
         def write_statement(statement_key):
-            ws = wb_out.create_sheet(statement_key)
-            ws.append(["Section", "Line Item", "Amount"])
+            rows = add_sheet(statement_key, ["Section", "Line Item", "Amount"])
             for section in section_order.get(statement_key, []):
                 for line_item in line_order[statement_key][section]:
                     amount = line_totals[statement_key][section][line_item]
-                    ws.append([section, line_item, amount])
-                ws.append([section, "TOTAL", section_totals[statement_key][section]])
-            return ws
+                    rows.append([section, line_item, amount])
+                rows.append([section, "TOTAL", section_totals[statement_key][section]])
+            return rows
 
         write_statement("BS")
-        ws_is = write_statement("IS")
-        ws_is.append(["Profit", "NetProfit", net_profit])
-        ws_cf = write_statement("CF")
-        ws_cf.append(["Summary", "NetChangeInCash", cf_total])
+        is_rows = write_statement("IS")
+        is_rows.append(["Profit", "NetProfit", net_profit])
+        cf_rows = write_statement("CF")
+        cf_rows.append(["Summary", "NetChangeInCash", cf_total])
     else:
         bs_entries = defaultdict(list)
         is_entries = defaultdict(list)
@@ -643,51 +611,126 @@ def main():
         if cash_begin is None or cash_end is None:
             add_check("WARN", "cash_begin/cash_end not identified; CF summary limited.")
 
-        ws_bs = wb_out.create_sheet("BS")
-        ws_bs.append(["Section", "AccountCode", "AccountName", "Amount"])
+        bs_rows = add_sheet("BS", ["Section", "AccountCode", "AccountName", "Amount"])
         for section in ("Assets", "Liabilities", "Equity"):
             total = 0.0
             for acc in bs_entries.get(section, []):
                 balance = acc["end_balance"]
                 amount = balance if section == "Assets" else abs(balance)
                 total += amount
-                ws_bs.append([section, acc.get("code"), acc.get("name"), amount])
-            ws_bs.append([section, "TOTAL", "", total])
+                bs_rows.append([section, acc.get("code"), acc.get("name"), amount])
+            bs_rows.append([section, "TOTAL", "", total])
 
-        ws_is = wb_out.create_sheet("IS")
-        ws_is.append(["Section", "AccountCode", "AccountName", "Amount"])
+        is_rows = add_sheet("IS", ["Section", "AccountCode", "AccountName", "Amount"])
         for section in ("Revenue", "Expense"):
             total = 0.0
             for acc in is_entries.get(section, []):
                 amount = abs(acc["end_balance"])
                 total += amount
-                ws_is.append([section, acc.get("code"), acc.get("name"), amount])
-            ws_is.append([section, "TOTAL", "", total])
-        ws_is.append(["Profit", "NetProfit", "", net_profit])
+                is_rows.append([section, acc.get("code"), acc.get("name"), amount])
+            is_rows.append([section, "TOTAL", "", total])
+        is_rows.append(["Profit", "NetProfit", "", net_profit])
 
-        ws_cf = wb_out.create_sheet("CF")
-        ws_cf.append(["Item", "Amount"])
+        cf_rows = add_sheet("CF", ["Item", "Amount"])
         if cash_begin is not None:
-            ws_cf.append(["CashBegin", cash_begin])
+            cf_rows.append(["CashBegin", cash_begin])
         if cash_end is not None:
-            ws_cf.append(["CashEnd", cash_end])
+            cf_rows.append(["CashEnd", cash_end])
         if cash_begin is not None and cash_end is not None:
-            ws_cf.append(["NetChangeInCash", cash_end - cash_begin])
-        ws_cf.append(["NetProfit", net_profit])
+            cf_rows.append(["NetChangeInCash", cash_end - cash_begin])
+        cf_rows.append(["NetProfit", net_profit])
 
-        ws_unclassified = wb_out.create_sheet("Unclassified")
-        ws_unclassified.append(["AccountCode", "AccountName", "EndBalance"])
+        unclassified_rows = add_sheet("Unclassified", ["AccountCode", "AccountName", "EndBalance"])
         for acc in unclassified:
-            ws_unclassified.append([acc.get("code"), acc.get("name"), acc.get("end_balance")])
+            unclassified_rows.append([acc.get("code"), acc.get("name"), acc.get("end_balance")])
+
+    return sheets, checks
 
-    ws_checks = wb_out.create_sheet("Checks")
-    ws_checks.append(["severity", "message"])
-    for severity, message in checks:
-        ws_checks.append([severity, message])
 
-    wb_out.save(args.output)
+def write_statements(path, sheets, checks):
+    with OutputWorkbook(path) as out:
+        for title, header, rows in sheets:
+            ws = out.add_sheet(title, header)
+            for row in rows:
+                ws.append(row)
+
+        ws_checks = out.add_sheet("Checks", ["severity", "message"])
+        for severity, message in checks:
+            ws_checks.append([severity, message])
+        out.save()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Financial statements generator with checks.")
+    parser.add_argument("--input", default="input.xlsx", help="Input .xlsx, .csv or .parquet (default: input.xlsx).")
+    parser.add_argument("--output", default="output.xlsx", help="Output .xlsx (default: output.xlsx).")
+    parser.add_argument(
+        "--mapping", default="", help="Separate Mapping/Parameters workbook or .csv (for TB exported as CSV)."
+    )
+    add_batch_arguments(parser)
+    add_cache_arguments(parser)
+    add_memo_arguments(parser)
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def run(args):
+    profiler = Profiler.from_args(args, "statements")
+
+    manifest = RunManifest("statements", __file__, args, [args.input, args.mapping], args.output)
+    cached = manifest.cached_exit_code()
+    if cached is not None:
+        return cached
+    try:
+        with profiler.stage("load"):
+            cache = RowCache.from_args(args)
+            wb = open_workbook(args.input, cache)
+            map_wb = open_workbook(args.mapping, cache) if args.mapping else wb
+    except Exception as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        return 1
+
+    try:
+        with profiler.stage("header"):
+            tb_sheet_name = pick_tb_sheet(wb)
+            mapping_sheet_name = pick_sheet(map_wb, MAPPING_SHEET_CANDIDATES)
+            if mapping_sheet_name is None and map_wb is not wb:
+                mapping_sheet_name = map_wb.sheetnames[0]
+            param_sheet_name = pick_sheet(map_wb, PARAMETERS_SHEET_CANDIDATES)
+        with profiler.stage("parse") as stage:
+            accounts = read_tb(wb[tb_sheet_name])
+            mapping_rows = read_mapping(map_wb[mapping_sheet_name]) if mapping_sheet_name else None
+            params = read_parameters(map_wb, param_sheet_name)
+            stage.add_rows(len(accounts) + len(mapping_rows or []))
+    except Exception as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        wb.close()
+        map_wb.close()
+
+    if not accounts:
+        print("ERROR: No usable rows found in TB sheet.", file=sys.stderr)
+        return 1
+
+    with profiler.stage("compute") as stage:
+        sheets, checks = build_statements(accounts, mapping_rows, params)
+        stage.add_rows(len(accounts))
+    with profiler.stage("write") as stage:
+        write_statements(args.output, sheets, checks)
+        stage.add_rows(sum(len(rows) for _, _, rows in sheets))
     print(f"Saved output: {args.output}")
-    return 1 if has_error else 0
+    profiler.write(args.output, input=args.input)
+    code = 1 if any(severity == "ERROR" for severity, _ in checks) else 0
+    manifest.save(code)
+    return code
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.batch_dir:
+        return run_batch(run, args)
+    return run(args)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,10 @@
 @echo off
 setlocal
 cd /d "%~dp0"
-python financial_statements.py --input input.xlsx --output output.xlsx
+rem Without the shared audit.py next to the folder, run the script itself.
+if exist ..\audit.py (
+    python ..\audit.py statements --input input.xlsx --output output.xlsx
+) else (
+    python financial_statements.py --input input.xlsx --output output.xlsx
+)
 pause
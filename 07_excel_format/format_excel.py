@@ -1,10 +1,12 @@
 import argparse
 import sys
 from datetime import date, datetime
+from pathlib import Path
 
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment, Font, PatternFill
-from openpyxl.utils import get_column_letter
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.memo import RunManifest, add_memo_arguments
+from audit_common.profiling import NULL_PROFILER, Profiler, add_profile_arguments
 
 
 ACCOUNTING_FORMAT_DEC = "#,##0.00_);[Red](#,##0.00)"
@@ -58,6 +60,8 @@ def detect_columns(ws, header_row, scan_rows):
 
 
 def set_column_widths(ws):
+    from openpyxl.utils import get_column_letter
+
     for col in range(1, ws.max_column + 1):
         max_len = 0
         for row in range(1, ws.max_row + 1):
@@ -73,8 +77,11 @@ def set_column_widths(ws):
         ws.column_dimensions[get_column_letter(col)].width = width
 
 
-def format_sheet(ws, header_row, scan_rows):
-    numeric_cols, int_cols, date_cols = detect_columns(ws, header_row, scan_rows)
+def format_sheet(ws, header_row, scan_rows, profiler=NULL_PROFILER):
+    from openpyxl.styles import Alignment, Font, PatternFill
+
+    with profiler.stage("header"):
+        numeric_cols, int_cols, date_cols = detect_columns(ws, header_row, scan_rows)
 
     header_fill = PatternFill(fill_type="solid", fgColor="D9D9D9")
     header_font = Font(bold=True)
@@ -87,29 +94,43 @@ def format_sheet(ws, header_row, scan_rows):
 
     ws.freeze_panes = ws.cell(row=header_row + 1, column=1)
 
-    for row in ws.iter_rows(min_row=header_row + 1, max_row=ws.max_row):
-        for cell in row:
-            if cell.column in date_cols:
-                cell.number_format = DATE_FORMAT
-            elif cell.column in int_cols:
-                cell.number_format = ACCOUNTING_FORMAT_INT
-            elif cell.column in numeric_cols:
-                cell.number_format = ACCOUNTING_FORMAT_DEC
+    with profiler.stage("compute") as stage:
+        for row in ws.iter_rows(min_row=header_row + 1, max_row=ws.max_row):
+            for cell in row:
+                if cell.column in date_cols:
+                    cell.number_format = DATE_FORMAT
+                elif cell.column in int_cols:
+                    cell.number_format = ACCOUNTING_FORMAT_INT
+                elif cell.column in numeric_cols:
+                    cell.number_format = ACCOUNTING_FORMAT_DEC
+        stage.add_rows(max(ws.max_row - header_row, 0))
 
-    set_column_widths(ws)
+    with profiler.stage("set_column_widths"):
+        set_column_widths(ws)
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Apply financial-style formatting to Excel.")
     parser.add_argument("--input", default="input.xlsx", help="Input .xlsx (default: input.xlsx).")
     parser.add_argument("--output", default="output.xlsx", help="Output .xlsx (default: output.xlsx).")
     parser.add_argument("--sheets", default="", help="Comma-separated sheet names.")
     parser.add_argument("--header-row", type=int, default=1, help="Header row (default: 1).")
     parser.add_argument("--scan-rows", type=int, default=20, help="Rows to scan for types.")
-    args = parser.parse_args()
+    add_memo_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    profiler = Profiler.from_args(args, "format")
+
+    manifest = RunManifest("format", __file__, args, [args.input], args.output)
+    cached = manifest.cached_exit_code()
+    if cached is not None:
+        return cached
+
+    from openpyxl import load_workbook
 
     try:
-        wb = load_workbook(args.input)
+        with profiler.stage("load"):
+            wb = load_workbook(args.input)
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
@@ -123,10 +144,13 @@ def main():
         if name not in wb.sheetnames:
             print(f"ERROR: Sheet not found: {name}", file=sys.stderr)
             return 1
-        format_sheet(wb[name], args.header_row, args.scan_rows)
+        format_sheet(wb[name], args.header_row, args.scan_rows, profiler)
 
-    wb.save(args.output)
+    with profiler.stage("write"):
+        wb.save(args.output)
     print(f"Saved output: {args.output}")
+    profiler.write(args.output, input=args.input)
+    manifest.save()
     return 0
 
 
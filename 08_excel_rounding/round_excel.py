@@ -1,9 +1,12 @@
 import argparse
 import sys
 from datetime import date, datetime
+from pathlib import Path
 
-from openpyxl import load_workbook
-from openpyxl.utils import column_index_from_string
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.memo import RunManifest, add_memo_arguments
+from audit_common.profiling import Profiler, add_profile_arguments
 
 
 def normalize_header(value):
@@ -15,6 +18,8 @@ def normalize_header(value):
 def resolve_columns(ws, header_row, columns_arg):
     if not columns_arg:
         return None
+    from openpyxl.utils import column_index_from_string
+
     parts = [p.strip() for p in columns_arg.split(",") if p.strip()]
     columns = set()
     header_map = {
@@ -49,7 +54,7 @@ def round_sheet(ws, header_row, decimals, columns):
                 continue
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Round numeric values in Excel.")
     parser.add_argument("--input", default="input.xlsx", help="Input .xlsx (default: input.xlsx).")
     parser.add_argument("--output", default="output.xlsx", help="Output .xlsx (default: output.xlsx).")
@@ -57,10 +62,21 @@ def main():
     parser.add_argument("--sheets", default="", help="Comma-separated sheet names.")
     parser.add_argument("--columns", default="", help="Column letters or header names.")
     parser.add_argument("--header-row", type=int, default=1, help="Header row (default: 1).")
-    args = parser.parse_args()
+    add_memo_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    profiler = Profiler.from_args(args, "round")
+
+    manifest = RunManifest("round", __file__, args, [args.input], args.output)
+    cached = manifest.cached_exit_code()
+    if cached is not None:
+        return cached
+
+    from openpyxl import load_workbook
 
     try:
-        wb = load_workbook(args.input)
+        with profiler.stage("load"):
+            wb = load_workbook(args.input)
     except Exception as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         return 1
@@ -77,14 +93,20 @@ def main():
             return 1
         ws = wb[name]
         try:
-            columns = resolve_columns(ws, args.header_row, args.columns) if args.columns else None
+            with profiler.stage("header"):
+                columns = resolve_columns(ws, args.header_row, args.columns) if args.columns else None
         except ValueError as exc:
             print(f"ERROR: {exc}", file=sys.stderr)
             return 1
-        round_sheet(ws, args.header_row, args.decimals, columns)
+        with profiler.stage("compute") as stage:
+            round_sheet(ws, args.header_row, args.decimals, columns)
+            stage.add_rows(max(ws.max_row - args.header_row, 0))
 
-    wb.save(args.output)
+    with profiler.stage("write"):
+        wb.save(args.output)
     print(f"Saved output: {args.output}")
+    profiler.write(args.output, input=args.input)
+    manifest.save()
     return 0
 
 
@@ -1,5 +1,10 @@
 @echo off
 setlocal
 cd /d "%~dp0"
-python round_excel.py --input input.xlsx --output output.xlsx --decimals 2
+rem Without the shared audit.py next to the folder, run the script itself.
+if exist ..\audit.py (
+    python ..\audit.py round --input input.xlsx --output output.xlsx --decimals 2
+) else (
+    python round_excel.py --input input.xlsx --output output.xlsx --decimals 2
+)
 pause
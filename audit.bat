@@ -0,0 +1,3 @@
+@echo off
+setlocal
+python "%~dp0audit.py" %*
@@ -0,0 +1,7 @@
+import sys
+
+from audit_common.cli import main
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,131 @@
+import argparse
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from audit_common.memo import CACHED_PREFIX
+from audit_common.programs import function_ref, resolve_function
+from audit_common.writer import OutputWorkbook
+
+
+INPUT_SUFFIXES = (".xlsx", ".xlsm", ".csv", ".tsv", ".parquet", ".pq")
+OUTPUT_SUFFIX = "_output"
+SUMMARY_NAME = "batch_summary.xlsx"
+SUMMARY_HEADER = ["input", "output", "status", "exit_code", "seconds", "message", "from_cache"]
+
+
+def add_batch_arguments(parser):
+    parser.add_argument("--batch-dir", default="", help="Process every workbook in this folder.")
+    parser.add_argument(
+        "--batch-output", default="", help="Batch output folder (default: <batch-dir>/output)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=0, help="Batch worker processes (default: CPU count)."
+    )
+
+
+def discover_inputs(folder):
+    inputs = []
+    for path in sorted(Path(folder).iterdir()):
+        if not path.is_file() or path.suffix.lower() not in INPUT_SUFFIXES:
+            continue
+        # Skip Excel lock files and outputs of a previous batch in the same folder.
+        if path.name.startswith("~$") or path.stem.endswith(OUTPUT_SUFFIX) or path.name == SUMMARY_NAME:
+            continue
+        inputs.append(path)
+    return inputs
+
+
+def output_name(path):
+    return f"{path.stem}{OUTPUT_SUFFIX}.xlsx"
+
+
+def run_job(run_ref, args):
+    buffer = io.StringIO()
+    start = time.perf_counter()
+    try:
+        run = resolve_function(run_ref)
+        with redirect_stdout(buffer), redirect_stderr(buffer):
+            code = run(args)
+    except Exception as exc:
+        code = None
+        buffer.write(f"ERROR: {type(exc).__name__}: {exc}")
+    return code, buffer.getvalue().strip(), time.perf_counter() - start
+
+
+def run_batch(run, args):
+    from concurrent.futures import ProcessPoolExecutor
+
+    folder = Path(args.batch_dir)
+    if not folder.is_dir():
+        print(f"ERROR: Folder not found: {folder}", file=sys.stderr)
+        return 1
+    inputs = discover_inputs(folder)
+    if not inputs:
+        print(f"ERROR: No workbooks found in {folder}", file=sys.stderr)
+        return 1
+
+    output_dir = Path(args.batch_output) if args.batch_output else folder / "output"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # a.csv and a.xlsx would both write a_output.xlsx; neither is run.
+    outputs = {}
+    for path in inputs:
+        outputs.setdefault(os.path.normcase(output_name(path)), []).append(path)
+    jobs = []
+    results = {}
+    for path in inputs:
+        name = output_name(path)
+        clashing = [other.name for other in outputs[os.path.normcase(name)] if other != path]
+        if clashing:
+            message = f"ERROR: {path.name} and {', '.join(clashing)} would both write {name}; rename one."
+            results[path] = [str(path), "", "FAILED", None, None, message, "N"]
+            print(f"[FAILED] {path.name} (output name clash)")
+            continue
+        job = argparse.Namespace(**vars(args))
+        job.batch_dir = ""
+        job.input = str(path)
+        job.output = str(output_dir / name)
+        jobs.append(job)
+
+    workers = max(min(args.workers or os.cpu_count() or 1, len(jobs)), 1)
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        run_ref = function_ref(run)
+        futures = [pool.submit(run_job, run_ref, job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                code, message, seconds = future.result()
+            except Exception as exc:
+                code, message, seconds = None, f"ERROR: {type(exc).__name__}: {exc}", None
+            output_path = Path(job.output)
+            cached = message.startswith(CACHED_PREFIX)
+            written = cached or (output_path.exists() and output_path.stat().st_mtime >= started)
+            output = job.output if written else ""
+            # A non-zero exit with a fresh output means the run finished but reported check errors.
+            if code == 0:
+                status = "OK"
+            elif written:
+                status = "ERROR"
+            else:
+                status = "FAILED"
+            results[Path(job.input)] = [job.input, output, status, code, seconds, message, "Y" if cached else "N"]
+            print(f"[{status}] {Path(job.input).name}{' (cached)' if cached else ''}")
+    results = [results[path] for path in inputs]
+
+    with OutputWorkbook(output_dir / SUMMARY_NAME) as out:
+        ws = out.add_sheet("Runs", SUMMARY_HEADER)
+        for row in results:
+            ws.append(row)
+        out.save()
+
+    failed = sum(1 for row in results if row[2] != "OK")
+    cached = sum(1 for row in results if row[-1] == "Y")
+    print(
+        f"Processed {len(results)} workbook(s), {cached} served from cache, {failed} not OK. "
+        f"Summary: {output_dir / SUMMARY_NAME}"
+    )
+    return 1 if failed else 0
@@ -0,0 +1,293 @@
+import hashlib
+import os
+import pickle
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+
+CACHE_ENV = "AUDIT_CACHE_DIR"
+MAX_SIZE_ENV = "AUDIT_CACHE_MAX_MB"
+DEFAULT_MAX_MB = 1024
+CHUNK_ROWS = 4096
+HASH_BLOCK = 1 << 20
+FORMAT_VERSION = b"1"
+RESIDENT_MAX_ROWS = 2_000_000
+
+_resident = None
+
+
+def add_cache_arguments(parser):
+    parser.add_argument(
+        "--cache", action="store_true", help="Reuse parsed rows of unchanged inputs from the on-disk cache."
+    )
+    parser.add_argument("--cache-dir", default="", help=f"Cache folder (default: ${CACHE_ENV} or the user cache).")
+
+
+def user_data_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "audit"
+
+
+def default_cache_dir():
+    if os.environ.get(CACHE_ENV):
+        return Path(os.environ[CACHE_ENV])
+    return user_data_dir() / "rows"
+
+
+def set_resident_cache(cache):
+    # The resident service installs an in-memory cache in each worker, used
+    # whenever a job does not ask for the on-disk cache explicitly.
+    global _resident
+    _resident = cache
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(FORMAT_VERSION, digest_size=20)
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RowCache:
+    # One file per (content hash, sheet): a stream of pickled row chunks.
+    # Entries are written to a temp file and renamed into place, so readers
+    # never see a partial entry; mtime doubles as the LRU clock.
+    def __init__(self, folder, max_bytes):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_args(cls, args):
+        if not getattr(args, "cache", False):
+            return _resident
+        folder = Path(args.cache_dir) if getattr(args, "cache_dir", "") else default_cache_dir()
+        max_mb = float(os.environ.get(MAX_SIZE_ENV) or DEFAULT_MAX_MB)
+        return cls(folder, int(max_mb * 1024 * 1024))
+
+    def open(self, path, opener):
+        return CachedWorkbook(path, self, opener)
+
+    def _entry(self, digest, sheet):
+        sheet_key = hashlib.blake2b(str(sheet).encode("utf-8"), digest_size=8).hexdigest()
+        return self.folder / f"{digest}-{sheet_key}.rows"
+
+    def _index(self, digest):
+        return self.folder / f"{digest}.sheets"
+
+    def _load(self, entry):
+        try:
+            handle = open(entry, "rb")
+        except OSError:
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return handle
+
+    def load_sheets(self, digest):
+        handle = self._load(self._index(digest))
+        if handle is None:
+            return None
+        with handle:
+            return pickle.load(handle)
+
+    def store_sheets(self, digest, sheetnames, active):
+        with self._writer(self._index(digest)) as handle:
+            pickle.dump((list(sheetnames), active), handle, pickle.HIGHEST_PROTOCOL)
+
+    def load_rows(self, digest, sheet):
+        handle = self._load(self._entry(digest, sheet))
+        if handle is None:
+            return None
+        return _iter_chunks(handle)
+
+    @contextmanager
+    def store_rows(self, digest, sheet):
+        with self._writer(self._entry(digest, sheet)) as handle:
+            sink = RowSink(handle)
+            yield sink
+            sink.flush()
+
+    @contextmanager
+    def _writer(self, target):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+        handle = open(temp, "wb")
+        try:
+            yield handle
+        except BaseException:
+            handle.close()
+            temp.unlink(missing_ok=True)
+            raise
+        handle.close()
+        os.replace(temp, target)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in self.folder.iterdir():
+            if entry.suffix not in (".rows", ".sheets"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total -= size
+
+
+class MemoryRowCache:
+    # Same interface as RowCache, bounded by the total number of cached rows.
+    def __init__(self, max_rows=RESIDENT_MAX_ROWS):
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._rows = 0
+
+    def open(self, path, opener):
+        return CachedWorkbook(path, self, opener)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _put(self, key, value, rows):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._rows -= old[1]
+        self._entries[key] = (value, rows)
+        self._rows += rows
+        while self._rows > self.max_rows and len(self._entries) > 1:
+            _, (_, dropped) = self._entries.popitem(last=False)
+            self._rows -= dropped
+
+    def load_sheets(self, digest):
+        return self._get(("sheets", digest))
+
+    def store_sheets(self, digest, sheetnames, active):
+        self._put(("sheets", digest), (list(sheetnames), active), 0)
+
+    def load_rows(self, digest, sheet):
+        rows = self._get(("rows", digest, sheet))
+        if rows is None:
+            return None
+        return (row for row in rows)
+
+    @contextmanager
+    def store_rows(self, digest, sheet):
+        rows = []
+        yield rows
+        self._put(("rows", digest, sheet), rows, len(rows))
+
+
+class RowSink:
+    def __init__(self, handle):
+        self._handle = handle
+        self._chunk = []
+
+    def append(self, row):
+        self._chunk.append(row)
+        if len(self._chunk) >= CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self._chunk:
+            pickle.dump(self._chunk, self._handle, pickle.HIGHEST_PROTOCOL)
+            self._chunk = []
+
+
+def _iter_chunks(handle):
+    with handle:
+        while True:
+            try:
+                chunk = pickle.load(handle)
+            except EOFError:
+                return
+            yield from chunk
+
+
+class CachedWorkbook:
+    # Same surface as a read-only workbook. The source file is only opened
+    # (and its XML parsed) for sheets that are not cached yet.
+    def __init__(self, path, cache, opener):
+        self.path = path
+        self._cache = cache
+        self._opener = opener
+        self._source = None
+        self.digest = file_digest(path)
+        sheets = cache.load_sheets(self.digest)
+        if sheets is None:
+            source = self.source()
+            sheets = (list(source.sheetnames), source.active.title)
+            cache.store_sheets(self.digest, *sheets)
+        self.sheetnames, self._active = sheets
+
+    def source(self):
+        if self._source is None:
+            self._source = self._opener(self.path)
+        return self._source
+
+    @property
+    def active(self):
+        return self[self._active]
+
+    def __getitem__(self, name):
+        if name not in self.sheetnames:
+            raise KeyError(f"Worksheet {name} does not exist.")
+        return CachedSheet(self, name)
+
+    def __contains__(self, name):
+        return name in self.sheetnames
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+
+class CachedSheet:
+    def __init__(self, book, title):
+        self._book = book
+        self.title = title
+
+    def iter_rows(self, min_row=1, max_row=None, values_only=True):
+        cached = self._book._cache.load_rows(self._book.digest, self.title)
+        if cached is not None:
+            return _slice_rows(cached, min_row, max_row)
+        if max_row is not None:
+            # A bounded read (e.g. the header) is not worth caching on its own.
+            return self._book.source()[self.title].iter_rows(min_row=min_row, max_row=max_row, values_only=True)
+        return self._record(min_row)
+
+    def _record(self, min_row):
+        ws = self._book.source()[self.title]
+        # The entry is committed only if the sheet is read to the end.
+        with self._book._cache.store_rows(self._book.digest, self.title) as sink:
+            for row_idx, row in enumerate(ws.iter_rows(values_only=True), start=1):
+                row = tuple(row)
+                sink.append(row)
+                if row_idx >= min_row:
+                    yield row
+
+
+def _slice_rows(rows, min_row, max_row):
+    for row_idx, row in enumerate(rows, start=1):
+        if max_row is not None and row_idx > max_row:
+            rows.close()
+            return
+        if row_idx >= min_row:
+            yield row
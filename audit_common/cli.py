@@ -0,0 +1,39 @@
+import argparse
+import sys
+
+from audit_common.client import submit
+from audit_common.programs import PROGRAMS, load_program
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="audit",
+        description="Audit mini-programs for Excel.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n"
+        + "\n".join(f"  {name:<12}{desc}" for name, (_, desc) in PROGRAMS.items())
+        + f"\n  {'serve':<12}Keep the programs loaded in a local service (optional)."
+        + "\n\nRun `audit <command> --help` for command options.",
+    )
+    parser.add_argument("command", choices=list(PROGRAMS) + ["serve"], metavar="command", help="Program to run.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed to the program.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "serve":
+        from audit_common.service import main as serve
+
+        return serve(args.args)
+    # A running `audit serve` has the programs and their imports warm already.
+    code = submit(args.command, args.args)
+    if code is not None:
+        return code
+    # Only the chosen program is loaded; it imports openpyxl/python-docx on demand.
+    module = load_program(args.command)
+    return module.main(args.args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+from audit_common.cache import user_data_dir
+
+
+DISABLE_ENV = "AUDIT_NO_SERVICE"
+HOST = "127.0.0.1"
+TOKEN_HEADER = "X-Audit-Token"
+CONNECT_TIMEOUT = 2
+
+
+def state_path():
+    return user_data_dir() / "service.json"
+
+
+class ServiceError(RuntimeError):
+    pass
+
+
+def request(method, path, payload=None, timeout=None):
+    # Returns None when no service can be reached, so callers fall back to
+    # running locally. Once the request is sent the service may already have
+    # run the job, so any later failure raises ServiceError instead.
+    state_file = state_path()
+    if os.environ.get(DISABLE_ENV) or not state_file.is_file():
+        return None
+    import http.client
+
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+        connection = http.client.HTTPConnection(HOST, state["port"], timeout=CONNECT_TIMEOUT)
+        connection.connect()
+    except (OSError, ValueError, KeyError):
+        return None
+    try:
+        connection.sock.settimeout(timeout)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {TOKEN_HEADER: state["token"], "Content-Type": "application/json"}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        reply = json.loads(response.read().decode("utf-8"))
+    except (OSError, ValueError, KeyError, http.client.HTTPException) as exc:
+        raise ServiceError(f"No valid reply from the audit service: {exc}") from None
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise ServiceError(f"Audit service refused the request ({response.status}): {reply.get('error', '')}")
+    return reply
+
+
+def submit(command, argv):
+    try:
+        reply = request("POST", "/run", {"command": command, "args": list(argv), "cwd": str(Path.cwd())})
+    except ServiceError as exc:
+        # Not rerun locally: the job may have run in the service already.
+        print(f"ERROR: {exc}", file=sys.stderr)
+        return 1
+    if reply is None:
+        return None
+    output = reply.get("output", "")
+    if output:
+        sys.stdout.write(output if output.endswith("\n") else output + "\n")
+    return reply.get("exit_code", 1)
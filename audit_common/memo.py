@@ -0,0 +1,93 @@
+import hashlib
+import json
+from pathlib import Path
+
+from audit_common.cache import file_digest
+
+
+MANIFEST_SUFFIX = ".manifest.json"
+CACHED_PREFIX = "Up to date (served from cache):"
+COMMON_DIR = Path(__file__).resolve().parent
+# Options that change how a run is executed or reported, not what it produces.
+IGNORED_ARGS = {
+    "force",
+    "profile",
+    "profile_compute",
+    "cache",
+    "cache_dir",
+    "batch_dir",
+    "batch_output",
+    "workers",
+}
+
+
+def add_memo_arguments(parser):
+    parser.add_argument("--force", action="store_true", help="Recompute even if the output is up to date.")
+
+
+def code_version(script):
+    digest = hashlib.blake2b(digest_size=16)
+    for path in [Path(script).resolve()] + sorted(COMMON_DIR.glob("*.py")):
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def output_digest(path):
+    path = Path(path)
+    if path.is_file():
+        return file_digest(path)
+    if not path.is_dir():
+        return None
+    digest = hashlib.blake2b(digest_size=20)
+    for child in sorted(p for p in path.rglob("*") if p.is_file()):
+        digest.update(child.relative_to(path).as_posix().encode("utf-8"))
+        digest.update(file_digest(child).encode("ascii"))
+    return digest.hexdigest()
+
+
+class RunManifest:
+    # Written next to the output after a successful run. A rerun whose inputs,
+    # arguments and code hash to the same manifest reuses the output as is.
+    def __init__(self, program, script, args, inputs, output):
+        self.program = program
+        self.script = script
+        self.args = {
+            key: value for key, value in sorted(vars(args).items()) if key not in IGNORED_ARGS
+        }
+        self.inputs = [str(path) for path in inputs if path]
+        self.output = Path(str(output).rstrip("/\\"))
+        self.path = Path(str(self.output) + MANIFEST_SUFFIX)
+        self.force = getattr(args, "force", False)
+        self._key = None
+
+    def key(self):
+        if self._key is None:
+            self._key = {
+                "program": self.program,
+                "code": code_version(self.script),
+                "args": {key: str(value) for key, value in self.args.items()},
+                "inputs": {path: file_digest(path) for path in self.inputs},
+            }
+        return self._key
+
+    def cached_exit_code(self):
+        if self.force or not self.path.is_file() or not self.output.exists():
+            return None
+        try:
+            recorded = json.loads(self.path.read_text(encoding="utf-8"))
+            if recorded.get("key") != self.key():
+                return None
+            if recorded.get("output") != output_digest(self.output):
+                return None
+        except (OSError, ValueError):
+            return None
+        print(f"{CACHED_PREFIX} {self.output}")
+        return recorded.get("exit_code", 0)
+
+    def save(self, exit_code=0):
+        try:
+            manifest = {"key": self.key(), "output": output_digest(self.output), "exit_code": exit_code}
+        except OSError:
+            return
+        self.path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
@@ -0,0 +1,178 @@
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+
+SIDECAR_SUFFIX = ".profile.json"
+
+
+def add_profile_arguments(parser):
+    parser.add_argument(
+        "--profile", action="store_true", help="Write per-stage timings to <output>.profile.json."
+    )
+    parser.add_argument("--profile-compute", default="", help="Dump a cProfile of the compute stage to this file.")
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KiB elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_peak_rss():
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+class StageRecord:
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+        self.rows = None
+        self.peak_rss = None
+
+    def add_rows(self, count):
+        self.rows = (self.rows or 0) + count
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "wall_s": self.wall,
+            "cpu_s": self.cpu,
+            "calls": self.calls,
+            "rows": self.rows,
+            "peak_rss_bytes": self.peak_rss,
+        }
+
+
+class Profiler:
+    # Stage times are exclusive: time spent in a nested stage (e.g. compute
+    # pulled lazily while writing) is charged to the nested stage only.
+    def __init__(self, program="", enabled=False, compute_dump=""):
+        self.program = program
+        self.enabled = enabled or bool(compute_dump)
+        self.compute_dump = compute_dump
+        self.started = datetime.now()
+        self._stages = {}
+        self._stack = []
+        self._cprofile = None
+        self._null = StageRecord("")
+
+    @classmethod
+    def from_args(cls, args, program):
+        return cls(program, getattr(args, "profile", False), getattr(args, "profile_compute", ""))
+
+    def stage(self, name):
+        if not self.enabled:
+            return nullcontext(self._null)
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        record = self._stages.get(name)
+        if record is None:
+            record = self._stages[name] = StageRecord(name)
+        children = [0.0, 0.0]
+        self._stack.append(children)
+        profile = self._start_cprofile() if name == "compute" and self.compute_dump else None
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            if profile is not None:
+                profile.disable()
+            self._stack.pop()
+            record.wall += wall - children[0]
+            record.cpu += cpu - children[1]
+            record.calls += 1
+            record.peak_rss = peak_rss_bytes()
+            if self._stack:
+                self._stack[-1][0] += wall
+                self._stack[-1][1] += cpu
+
+    def _start_cprofile(self):
+        if self._cprofile is None:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+        self._cprofile.enable()
+        return self._cprofile
+
+    def iterate(self, name, iterable):
+        if not self.enabled:
+            return iterable
+        return self._iterate(name, iterable)
+
+    def _iterate(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as record:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                record.add_rows(1)
+            yield item
+
+    def report(self, **extra):
+        stages = [record.as_dict() for record in self._stages.values()]
+        return {
+            "program": self.program,
+            "started": self.started.isoformat(timespec="seconds"),
+            **extra,
+            "stages": stages,
+            "total_wall_s": sum(s["wall_s"] for s in stages),
+            "total_cpu_s": sum(s["cpu_s"] for s in stages),
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+    def write(self, target, **extra):
+        if not self.enabled:
+            return None
+        sidecar = Path(str(target).rstrip("/\\") + SIDECAR_SUFFIX)
+        sidecar.write_text(json.dumps(self.report(**extra), indent=2, default=str), encoding="utf-8")
+        if self.compute_dump and self._cprofile is not None:
+            self._cprofile.dump_stats(self.compute_dump)
+        return sidecar
+
+
+NULL_PROFILER = Profiler()
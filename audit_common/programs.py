@@ -0,0 +1,56 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROGRAMS = {
+    "rename": ("01_rename_files/rename_files.py", "Rename files from an Excel mapping list."),
+    "confirm": ("02_confirmation_letters/generate_confirmations.py", "Generate confirmation letters from Excel."),
+    "lease": ("03_lease_calculation/lease_calc.py", "Lease amortization schedule generator."),
+    "interest": ("04_bank_interest/bank_interest.py", "Bank deposit interest calculator."),
+    "reconcile": ("05_ar_ap_reconciliation/reconcile_parties.py", "AR/AP reconciliation by party."),
+    "statements": ("06_financial_statements/financial_statements.py", "Financial statements generator with checks."),
+    "format": ("07_excel_format/format_excel.py", "Apply financial-style formatting to Excel."),
+    "round": ("08_excel_rounding/round_excel.py", "Round numeric values in Excel."),
+}
+
+
+def program_path(command):
+    return ROOT / PROGRAMS[command][0]
+
+
+def load_module(name, path):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def load_program(command):
+    return load_module(f"audit_{command}", program_path(command))
+
+
+def function_ref(func):
+    # Program folders are not importable packages, so worker processes locate
+    # functions by module name plus source file instead of by import path.
+    module = sys.modules[func.__module__]
+    return func.__module__, getattr(module, "__file__", None), func.__name__
+
+
+def resolve_function(ref):
+    name, path, attr = ref
+    return getattr(load_module(name, path), attr)
+
+
+def call_function(ref, *args):
+    return resolve_function(ref)(*args)
@@ -0,0 +1,113 @@
+import re
+from collections import namedtuple
+from pathlib import Path
+
+from audit_common.tabular import is_tabular, open_tabular
+
+
+def normalize_header(value):
+    if value is None:
+        return ""
+    text = str(value).strip().lower()
+    text = text.replace("（", "(").replace("）", ")")
+    text = re.sub(r"\s+", "", text)
+    text = re.sub(r"[()（）\[\]【】:%/\\-]", "", text)
+    return text
+
+
+class HeaderIndex:
+    # Aliases are normalized and compiled once per program, then every sheet
+    # header is resolved with dict lookups plus one regex search per column.
+    def __init__(self, aliases):
+        self.keys = tuple(aliases)
+        self.record_type = namedtuple("Record", self.keys)
+        self._exact = {}
+        self._partial = {}
+        for key, options in aliases.items():
+            norms = [normalize_header(option) for option in options]
+            self._exact[key] = norms
+            pattern = "|".join(re.escape(norm) for norm in norms if norm)
+            self._partial[key] = re.compile(pattern) if pattern else None
+
+    def resolve(self, header_row):
+        headers = [normalize_header(value) for value in header_row]
+        positions = {}
+        for idx, header in enumerate(headers):
+            positions.setdefault(header, idx)
+
+        indices = {}
+        for key in self.keys:
+            idx = None
+            for alias in self._exact[key]:
+                if alias in positions:
+                    idx = positions[alias]
+                    break
+            partial = self._partial[key]
+            if idx is None and partial is not None:
+                for pos, header in enumerate(headers):
+                    if partial.search(header):
+                        idx = pos
+                        break
+            indices[key] = idx
+        return ColumnMap(self.record_type, indices)
+
+
+class ColumnMap:
+    def __init__(self, record_type, indices):
+        self.indices = indices
+        self._make = record_type._make
+        self._positions = [indices[key] for key in record_type._fields]
+        self._width = max((idx for idx in self._positions if idx is not None), default=-1) + 1
+
+    def __getitem__(self, key):
+        return self.indices[key]
+
+    def has(self, *keys):
+        return all(self.indices[key] is not None for key in keys)
+
+    def missing(self, keys):
+        return [key for key in keys if self.indices[key] is None]
+
+    def record(self, values):
+        if len(values) < self._width:
+            values = tuple(values) + (None,) * (self._width - len(values))
+        return self._make([values[idx] if idx is not None else None for idx in self._positions])
+
+
+def open_workbook(path, cache=None):
+    # openpyxl is imported on first use so that --help and argument errors stay fast.
+    if not Path(path).is_file():
+        raise FileNotFoundError(f"Input not found: {path}")
+    if cache is not None:
+        return cache.open(path, _open_source)
+    return _open_source(path)
+
+
+def _open_source(path):
+    if is_tabular(path):
+        # CSV/Parquet exports are read directly, no workbook is ever built.
+        return open_tabular(path)
+    from openpyxl import load_workbook
+
+    return load_workbook(path, read_only=True, data_only=True)
+
+
+def read_header(ws, header_row=1):
+    for row in ws.iter_rows(min_row=header_row, max_row=header_row, values_only=True):
+        return row
+    return ()
+
+
+def iter_values(ws, min_row=2, width=None):
+    for row_idx, row in enumerate(ws.iter_rows(min_row=min_row, values_only=True), start=min_row):
+        if all(v is None for v in row):
+            continue
+        if width is not None and len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        yield row_idx, row
+
+
+def iter_records(ws, columns, min_row=2):
+    record = columns.record
+    for row_idx, row in iter_values(ws, min_row=min_row):
+        yield row_idx, record(row)
@@ -0,0 +1,156 @@
+import argparse
+import importlib
+import io
+import json
+import os
+import secrets
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from audit_common.cache import MemoryRowCache, set_resident_cache
+from audit_common.client import HOST, TOKEN_HEADER, ServiceError, request, state_path
+from audit_common.programs import PROGRAMS, load_program
+
+
+WARM_MODULES = ("openpyxl", "docx")
+
+
+def warm_worker():
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    for command in PROGRAMS:
+        load_program(command)
+    set_resident_cache(MemoryRowCache())
+
+
+def worker_pid(_):
+    return os.getpid()
+
+
+def run_command(command, argv, cwd):
+    buffer = io.StringIO()
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(buffer), redirect_stderr(buffer):
+            code = load_program(command).main(argv)
+    except SystemExit as exc:
+        # argparse exits for --help and usage errors.
+        code = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+    except Exception as exc:
+        code = 1
+        buffer.write(f"ERROR: {type(exc).__name__}: {exc}\n")
+    return code, buffer.getvalue()
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path != "/status":
+            self._reply(404, {"error": "not found"})
+            return
+        self._reply(200, {"pid": os.getpid(), "workers": self.server.workers, "jobs": self.server.jobs})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path == "/shutdown":
+            self._reply(200, {"stopping": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if self.path != "/run":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            command, argv, cwd = job["command"], list(job["args"]), job["cwd"]
+        except (KeyError, TypeError, ValueError) as exc:
+            self._reply(400, {"error": f"Bad job: {exc}"})
+            return
+        if command not in PROGRAMS:
+            self._reply(400, {"error": f"Unknown command: {command}"})
+            return
+        # Handlers run in their own threads.
+        with self.server.lock:
+            self.server.jobs += 1
+        code, output = self.server.pool.submit(run_command, command, argv, cwd).result()
+        print(f"[{code}] {command} {' '.join(argv)}", flush=True)
+        self._reply(200, {"exit_code": code, "output": output})
+
+    def _authorized(self):
+        if secrets.compare_digest(self.headers.get(TOKEN_HEADER, ""), self.server.token):
+            return True
+        self._reply(403, {"error": "forbidden"})
+        return False
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, workers):
+    path = state_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_worker) as pool:
+        # Start the workers now so the first jobs do not pay for the imports.
+        list(pool.map(worker_pid, range(workers)))
+        server = ThreadingHTTPServer((HOST, port), JobHandler)
+        server.pool = pool
+        server.workers = workers
+        server.jobs = 0
+        server.lock = threading.Lock()
+        server.token = secrets.token_hex(16)
+        state = {"port": server.server_address[1], "pid": os.getpid(), "token": server.token}
+        path.write_text(json.dumps(state), encoding="utf-8")
+        print(f"Audit service listening on {HOST}:{state['port']} with {workers} worker(s). Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            path.unlink(missing_ok=True)
+    print("Audit service stopped.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="audit serve", description="Run the local audit service.")
+    parser.add_argument("--port", type=int, default=0, help="Port on 127.0.0.1 (default: any free port).")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="Worker processes (default: CPU count, at most 4)."
+    )
+    parser.add_argument("--stop", action="store_true", help="Stop the running service.")
+    parser.add_argument("--status", action="store_true", help="Show whether the service is running.")
+    args = parser.parse_args(argv)
+
+    if args.stop or args.status:
+        try:
+            reply = request("POST" if args.stop else "GET", "/shutdown" if args.stop else "/status")
+        except ServiceError as exc:
+            print(f"ERROR: {exc}", file=sys.stderr)
+            return 1
+        if reply is None:
+            print("Audit service is not running.")
+            return 1
+        print("Audit service stopping." if args.stop else json.dumps(reply))
+        return 0
+
+    serve(args.port, args.workers or min(os.cpu_count() or 1, 4))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
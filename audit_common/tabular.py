@@ -0,0 +1,108 @@
+import codecs
+import csv
+from pathlib import Path
+
+
+CSV_SUFFIXES = (".csv", ".tsv")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+SNIFF_BYTES = 1 << 20
+CSV_DELIMITERS = ",\t;|"
+PARQUET_BATCH_ROWS = 65536
+
+
+def is_tabular(path):
+    return Path(path).suffix.lower() in CSV_SUFFIXES + PARQUET_SUFFIXES
+
+
+def sniff_encoding(path):
+    with open(path, "rb") as handle:
+        sample = handle.read(SNIFF_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    # The sample may end inside a multi-byte character, so decode incrementally.
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        # Kingdee/UFIDA exports on Chinese Windows are GBK; GB18030 is a superset.
+        return "gb18030"
+
+
+def sniff_delimiter(path, encoding):
+    with open(path, encoding=encoding, newline="") as handle:
+        sample = handle.read(64 * 1024)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+class TabularSheet:
+    # Mirrors the read-only worksheet API the readers use: title and
+    # iter_rows(min_row, max_row, values_only=True) with 1-based row numbers.
+    def __init__(self, title, iter_source):
+        self.title = title
+        self._iter_source = iter_source
+
+    def iter_rows(self, min_row=1, max_row=None, values_only=True):
+        for row_idx, row in enumerate(self._iter_source(), start=1):
+            if max_row is not None and row_idx > max_row:
+                break
+            if row_idx >= min_row:
+                yield row
+
+
+class TabularWorkbook:
+    def __init__(self, sheet):
+        self._sheet = sheet
+        self.sheetnames = [sheet.title]
+
+    @property
+    def active(self):
+        return self._sheet
+
+    def __getitem__(self, name):
+        if name != self._sheet.title:
+            raise KeyError(f"Worksheet {name} does not exist.")
+        return self._sheet
+
+    def __contains__(self, name):
+        return name in self.sheetnames
+
+    def close(self):
+        pass
+
+
+def open_csv(path):
+    encoding = sniff_encoding(path)
+    delimiter = sniff_delimiter(path, encoding)
+
+    def rows():
+        with open(path, encoding=encoding, newline="") as handle:
+            for row in csv.reader(handle, delimiter=delimiter):
+                yield tuple(value if value.strip() else None for value in row)
+
+    return TabularWorkbook(TabularSheet(Path(path).stem, rows))
+
+
+def open_parquet(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading .parquet input requires pyarrow (pip install pyarrow).") from None
+
+    def rows():
+        parquet = pq.ParquetFile(path)
+        yield tuple(parquet.schema_arrow.names)
+        for batch in parquet.iter_batches(batch_size=PARQUET_BATCH_ROWS):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+
+    return TabularWorkbook(TabularSheet(Path(path).stem, rows))
+
+
+def open_tabular(path):
+    if Path(path).suffix.lower() in PARQUET_SUFFIXES:
+        return open_parquet(path)
+    return open_csv(path)
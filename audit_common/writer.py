@@ -0,0 +1,43 @@
+import os
+
+
+class OutputWorkbook:
+    # Write-only sheets flush rows to disk as they are appended, so output
+    # size no longer bounds peak memory. Rows cannot be revisited once written.
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        self.path = path
+        self._wb = Workbook(write_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_sheet(self, title, header=None):
+        ws = self._wb.create_sheet(title)
+        if header:
+            ws.append(header)
+        return ws
+
+    def save(self):
+        try:
+            self._wb.save(self.path)
+        except BaseException:
+            # A half-written workbook must not be mistaken for output.
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            raise
+
+    def close(self):
+        # Ends sheets still streaming and removes their temp files. Left to
+        # the garbage collector, the open lxml writers print "Exception
+        # ignored" tracebacks after an error. Does nothing after save().
+        for ws in self._wb.worksheets:
+            if not ws.closed:
+                ws.close()
+            writer = ws._writer
+            if writer is not None and os.path.exists(writer.out):
+                writer.cleanup()
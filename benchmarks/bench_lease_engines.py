@@ -0,0 +1,80 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.programs import load_program
+from benchmarks.synth import LEASE_HEADER, lease_rows
+
+
+def make_portfolio(n_leases):
+    leases = [dict(zip(LEASE_HEADER, row)) for row in lease_rows(n_leases)]
+    # A few interest-free leases exercise the zero-rate branch.
+    for lease in leases[::97]:
+        lease["discount_rate"] = 0
+    return leases
+
+
+def consume(results):
+    # Materialize every row once, as writing the Schedule sheet would.
+    for result in results:
+        yield result, list(result["rows"])
+
+
+def compare(mod, leases):
+    timings = {}
+    start = time.perf_counter()
+    for _ in consume(mod.iter_results(leases)):
+        pass
+    timings["python_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in consume(mod.iter_vector_results(leases)):
+        pass
+    timings["numpy_s"] = time.perf_counter() - start
+
+    worst = 0.0
+    rows = 0
+    paired = zip(consume(mod.iter_results(leases)), consume(mod.iter_vector_results(leases)))
+    for (scalar, scalar_rows), (vector, vector_rows) in paired:
+        if scalar["periods"] != vector["periods"] or len(scalar_rows) != len(vector_rows):
+            raise AssertionError(f"Period count differs for {scalar['lease']['contract_id']}")
+        for key in ("pv", "total_interest", "ending_balance"):
+            worst = max(worst, abs(scalar[key] - vector[key]) / max(1.0, abs(scalar[key])))
+        for left, right in zip(scalar_rows, vector_rows):
+            if list(left[:2]) != list(right[:2]):
+                raise AssertionError(f"Period or date differs for {scalar['lease']['contract_id']}: {left[:2]}")
+            for a, b in zip(left[2:], right[2:]):
+                worst = max(worst, abs(a - b) / max(1.0, abs(a)))
+        rows += len(scalar_rows)
+    return dict(timings, rows=rows, max_relative_diff=worst)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the numpy lease engine against the scalar one.")
+    parser.add_argument("--leases", type=int, default=20000, help="Synthetic leases (default: 20000).")
+    parser.add_argument(
+        "--tolerance", type=float, default=1e-6, help="Max relative difference per value (default: 1e-6)."
+    )
+    parser.add_argument("--json", default="", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    mod = load_program("lease")
+    result = compare(mod, make_portfolio(args.leases))
+    within = result["max_relative_diff"] <= args.tolerance
+    print(
+        f"{args.leases} leases, {result['rows']} periods: python {result['python_s']:.2f}s, "
+        f"numpy {result['numpy_s']:.2f}s (x{result['python_s'] / result['numpy_s']:.1f}); "
+        f"max relative diff {result['max_relative_diff']:.2e} "
+        f"{'within' if within else 'EXCEEDS'} {args.tolerance:.0e}"
+    )
+    if args.json:
+        report = dict(result, leases=args.leases, tolerance=args.tolerance)
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
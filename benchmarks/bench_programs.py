@@ -0,0 +1,289 @@
+import argparse
+import csv
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.programs import ROOT, load_program
+from audit_common.reader import open_workbook
+from audit_common.writer import OutputWorkbook
+from benchmarks import synth
+
+
+STAGES = ["load", "parse", "compute", "write"]
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+def bench_rename(workdir, n, timer):
+    mod = load_program("rename")
+    path = workdir / f"rename_{n}.xlsx"
+    folder = workdir / f"rename_{n}_files"
+    synth.make_rename_list(path, folder, n)
+    with timer.stage("parse"):
+        mapping = mod.read_mapping(str(path), None)
+    with timer.stage("compute"):
+        plan = mod.validate_plan([(folder / old, folder / new) for old, new in mapping], False)
+    with timer.stage("write"):
+        mod.rename_files(plan, False)
+    return len(mapping)
+
+
+def bench_confirm(workdir, n, timer):
+    mod = load_program("confirm")
+    path = synth.make_letter_list(workdir / f"confirm_{n}.xlsx", n)
+    output_dir = workdir / f"confirm_{n}_out"
+    output_dir.mkdir()
+    with timer.stage("load"):
+        wb = open_workbook(path)
+        ws = wb.active
+    with timer.stage("parse"):
+        rows = mod.read_rows(ws)
+        wb.close()
+    with timer.stage("load"):
+        template = mod.load_renderer("", "ooxml")
+    index_rows = []
+    for idx, row in enumerate(rows, start=1):
+        with timer.stage("compute"):
+            data, filename, index_row = mod.letter_context(idx, row)
+            payload = template.to_bytes(data)
+        with timer.stage("write"):
+            (output_dir / filename).write_bytes(payload)
+        index_rows.append(index_row)
+    with timer.stage("write"):
+        mod.write_index(output_dir, index_rows)
+    return len(rows)
+
+
+def bench_lease(workdir, n, timer):
+    mod = load_program("lease")
+    path = synth.make_leases(workdir / f"lease_{n}.xlsx", n)
+    with timer.stage("load"):
+        wb = open_workbook(path)
+        ws = wb["Leases"]
+    with timer.stage("parse"):
+        leases = mod.read_leases(ws)
+        wb.close()
+    with timer.stage("compute"):
+        results = list(mod.iter_results(leases))
+    with timer.stage("write"):
+        mod.write_output(workdir / f"lease_{n}_out.xlsx", results)
+    return len(leases)
+
+
+def bench_interest(workdir, n, timer):
+    mod = load_program("interest")
+    path = synth.make_deposits(workdir / f"interest_{n}.xlsx", n)
+    with timer.stage("load"):
+        wb = open_workbook(path)
+        ws = wb["Deposits"]
+    with timer.stage("parse"):
+        header, rows = mod.read_rows(ws)
+        rows = list(rows)
+        wb.close()
+    with timer.stage("compute"):
+        computed = [list(row) + list(mod.calculate_interest(row_idx, deposit)) for row_idx, row, deposit in rows]
+    with timer.stage("write"):
+        out = OutputWorkbook(workdir / f"interest_{n}_out.xlsx")
+        ws_out = out.add_sheet("Deposits", list(header) + ["days_calc", "interest", "maturity_amount"])
+        for row in computed:
+            ws_out.append(row)
+        out.save()
+    return len(rows)
+
+
+def bench_reconcile(workdir, n, timer):
+    mod = load_program("reconcile")
+    path = synth.make_party_ledger(workdir / f"reconcile_{n}.xlsx", n)
+    with timer.stage("load"):
+        wb = open_workbook(path)
+    with timer.stage("parse"):
+        totals, unclassified = mod.collect_totals(wb)
+        wb.close()
+    with timer.stage("compute"):
+        summary = list(mod.summarize(totals))
+    with timer.stage("write"):
+        mod.write_output(workdir / f"reconcile_{n}_out.xlsx", summary, unclassified)
+    return n
+
+
+def bench_statements(workdir, n, timer):
+    mod = load_program("statements")
+    path = synth.make_trial_balance(workdir / f"statements_{n}.xlsx", n)
+    with timer.stage("load"):
+        wb = open_workbook(path)
+        tb_sheet = mod.pick_tb_sheet(wb)
+        mapping_sheet = mod.pick_sheet(wb, mod.MAPPING_SHEET_CANDIDATES)
+        param_sheet = mod.pick_sheet(wb, mod.PARAMETERS_SHEET_CANDIDATES)
+    with timer.stage("parse"):
+        accounts = mod.read_tb(wb[tb_sheet])
+        mapping_rows = mod.read_mapping(wb[mapping_sheet])
+        params = mod.read_parameters(wb, param_sheet)
+        wb.close()
+    with timer.stage("compute"):
+        sheets, checks = mod.build_statements(accounts, mapping_rows, params)
+    with timer.stage("write"):
+        mod.write_statements(workdir / f"statements_{n}_out.xlsx", sheets, checks)
+    return len(accounts)
+
+
+def bench_format(workdir, n, timer):
+    from openpyxl import load_workbook
+
+    mod = load_program("format")
+    path = synth.make_wide_sheet(workdir / f"format_{n}.xlsx", n)
+    with timer.stage("load"):
+        wb = load_workbook(path)
+        ws = wb.active
+    with timer.stage("parse"):
+        mod.detect_columns(ws, 1, 20)
+    with timer.stage("compute"):
+        mod.format_sheet(ws, 1, 20)
+    with timer.stage("write"):
+        wb.save(workdir / f"format_{n}_out.xlsx")
+    return n
+
+
+def bench_round(workdir, n, timer):
+    from openpyxl import load_workbook
+
+    mod = load_program("round")
+    path = synth.make_wide_sheet(workdir / f"round_{n}.xlsx", n)
+    with timer.stage("load"):
+        wb = load_workbook(path)
+        ws = wb.active
+    with timer.stage("parse"):
+        columns = mod.resolve_columns(ws, 1, "C,D,E,F,G,H")
+    with timer.stage("compute"):
+        mod.round_sheet(ws, 1, 2, columns)
+    with timer.stage("write"):
+        wb.save(workdir / f"round_{n}_out.xlsx")
+    return n
+
+
+BENCHMARKS = {
+    "rename": bench_rename,
+    "confirm": bench_confirm,
+    "lease": bench_lease,
+    "interest": bench_interest,
+    "reconcile": bench_reconcile,
+    "statements": bench_statements,
+    "format": bench_format,
+    "round": bench_round,
+}
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return result.stdout.strip()
+
+
+def run_case(program, n, workdir):
+    timer = StageTimer()
+    case_dir = workdir / f"{program}_{n}"
+    case_dir.mkdir()
+    rows = BENCHMARKS[program](case_dir, n, timer)
+    total = sum(timer.seconds.values())
+    result = {"program": program, "size": n, "rows": rows}
+    for stage in STAGES:
+        result[f"{stage}_s"] = timer.seconds.get(stage)
+    result["total_s"] = total
+    result["rows_per_s"] = rows / total if total else None
+    return result
+
+
+def compare(results, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    previous = {(r["program"], r["size"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('revision') or 'unknown revision'}):")
+    for result in results:
+        old = previous.get((result["program"], result["size"]))
+        if not old or not old.get("rows_per_s") or not result["rows_per_s"]:
+            continue
+        change = (result["rows_per_s"] / old["rows_per_s"] - 1) * 100
+        print(f"  {result['program']:<11}{result['size']:>9}  rows/s {change:+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every program on synthetic inputs.")
+    parser.add_argument("--sizes", default="500,5000", help="Comma-separated input sizes (default: 500,5000).")
+    parser.add_argument("--programs", default="", help="Comma-separated programs (default: all).")
+    parser.add_argument("--workdir", default="", help="Keep synthetic inputs and outputs in this folder.")
+    parser.add_argument("--json", default="bench_report.json", help="JSON report (default: bench_report.json).")
+    parser.add_argument("--csv", default="", help="Also write a CSV report.")
+    parser.add_argument("--baseline", default="", help="Previous JSON report to compare rows/s against.")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    programs = [p.strip() for p in args.programs.split(",") if p.strip()] or list(BENCHMARKS)
+    unknown = [p for p in programs if p not in BENCHMARKS]
+    if unknown:
+        print(f"ERROR: Unknown program(s): {', '.join(unknown)}", file=sys.stderr)
+        return 1
+
+    tmp = None
+    if args.workdir:
+        workdir = Path(args.workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="audit_bench_")
+        workdir = Path(tmp.name)
+
+    results = []
+    try:
+        for program in programs:
+            for n in sizes:
+                result = run_case(program, n, workdir)
+                results.append(result)
+                stages = "  ".join(
+                    f"{stage} {result[f'{stage}_s']:.3f}s" for stage in STAGES if result[f"{stage}_s"] is not None
+                )
+                print(f"{program:<11}{n:>9}  {result['rows_per_s']:>12,.0f} rows/s  {stages}")
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    meta = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    Path(args.json).write_text(json.dumps({"meta": meta, "results": results}, indent=2), encoding="utf-8")
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as handle:
+            writer = csv.DictWriter(handle, fieldnames=["revision"] + list(results[0]))
+            writer.writeheader()
+            for result in results:
+                writer.writerow({"revision": meta["revision"], **result})
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
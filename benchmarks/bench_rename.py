@@ -0,0 +1,75 @@
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.programs import load_program
+from benchmarks.synth import party_name
+
+
+def make_folder(folder, n_files):
+    folder.mkdir()
+    plan = []
+    for i in range(n_files):
+        old = folder / f"scan_{i:07d}.pdf"
+        old.touch()
+        plan.append((old, folder / f"记-{i:07d}-{party_name(i % 997)}.pdf"))
+    # A block of swaps exercises the a->b / b->a handling.
+    for i in range(0, min(n_files, 1000) - 1, 2):
+        plan[i], plan[i + 1] = (plan[i][0], plan[i + 1][0]), (plan[i + 1][0], plan[i][0])
+    return plan
+
+
+def run_size(mod, workdir, n_files):
+    plan = make_folder(workdir / f"rename_{n_files}", n_files)
+    start = time.perf_counter()
+    moves = mod.validate_plan(plan, False)
+    validated = time.perf_counter()
+    mod.rename_files(moves, False)
+    renamed = time.perf_counter()
+    return {
+        "files": n_files,
+        "validate_s": validated - start,
+        "rename_s": renamed - validated,
+        "validate_us_per_file": (validated - start) / n_files * 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that rename planning scales linearly with folder size.")
+    parser.add_argument(
+        "--sizes", default="10000,20000,40000,80000", help="Comma-separated file counts (default: 10000..80000)."
+    )
+    parser.add_argument(
+        "--max-ratio", type=float, default=2.0, help="Max per-file validate time, largest vs smallest (default: 2)."
+    )
+    parser.add_argument("--json", default="", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+    mod = load_program("rename")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="audit_rename_") as tmp:
+        for n in sizes:
+            result = run_size(mod, Path(tmp), n)
+            results.append(result)
+            print(
+                f"{n:>9} files  validate {result['validate_s']:.3f}s "
+                f"({result['validate_us_per_file']:.1f} us/file)  rename {result['rename_s']:.3f}s"
+            )
+
+    ratio = results[-1]["validate_us_per_file"] / results[0]["validate_us_per_file"]
+    linear = ratio <= args.max_ratio
+    print(f"per-file cost x{ratio:.2f} from {sizes[0]} to {sizes[-1]} files: {'linear' if linear else 'NOT LINEAR'}")
+    if args.json:
+        report = {"max_ratio": args.max_ratio, "ratio": ratio, "results": results}
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0 if linear else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,65 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+AUDIT = str(ROOT / "audit.py")
+COMMANDS = ["rename", "confirm", "lease", "interest", "reconcile", "statements", "format", "round"]
+
+
+def build_cases():
+    cases = [("audit --help", [AUDIT, "--help"])]
+    for command in COMMANDS:
+        cases.append((f"audit {command} --help", [AUDIT, command, "--help"]))
+    # Argument validation: a missing input must be reported before openpyxl is imported.
+    cases.append(("audit rename --dry-run (missing input)", [AUDIT, "rename", "--input", "missing.xlsx", "--dry-run"]))
+    cases.append(("audit statements (missing input)", [AUDIT, "statements", "--input", "missing.xlsx"]))
+    return cases
+
+
+def time_command(args, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure start-up time of the audit CLI.")
+    parser.add_argument("--repeats", type=int, default=10, help="Runs per case (default: 10).")
+    parser.add_argument(
+        "--limit-ms", type=float, default=100.0, help="Max median overhead over a bare interpreter (default: 100)."
+    )
+    parser.add_argument("--json", default="", help="Write results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    baseline = statistics.median(time_command(["-c", "pass"], args.repeats))
+    reference = statistics.median(time_command(["-c", "import openpyxl, docx"], args.repeats))
+    print(f"{'bare interpreter':<45}{baseline:8.1f} ms")
+    print(f"{'import openpyxl + docx (reference)':<45}{reference:8.1f} ms")
+
+    results = []
+    failed = False
+    for name, cmd in build_cases():
+        median = statistics.median(time_command(cmd, args.repeats))
+        overhead = median - baseline
+        ok = overhead <= args.limit_ms
+        failed = failed or not ok
+        results.append({"case": name, "median_ms": median, "overhead_ms": overhead, "ok": ok})
+        print(f"{name:<45}{median:8.1f} ms  (+{overhead:.1f}){'' if ok else '  SLOW'}")
+
+    if args.json:
+        report = {"baseline_ms": baseline, "reference_ms": reference, "limit_ms": args.limit_ms, "cases": results}
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,180 @@
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audit_common.writer import OutputWorkbook
+
+
+TB_PREFIXES = [
+    ("1001", "库存现金", "资产", "BS", "Assets"),
+    ("1002", "银行存款", "资产", "BS", "Assets"),
+    ("1122", "应收账款", "资产", "BS", "Assets"),
+    ("1221", "其他应收款", "资产", "BS", "Assets"),
+    ("1601", "固定资产", "资产", "BS", "Assets"),
+    ("2202", "应付账款", "负债", "BS", "Liabilities"),
+    ("2211", "应付职工薪酬", "负债", "BS", "Liabilities"),
+    ("2241", "其他应付款", "负债", "BS", "Liabilities"),
+    ("4001", "实收资本", "权益", "BS", "Equity"),
+    ("4103", "本年利润", "权益", "BS", "Equity"),
+    ("6001", "主营业务收入", "损益", "IS", "Revenue"),
+    ("6051", "其他业务收入", "损益", "IS", "Revenue"),
+    ("6401", "主营业务成本", "损益", "IS", "Expense"),
+    ("6601", "销售费用", "损益", "IS", "Expense"),
+    ("6602", "管理费用", "损益", "IS", "Expense"),
+]
+RANGE_CHUNK = 50
+PARTY_ACCOUNTS = [("1122", "应收账款"), ("2202", "应付账款"), ("1221", "其他应收款"), ("2241", "其他应付款")]
+FREQUENCIES = ["M", "Q", "A", "月", "季", "年"]
+TIMINGS = ["begin", "end", "期初", "期末"]
+LEASE_HEADER = [
+    "contract_id",
+    "lease_start",
+    "lease_end",
+    "payment_amount",
+    "payment_frequency",
+    "discount_rate",
+    "payment_timing",
+    "currency",
+]
+
+
+def party_name(idx):
+    return f"往来单位{idx:06d}有限公司"
+
+
+def make_trial_balance(path, n_accounts, seed=0):
+    rng = random.Random(seed)
+    out = OutputWorkbook(path)
+    tb = out.add_sheet("科目余额表", ["科目编码", "科目名称", "科目类型", "期初余额", "期末借方余额", "期末贷方余额"])
+    per_prefix = max(1, n_accounts // len(TB_PREFIXES))
+    for prefix, name, acc_type, _, _ in TB_PREFIXES:
+        for i in range(per_prefix):
+            amount = round(rng.uniform(100, 1_000_000), 2)
+            debit, credit = (amount, 0) if prefix[0] in "16" and prefix != "6001" else (0, amount)
+            tb.append([f"{prefix}{i:04d}", f"{name}-{i}", acc_type, round(amount * 0.9, 2), debit, credit])
+
+    # Mapping mixes prefix tokens, range tokens over chunks of detail codes and literal codes.
+    mapping = out.add_sheet("Mapping", ["statement", "section", "line_item", "account_code", "sign"])
+    for prefix, name, _, statement, section in TB_PREFIXES:
+        sign = 1 if section in ("Assets", "Expense") else -1
+        if per_prefix <= RANGE_CHUNK:
+            mapping.append([statement, section, name, f"{prefix}*", sign])
+            continue
+        for start in range(0, per_prefix, RANGE_CHUNK):
+            end = min(start + RANGE_CHUNK, per_prefix) - 1
+            token = f"{prefix}{start:04d}-{prefix}{end:04d}"
+            if start == 0:
+                token = ", ".join(f"{prefix}{i:04d}" for i in range(end + 1))
+            mapping.append([statement, section, f"{name} {start // RANGE_CHUNK + 1}", token, sign])
+    mapping.append(["CF", "Operating", "Cash movement", "1001*", 1])
+
+    params = out.add_sheet("Parameters")
+    params.append(["tolerance", 0.01])
+    out.save()
+    return path
+
+
+def lease_rows(n_leases, seed=0):
+    rng = random.Random(seed)
+    for i in range(n_leases):
+        start = date(2018, 1, 1) + timedelta(days=rng.randrange(0, 365 * 6))
+        years = rng.randint(3, 20)
+        end = date(start.year + years, start.month, 1) - timedelta(days=1)
+        yield [
+            f"L{i:07d}",
+            start,
+            end,
+            round(rng.uniform(2_000, 200_000), 2),
+            rng.choice(FREQUENCIES),
+            round(rng.uniform(2.5, 6.5), 2),
+            rng.choice(TIMINGS),
+            rng.choice(["CNY", "CNY", "USD", "HKD"]),
+        ]
+
+
+def make_leases(path, n_leases, seed=0):
+    out = OutputWorkbook(path)
+    ws = out.add_sheet("Leases", LEASE_HEADER)
+    for row in lease_rows(n_leases, seed):
+        ws.append(row)
+    out.save()
+    return path
+
+
+def make_deposits(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    out = OutputWorkbook(path)
+    ws = out.add_sheet("Deposits", ["账号", "本金", "年利率", "起息日", "到期日", "天数", "计息基数"])
+    for i in range(n_rows):
+        start = date(2024, 1, 1) + timedelta(days=rng.randrange(0, 365))
+        if i % 3 == 0:
+            ws.append([f"6222{i:012d}", round(rng.uniform(1e4, 1e7), 2), 1.35, None, None, rng.choice([90, 180, 365]), 360])
+        else:
+            end = start + timedelta(days=rng.choice([90, 180, 365, 730]))
+            ws.append([f"6222{i:012d}", round(rng.uniform(1e4, 1e7), 2), rng.choice([0.015, 1.75, 2.25]), start, end, None, None])
+    out.save()
+    return path
+
+
+def make_party_ledger(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    n_parties = max(1, n_rows // 4)
+    out = OutputWorkbook(path)
+    ws = out.add_sheet("往来明细", ["科目编码", "科目名称", "往来单位", "借方余额", "贷方余额"])
+    for _ in range(n_rows):
+        code, name = rng.choice(PARTY_ACCOUNTS)
+        amount = round(rng.uniform(10, 500_000), 2)
+        debit, credit = (amount, 0) if code.startswith("1") else (0, amount)
+        ws.append([code, name, party_name(rng.randrange(n_parties)), debit, credit])
+    out.save()
+    return path
+
+
+def make_rename_list(path, folder, n_files):
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    out = OutputWorkbook(path)
+    ws = out.add_sheet("Sheet1", ["原文件名", "新文件名"])
+    for i in range(n_files):
+        old = f"scan_{i:07d}.pdf"
+        (folder / old).touch()
+        ws.append([old, f"记-{i:07d}-{party_name(i % 997)}.pdf"])
+    out.save()
+    return path
+
+
+def make_letter_list(path, n_rows, seed=0):
+    rng = random.Random(seed)
+    out = OutputWorkbook(path)
+    ws = out.add_sheet("Sheet1", ["往来单位", "余额", "截止日期", "地址", "联系人", "币种", "备注"])
+    for i in range(n_rows):
+        ws.append(
+            [
+                party_name(i),
+                round(rng.uniform(1_000, 5_000_000), 2),
+                date(2025, 12, 31),
+                f"上海市浦东新区示例路{i % 999 + 1}号",
+                f"联系人{i % 50}",
+                rng.choice(["CNY", "USD"]),
+                "",
+            ]
+        )
+    out.save()
+    return path
+
+
+def make_wide_sheet(path, n_rows, n_cols=30, seed=0):
+    rng = random.Random(seed)
+    out = OutputWorkbook(path)
+    header = ["date", "name"] + [f"amount_{i}" for i in range(n_cols - 2)]
+    ws = out.add_sheet("Data", header)
+    base = date(2025, 1, 1)
+    for i in range(n_rows):
+        row = [base + timedelta(days=i % 365), f"item {i}"]
+        row.extend(rng.uniform(-1e6, 1e6) if c % 3 else rng.randint(0, 10_000) for c in range(n_cols - 2))
+        ws.append(row)
+    out.save()
+    return path
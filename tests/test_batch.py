@@ -0,0 +1,72 @@
+import argparse
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+
+from audit_common.batch import SUMMARY_NAME, discover_inputs, run_batch
+
+
+def run(args):
+    # Stands in for a program: the input's text says how the run ends.
+    outcome = Path(args.input).read_text(encoding="utf-8").strip()
+    if outcome == "raise":
+        raise RuntimeError("worker crashed")
+    if outcome in ("ok", "error"):
+        wb = Workbook()
+        wb.active.append([outcome])
+        wb.save(args.output)
+    print(f"{outcome} run")
+    return 0 if outcome == "ok" else 1
+
+
+def batch(tmp_path, files):
+    folder = tmp_path / "clients"
+    folder.mkdir()
+    for name, outcome in files.items():
+        (folder / name).write_text(outcome, encoding="utf-8")
+    args = argparse.Namespace(batch_dir=str(folder), batch_output="", workers=2, input="", output="")
+    code = run_batch(run, args)
+    wb = load_workbook(folder / "output" / SUMMARY_NAME, read_only=True)
+    rows = list(wb["Runs"].iter_rows(min_row=2, values_only=True))
+    wb.close()
+    return code, folder, {Path(row[0]).name: row for row in rows}
+
+
+def test_statuses_and_output_names(tmp_path):
+    files = {"a.csv": "ok", "b.csv": "error", "c.csv": "fail", "d.csv": "raise"}
+    code, folder, rows = batch(tmp_path, files)
+
+    assert code == 1
+    assert list(rows) == ["a.csv", "b.csv", "c.csv", "d.csv"]
+    assert {name: row[2] for name, row in rows.items()} == {
+        "a.csv": "OK",
+        "b.csv": "ERROR",
+        "c.csv": "FAILED",
+        "d.csv": "FAILED",
+    }
+    assert rows["a.csv"][1] == str(folder / "output" / "a_output.xlsx")
+    assert rows["b.csv"][1] == str(folder / "output" / "b_output.xlsx")
+    assert rows["c.csv"][1] is None
+    assert rows["b.csv"][5] == "error run"
+    assert "RuntimeError: worker crashed" in rows["d.csv"][5]
+    assert sorted(path.name for path in (folder / "output").iterdir()) == [
+        "a_output.xlsx",
+        "b_output.xlsx",
+        SUMMARY_NAME,
+    ]
+
+
+def test_inputs_that_share_an_output_name_are_reported(tmp_path):
+    code, folder, rows = batch(tmp_path, {"a.csv": "ok", "a.xlsx": "ok", "b.csv": "ok"})
+
+    assert code == 1
+    assert [rows[name][2] for name in ("a.csv", "a.xlsx", "b.csv")] == ["FAILED", "FAILED", "OK"]
+    assert "a.csv and a.xlsx would both write a_output.xlsx" in rows["a.csv"][5]
+    assert not (folder / "output" / "a_output.xlsx").exists()
+
+
+def test_previous_outputs_and_lock_files_are_not_inputs(tmp_path):
+    for name in ("a.xlsx", "~$a.xlsx", "a_output.xlsx", SUMMARY_NAME, "notes.txt"):
+        (tmp_path / name).write_text("", encoding="utf-8")
+
+    assert [path.name for path in discover_inputs(tmp_path)] == ["a.xlsx"]
@@ -0,0 +1,135 @@
+import os
+
+from audit_common.cache import MemoryRowCache, RowCache
+from audit_common.reader import _open_source, open_workbook
+
+
+def counting_opener(calls):
+    def opener(path):
+        calls.append(path)
+        return _open_source(path)
+
+    return opener
+
+
+def read_all(cache, path, calls):
+    wb = cache.open(path, counting_opener(calls))
+    try:
+        return list(wb.active.iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+def test_unchanged_input_is_read_from_the_cache(tmp_path):
+    source = tmp_path / "in.csv"
+    source.write_text("name,amount\nA,1\nB,2\n", encoding="utf-8")
+    cache = RowCache(tmp_path / "cache", 1 << 20)
+    calls = []
+
+    first = read_all(cache, source, calls)
+    assert read_all(cache, source, calls) == first
+    assert len(calls) == 1
+    assert first[1:] == [("A", "1"), ("B", "2")]
+
+
+def test_changed_content_misses_even_with_the_same_mtime(tmp_path):
+    source = tmp_path / "in.csv"
+    source.write_text("name,amount\nA,1\n", encoding="utf-8")
+    stat = source.stat()
+    cache = RowCache(tmp_path / "cache", 1 << 20)
+    calls = []
+    read_all(cache, source, calls)
+
+    source.write_text("name,amount\nA,9\n", encoding="utf-8")
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert read_all(cache, source, calls)[1:] == [("A", "9")]
+    assert len(calls) == 2
+
+
+def test_partly_read_sheet_is_not_committed(tmp_path):
+    source = tmp_path / "in.csv"
+    source.write_text("name,amount\n" + "".join(f"P{i},{i}\n" for i in range(10)), encoding="utf-8")
+    folder = tmp_path / "cache"
+    cache = RowCache(folder, 1 << 20)
+    calls = []
+
+    wb = cache.open(source, counting_opener(calls))
+    rows = wb.active.iter_rows(min_row=2, values_only=True)
+    assert next(rows) == ("P0", "0")
+    rows.close()
+    wb.close()
+
+    assert not list(folder.glob("*.rows"))
+    assert not list(folder.glob("*.tmp"))
+    assert len(read_all(cache, source, calls)) == 11
+    assert len(list(folder.glob("*.rows"))) == 1
+    assert len(calls) == 2
+
+
+def test_evict_drops_least_recently_used_entries(tmp_path):
+    folder = tmp_path / "cache"
+    folder.mkdir()
+    for age, name in enumerate(["new.rows", "old.rows", "middle.sheets"]):
+        entry = folder / name
+        entry.write_bytes(b"x" * 100)
+        when = 1_000_000 - age * 1000
+        os.utime(entry, (when, when))
+    (folder / "keep.tmp").write_bytes(b"x" * 1000)
+
+    RowCache(folder, 150).evict()
+
+    assert sorted(entry.name for entry in folder.iterdir()) == ["keep.tmp", "new.rows"]
+
+
+def test_loading_an_entry_marks_it_recently_used(tmp_path):
+    folder = tmp_path / "cache"
+    cache = RowCache(folder, 1 << 20)
+    sources = []
+    for name in ("a.csv", "b.csv"):
+        source = tmp_path / name
+        source.write_text(f"name\n{name}\n", encoding="utf-8")
+        sources.append(source)
+        read_all(cache, source, [])
+    for entry in folder.iterdir():
+        os.utime(entry, (1_000_000, 1_000_000))
+
+    read_all(cache, sources[0], [])
+    size = sum(entry.stat().st_size for entry in folder.iterdir())
+    cache.max_bytes = size // 2 + 1
+    cache.evict()
+
+    calls = []
+    read_all(cache, sources[0], calls)
+    assert calls == []
+    read_all(cache, sources[1], calls)
+    assert calls == [sources[1]]
+
+
+def test_memory_cache_keeps_the_most_recent_rows(tmp_path):
+    cache = MemoryRowCache(max_rows=6)
+    sources = []
+    for name in ("a.csv", "b.csv", "c.csv"):
+        source = tmp_path / name
+        source.write_text(f"name\n{name}\n{name}\n", encoding="utf-8")
+        sources.append(source)
+        read_all(cache, source, [])
+
+    calls = []
+    read_all(cache, sources[2], calls)
+    read_all(cache, sources[1], calls)
+    assert calls == []
+    read_all(cache, sources[0], calls)
+    assert calls == [sources[0]]
+
+
+def test_open_workbook_uses_the_cache_it_is_given(tmp_path):
+    source = tmp_path / "in.csv"
+    source.write_text("name\nA\n", encoding="utf-8")
+    cache = RowCache(tmp_path / "cache", 1 << 20)
+
+    for _ in range(2):
+        wb = open_workbook(source, cache)
+        assert list(wb.active.iter_rows(values_only=True)) == [("name",), ("A",)]
+        wb.close()
+    assert len(list((tmp_path / "cache").glob("*.rows"))) == 1
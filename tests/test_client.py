@@ -0,0 +1,44 @@
+import json
+import socket
+import threading
+
+from audit_common import client
+
+
+def use_state(monkeypatch, tmp_path, port):
+    monkeypatch.delenv("LOCALAPPDATA", raising=False)
+    monkeypatch.delenv(client.DISABLE_ENV, raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = client.state_path()
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({"port": port, "token": "t"}), encoding="utf-8")
+
+
+def test_unreachable_service_falls_back(monkeypatch, tmp_path):
+    with socket.socket() as probe:
+        probe.bind((client.HOST, 0))
+        port = probe.getsockname()[1]
+    use_state(monkeypatch, tmp_path, port)
+    assert client.submit("rename", []) is None
+
+
+def test_failure_after_sending_is_not_rerun(monkeypatch, tmp_path, capsys):
+    # The service accepts the job and drops the connection without replying.
+    server = socket.socket()
+    server.bind((client.HOST, 0))
+    server.listen(1)
+
+    def drop():
+        connection, _ = server.accept()
+        connection.recv(65536)
+        connection.close()
+
+    thread = threading.Thread(target=drop)
+    thread.start()
+    use_state(monkeypatch, tmp_path, server.getsockname()[1])
+    try:
+        assert client.submit("rename", ["--dry-run"]) == 1
+    finally:
+        thread.join()
+        server.close()
+    assert "ERROR" in capsys.readouterr().err
@@ -0,0 +1,33 @@
+import pytest
+
+from audit_common.programs import load_program
+from audit_common.tabular import open_csv
+
+
+def read_parameters(tmp_path, text):
+    statements = load_program("statements")
+    source = tmp_path / "Parameters.csv"
+    source.write_text(text, encoding="utf-8")
+    return statements.read_parameters(open_csv(source), "Parameters")
+
+
+def test_csv_parameters_parse_like_amounts(tmp_path):
+    params = read_parameters(tmp_path, 'key,value\n期初现金,"1,000"\ncash_end,(50)\ntolerance,0.5\nnote,"1,000"\n')
+
+    assert params["cash_begin"] == 1000.0
+    assert params["cash_end"] == -50.0
+    assert params["tolerance"] == 0.5
+    # Only the known amounts are parsed.
+    assert params["note"] == "1,000"
+
+
+def test_blank_parameter_falls_back_to_the_default(tmp_path):
+    params = read_parameters(tmp_path, "key,value\ntolerance,\ncash_begin\n")
+
+    assert params["tolerance"] is None
+    assert params["cash_begin"] is None
+
+
+def test_invalid_parameter_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Invalid tolerance in Parameters: one cent"):
+        read_parameters(tmp_path, "key,value\ntolerance,one cent\n")
@@ -0,0 +1,211 @@
+import io
+import zipfile
+
+from docx import Document
+from openpyxl import load_workbook
+
+from audit_common.programs import load_program
+
+
+def test_placeholder_split_across_runs_falls_back_to_docx(tmp_path):
+    confirm = load_program("confirm")
+    doc = Document()
+    paragraph = doc.add_paragraph("To: ")
+    paragraph.add_run("{")
+    paragraph.add_run("{party_name}}")
+    template = tmp_path / "template.docx"
+    doc.save(template)
+
+    renderer = confirm.load_renderer(template, "ooxml")
+
+    assert renderer.engine == "docx"
+    letter = Document(io.BytesIO(renderer.to_bytes({"party_name": "ACME"})))
+    assert letter.paragraphs[0].text == "To: ACME"
+
+
+AMOUNTS = [5000, 120, 80, 15000, 300, 700, 2500, 60, 40000, 900, 1100, 350, 10, 4500, 220]
+
+
+def test_mus_sample_is_repeatable_for_a_seed():
+    confirm = load_program("confirm")
+    rows = [{"amount": amount} for amount in AMOUNTS]
+
+    selected, summary, _ = confirm.draw_sample(rows, "mus", 5, 0, 3, 1)
+
+    assert selected == [(0, "MUS"), (3, "MUS"), (8, "MUS x3")]
+    assert dict(summary)["Sampling interval"] == sum(AMOUNTS) / 5
+    assert confirm.draw_sample(rows, "mus", 5, 0, 3, 1)[0] == selected
+
+
+def test_mus_always_selects_items_at_or_above_the_interval():
+    confirm = load_program("confirm")
+    rows = [{"amount": amount} for amount in AMOUNTS]
+    interval = sum(AMOUNTS) / 5
+    large = {idx for idx, amount in enumerate(AMOUNTS) if amount >= interval}
+
+    assert large == {3, 8}
+    for seed in range(50):
+        selected, _, _ = confirm.draw_sample(rows, "mus", 5, 0, 3, seed)
+        assert large <= {idx for idx, _ in selected}
+
+
+def test_stratified_sample_counts_per_stratum():
+    confirm = load_program("confirm")
+    # Three strata of 4,000 each: 40 x 100, 8 x 500 and 4 x 1,000, plus a zero balance.
+    amounts = [100] * 40 + [500] * 8 + [1000] * 4 + [0]
+    rows = [{"amount": amount} for amount in amounts]
+
+    selected, summary, table = confirm.draw_sample(rows, "stratified", 9, 0, 3, 7)
+
+    assert [row[:4] for row in table] == [[1, 100, 100, 40], [2, 500, 500, 8], [3, 1000, 1000, 4]]
+    assert [row[5] for row in table] == [3, 3, 3]
+    for stratum, amount in ((1, 100), (2, 500), (3, 1000)):
+        picked = [idx for idx, note in selected if note == f"Stratum {stratum}"]
+        assert len(picked) == 3
+        assert all(amounts[idx] == amount for idx in picked)
+    assert dict(summary)["Selected items"] == 9
+
+
+def test_top_sample_takes_the_largest_balances():
+    confirm = load_program("confirm")
+    rows = [{"amount": amount} for amount in AMOUNTS]
+
+    selected, summary, _ = confirm.draw_sample(rows, "top", 5, 2, 3, 1)
+
+    assert [idx for idx, note in selected if note == "Top"] == [3, 8]
+    assert len([idx for idx, note in selected if note == "Random"]) == 3
+    assert dict(summary)["Top threshold"] == 15000
+
+
+def letter_run(tmp_path, capsys, rows, *options):
+    confirm = load_program("confirm")
+    template = tmp_path / "template.docx"
+    if not template.exists():
+        confirm.make_template(str(template))
+    source = tmp_path / "parties.csv"
+    source.write_text(
+        "party_name,amount,balance_date\n" + "".join(f"{name},{amount},2024-12-31\n" for name, amount in rows),
+        encoding="utf-8",
+    )
+    capsys.readouterr()
+    argv = ["--input", str(source), "--template", str(template), "--output", str(tmp_path / "out"), *options]
+    assert confirm.main(argv) == 0
+    return capsys.readouterr().out
+
+
+def letter_files(folder):
+    return sorted(path.name for path in folder.glob("*.docx"))
+
+
+def test_unchanged_rerun_writes_no_letters(tmp_path, capsys):
+    rows = [("Alpha", 100), ("Beta", 200)]
+    assert "Generated 2 letter(s)" in letter_run(tmp_path, capsys, rows)
+    alpha = tmp_path / "out" / "Alpha.docx"
+    written = alpha.stat().st_mtime_ns
+
+    assert "Up to date" in letter_run(tmp_path, capsys, rows)
+    # Without the run manifest, the letter manifest still skips every letter.
+    (tmp_path / "out.manifest.json").unlink()
+    assert "Generated 0 of 2 letter(s)" in letter_run(tmp_path, capsys, rows)
+    assert alpha.stat().st_mtime_ns == written
+
+
+def test_changed_row_rewrites_only_its_letter(tmp_path, capsys):
+    letter_run(tmp_path, capsys, [("Alpha", 100), ("Beta", 200)])
+    alpha = tmp_path / "out" / "Alpha.docx"
+    written = alpha.stat().st_mtime_ns
+
+    out = letter_run(tmp_path, capsys, [("Alpha", 100), ("Beta", 250)])
+
+    assert "Generated 1 of 2 letter(s)" in out
+    assert "(1 unchanged, 0 removed)" in out
+    assert alpha.stat().st_mtime_ns == written
+    text = "\n".join(p.text for p in Document(tmp_path / "out" / "Beta.docx").paragraphs)
+    assert "250.00" in text
+
+
+def test_removed_party_loses_its_letter(tmp_path, capsys):
+    letter_run(tmp_path, capsys, [("Alpha", 100), ("Beta", 200)])
+
+    out = letter_run(tmp_path, capsys, [("Alpha", 100)])
+
+    assert "(1 unchanged, 1 removed)" in out
+    assert letter_files(tmp_path / "out") == ["Alpha.docx"]
+
+
+def test_switching_between_loose_files_and_the_archive(tmp_path, capsys):
+    rows = [("Alpha", 100), ("Beta", 200)]
+    folder = tmp_path / "out"
+    letter_run(tmp_path, capsys, rows)
+    loose = {name: (folder / name).read_bytes() for name in letter_files(folder)}
+
+    out = letter_run(tmp_path, capsys, rows, "--archive")
+
+    assert "removed 2 file(s) left by the previous loose output" in out
+    assert letter_files(folder) == []
+    with zipfile.ZipFile(folder / "letters.zip") as archive:
+        assert {name: archive.read(name) for name in archive.namelist()} == loose
+
+    out = letter_run(tmp_path, capsys, [("Alpha", 100), ("Beta", 250)], "--archive")
+    assert "Generated 1 of 2 letter(s)" in out
+    with zipfile.ZipFile(folder / "letters.zip") as archive:
+        assert archive.read("Alpha.docx") == loose["Alpha.docx"]
+        assert archive.read("Beta.docx") != loose["Beta.docx"]
+
+    out = letter_run(tmp_path, capsys, rows)
+    assert "removed 1 file(s) left by the previous archive output" in out
+    assert not (folder / "letters.zip").exists()
+    assert {name: (folder / name).read_bytes() for name in letter_files(folder)} == loose
+
+
+def merge_run(tmp_path, count, *options):
+    confirm = load_program("confirm")
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "Ref: {{party_name}}"
+    doc.sections[0].footer.paragraphs[0].text = "Balance at {{balance_date}}"
+    doc.add_paragraph("Dear {{party_name}}, your balance is {{amount_formatted}}.")
+    template = tmp_path / "template.docx"
+    doc.save(template)
+    source = tmp_path / "parties.csv"
+    source.write_text(
+        "party_name,amount,balance_date\n" + "".join(f"P{i},{i + 1}00,2024-12-31\n" for i in range(count)),
+        encoding="utf-8",
+    )
+    output = tmp_path / "out"
+    assert confirm.main(["--input", str(source), "--template", str(template), "--output", str(output), *options]) == 0
+    wb = load_workbook(output / "index.xlsx", read_only=True)
+    pages = list(wb["Pages"].iter_rows(min_row=2, values_only=True))
+    wb.close()
+    return output, pages
+
+
+def test_merged_document_has_a_section_and_header_per_letter(tmp_path):
+    output, pages = merge_run(tmp_path, 3, "--merge")
+
+    merged = Document(output / "letters.docx")
+    assert [p.text for p in merged.paragraphs if p.text] == [
+        "Dear P0, your balance is 100.00.",
+        "Dear P1, your balance is 200.00.",
+        "Dear P2, your balance is 300.00.",
+    ]
+    assert len(merged.sections) == 3
+    assert [s.header.paragraphs[0].text for s in merged.sections] == ["Ref: P0", "Ref: P1", "Ref: P2"]
+    assert [str(s.header.part.partname) for s in merged.sections] == [f"/word/header1_{n}.xml" for n in (1, 2, 3)]
+    assert [str(s.footer.part.partname) for s in merged.sections] == [f"/word/footer1_{n}.xml" for n in (1, 2, 3)]
+    assert pages == [(f"P{i}", "letters.docx", i + 1, i + 1) for i in range(3)]
+
+
+def test_pages_per_file_splits_the_merged_documents(tmp_path):
+    output, pages = merge_run(tmp_path, 5, "--pages-per-file", "2")
+
+    assert sorted(path.name for path in output.glob("*.docx")) == [f"letters_00{n}.docx" for n in (1, 2, 3)]
+    assert [row[1:] for row in pages] == [
+        ("letters_001.docx", 1, 1),
+        ("letters_001.docx", 2, 2),
+        ("letters_002.docx", 1, 1),
+        ("letters_002.docx", 2, 2),
+        ("letters_003.docx", 1, 1),
+    ]
+    last = Document(output / "letters_003.docx")
+    assert [s.header.paragraphs[0].text for s in last.sections] == ["Ref: P4"]
+    assert str(last.sections[0].header.part.partname) == "/word/header1_1.xml"
@@ -0,0 +1,211 @@
+from datetime import date, timedelta
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from audit_common.programs import load_program
+from benchmarks.bench_lease_engines import make_portfolio
+
+
+LEASE_CSV_HEADER = "contract_id,lease_start,lease_end,payment_amount,payment_frequency,discount_rate,payment_timing,currency"
+
+
+def test_csv_amount_with_thousands_separator(tmp_path):
+    lease = load_program("lease")
+    source = tmp_path / "leases.csv"
+    source.write_text(f'{LEASE_CSV_HEADER}\nL1,2024-01-01,2024-12-31,"1,000.00",M,5,end,CNY\n', encoding="utf-8")
+    output = tmp_path / "out.xlsx"
+
+    assert lease.main(["--input", str(source), "--output", str(output), "--force"]) == 0
+
+    wb = load_workbook(output, read_only=True)
+    summary = list(wb["Summary"].iter_rows(min_row=2, values_only=True))
+    schedule = list(wb["Schedule"].iter_rows(min_row=2, values_only=True))
+    wb.close()
+    assert summary[0][2] == 1000.0
+    assert len(schedule) == 11
+    assert all(row[4] == 1000.0 for row in schedule)
+
+
+def test_numpy_engine_matches_scalar():
+    pytest.importorskip("numpy")
+    lease = load_program("lease")
+    leases = make_portfolio(300)
+
+    paired = zip(lease.iter_results(leases), lease.iter_vector_results(leases))
+    for scalar, vector in paired:
+        assert vector["periods"] == scalar["periods"]
+        for key in ("pv", "total_interest", "ending_balance"):
+            assert vector[key] == pytest.approx(scalar[key], rel=1e-6, abs=1e-6)
+        scalar_rows, vector_rows = list(scalar["rows"]), list(vector["rows"])
+        assert len(vector_rows) == len(scalar_rows)
+        for left, right in zip(scalar_rows, vector_rows):
+            assert list(right[:2]) == list(left[:2])
+            assert list(right[2:]) == pytest.approx(list(left[2:]), rel=1e-6, abs=1e-6)
+
+
+def rollforward_rows(tmp_path, capsys, lines, *options):
+    lease = load_program("lease")
+    source = tmp_path / "leases.csv"
+    source.write_text("\n".join([LEASE_CSV_HEADER, *lines]) + "\n", encoding="utf-8")
+    output = tmp_path / "out.xlsx"
+
+    argv = ["--input", str(source), "--output", str(output), "--rollforward", "A", "--force", *options]
+    assert lease.main(argv) == 0
+
+    wb = load_workbook(output, read_only=True)
+    rows = list(wb["RollForward"].iter_rows(min_row=2, values_only=True))
+    wb.close()
+    return rows, capsys.readouterr().out
+
+
+TWO_CURRENCIES = ["L1,2024-01-01,2026-12-31,1000,M,5,end,CNY", "L2,2024-01-01,2026-12-31,1000,M,5,end,USD"]
+
+
+def test_rollforward_has_no_total_without_reporting_currency(tmp_path, capsys):
+    rows, out = rollforward_rows(tmp_path, capsys, TWO_CURRENCIES)
+
+    assert {row[0] for row in rows} == {"CNY", "USD"}
+    assert "no portfolio total" in out
+
+
+def test_rollforward_total_converts_to_reporting_currency(tmp_path, capsys):
+    rows, _ = rollforward_rows(tmp_path, capsys, TWO_CURRENCIES, "--reporting-currency", "cny", "--fx-rates", "USD=7")
+
+    currency = [row[2:] for row in rows if row[0] == "CNY"]
+    total = [row for row in rows if row[0] == "Total (CNY)"]
+    assert [row[1] for row in total] == ["2024", "2025", "2026"]
+    # The USD lease has the same terms, so the total is eight times the CNY one.
+    for row, expected in zip(total, currency):
+        assert list(row[2:]) == pytest.approx([8 * value for value in expected])
+
+
+def test_rollforward_total_needs_a_rate_for_every_currency(tmp_path, capsys):
+    lease = load_program("lease")
+    source = tmp_path / "leases.csv"
+    source.write_text("\n".join([LEASE_CSV_HEADER, *TWO_CURRENCIES]) + "\n", encoding="utf-8")
+    argv = ["--input", str(source), "--output", str(tmp_path / "out.xlsx"), "--rollforward", "A"]
+
+    assert lease.main([*argv, "--reporting-currency", "CNY", "--force"]) == 1
+    assert "No --fx-rates into CNY for: USD" in capsys.readouterr().err
+
+
+def test_rou_cost_includes_remeasurement(tmp_path):
+    lease = load_program("lease")
+    source = tmp_path / "leases.xlsx"
+    wb = Workbook()
+    wb.active.title = "Leases"
+    wb.active.append(LEASE_CSV_HEADER.split(","))
+    wb.active.append(["L1", "2024-01-01", "2026-12-31", 1000, "M", 5, "end", "CNY"])
+    mods = wb.create_sheet("Modifications")
+    mods.append(["contract_id", "effective_date", "new_payment"])
+    mods.append(["L1", "2025-01-01", 1500])
+    wb.save(source)
+    output = tmp_path / "out.xlsx"
+
+    assert lease.main(["--input", str(source), "--output", str(output), "--force"]) == 0
+
+    wb = load_workbook(output, read_only=True)
+    summary = list(wb["Summary"].iter_rows(min_row=2, values_only=True))
+    adjustments = list(wb["Modifications"].iter_rows(min_row=2, values_only=True))
+    wb.close()
+    assert adjustments[0][10] > 0
+    assert summary[0][8] == pytest.approx(summary[0][5] + adjustments[0][10])
+
+
+def test_as_of_balances_match_the_schedule():
+    lease = load_program("lease")
+    leases = make_portfolio(40)
+
+    for item, result in zip(leases, lease.iter_results(leases)):
+        rows = list(result["rows"])
+        # The day before and the day of each payment, and the first day after the last one.
+        dates = [day for row in rows for day in (row[1] - timedelta(days=1), row[1])]
+        dates.append(rows[-1][1] + timedelta(days=1))
+        for as_of, made, balance, interest, _, _, status in lease.lease_balances(item, dates):
+            if as_of < item["lease_start"]:
+                assert (made, balance, status) == (0, 0.0, "not started")
+                continue
+            paid = [row for row in rows if row[1] <= as_of]
+            assert made == len(paid)
+            assert balance == pytest.approx(paid[-1][6] if paid else result["pv"], abs=0.01)
+            assert interest == pytest.approx(sum(row[4] for row in paid), abs=0.01)
+            assert status == ("ended" if made == len(rows) else "active")
+
+
+def test_as_of_flags_leases_not_yet_started(tmp_path):
+    lease = load_program("lease")
+    source = tmp_path / "leases.csv"
+    source.write_text(f"{LEASE_CSV_HEADER}\nL1,2025-01-01,2025-12-31,1000,M,5,end,CNY\n", encoding="utf-8")
+    output = tmp_path / "out.xlsx"
+
+    argv = ["--input", str(source), "--output", str(output), "--as-of", "2024-12-31,2025-06-30,2025-12-31"]
+    assert lease.main([*argv, "--force"]) == 0
+
+    wb = load_workbook(output, read_only=True)
+    rows = list(wb["Balances"].iter_rows(min_row=2, values_only=True))
+    wb.close()
+    assert [(row[3], row[8]) for row in rows] == [(0, "not started"), (5, "active"), (11, "ended")]
+
+
+@pytest.mark.parametrize("option", [["--rollforward", "A"], ["--engine", "numpy"]])
+def test_as_of_rejects_options_it_ignores(tmp_path, capsys, option):
+    lease = load_program("lease")
+
+    with pytest.raises(SystemExit):
+        lease.main(["--input", str(tmp_path / "leases.csv"), "--as-of", "2024-12-31", *option])
+    assert "does not apply to --as-of" in capsys.readouterr().err
+
+
+def test_two_modifications_match_a_hand_computed_schedule(tmp_path):
+    lease = load_program("lease")
+    source = tmp_path / "leases.xlsx"
+    wb = Workbook()
+    wb.active.title = "Leases"
+    wb.active.append(LEASE_CSV_HEADER.split(","))
+    wb.active.append(["L1", "2024-01-01", "2025-01-01", 1000, "M", 12, "end", "CNY"])
+    mods = wb.create_sheet("Modifications")
+    mods.append(["contract_id", "effective_date", "new_payment", "new_rate"])
+    mods.append(["L1", "2024-05-01", 1500, None])
+    mods.append(["L1", "2024-09-15", None, 24])
+    wb.save(source)
+    output = tmp_path / "out.xlsx"
+
+    assert lease.main(["--input", str(source), "--output", str(output), "--force"]) == 0
+
+    wb = load_workbook(output, read_only=True)
+    schedule = list(wb["Schedule"].iter_rows(min_row=2, values_only=True))
+    adjustments = list(wb["Modifications"].iter_rows(min_row=2, values_only=True))
+    wb.close()
+
+    # Twelve payments at month ends, 1% a month: three of 1,000, then 1,500;
+    # from the ninth payment the rate is 2% a month on the four left.
+    def annuity(payment, rate, periods):
+        return payment * (1 - (1 + rate) ** -periods) / rate
+
+    terms = [(1000, 0.01, 3), (1500, 0.01, 5), (1500, 0.02, 4)]
+    expected, remeasured = [], []
+    balance, left = annuity(1000, 0.01, 12), 12
+    for payment, rate, count in terms:
+        if expected:
+            remeasured.append((balance, annuity(payment, rate, left)))
+            balance = remeasured[-1][1]
+        for _ in range(count):
+            interest = balance * rate
+            balance += interest - payment
+            expected.append((len(expected) + 1, payment, interest, balance))
+        left -= count
+
+    # After three payments the liability is the nine left at 1%: 1,000 x 8.56602.
+    assert remeasured[0] == pytest.approx((8566.02, 12849.03), abs=0.01)
+    assert [row[2].date() for row in schedule] == [date(2024 + month // 12, month % 12 + 1, 1) for month in range(1, 13)]
+    for row, (period, payment, interest, closing) in zip(schedule, expected):
+        assert row[1] == period
+        assert row[4] == payment
+        assert row[5] == pytest.approx(interest, abs=0.01)
+        assert row[7] == pytest.approx(closing, abs=0.01)
+    assert schedule[-1][7] == pytest.approx(0, abs=0.01)
+    assert [row[2] for row in adjustments] == [4, 9]
+    for row, (carrying, value) in zip(adjustments, remeasured):
+        assert row[3] == pytest.approx(carrying, abs=0.01)
+        assert row[4] == pytest.approx(value, abs=0.01)
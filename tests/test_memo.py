@@ -0,0 +1,117 @@
+from argparse import Namespace
+
+import pytest
+
+from audit_common.memo import CACHED_PREFIX, RunManifest
+from audit_common.programs import load_program
+
+
+@pytest.fixture
+def run(tmp_path, capsys):
+    source = tmp_path / "input.csv"
+    source.write_text("a,b\n1,2\n", encoding="utf-8")
+    script = tmp_path / "program.py"
+    script.write_text("print('v1')\n", encoding="utf-8")
+    output = tmp_path / "output.xlsx"
+
+    def run(**options):
+        # Returns the cached exit code, or None after "computing" the output.
+        args = Namespace(input=str(source), sheet="Sheet1", force=False, **options)
+        manifest = RunManifest("demo", script, args, [source], output)
+        cached = manifest.cached_exit_code()
+        if cached is None:
+            output.write_bytes(b"result of " + source.read_bytes())
+            manifest.save()
+        return cached
+
+    run.source, run.script, run.output = source, script, output
+    run.capsys = capsys
+    return run
+
+
+def test_unchanged_rerun_is_served_from_the_manifest(run):
+    assert run() is None
+    assert run() == 0
+    assert CACHED_PREFIX in run.capsys.readouterr().out
+
+
+def test_changed_input_forces_a_rerun(run):
+    run()
+    run.source.write_text("a,b\n1,3\n", encoding="utf-8")
+
+    assert run() is None
+    assert run() == 0
+
+
+def test_changed_argument_forces_a_rerun(run):
+    run(rate=5)
+
+    assert run(rate=6) is None
+    assert run(rate=6) == 0
+
+
+def test_execution_options_do_not_force_a_rerun(run):
+    run(workers=1, profile="")
+
+    assert run(workers=4, profile="prof.json") == 0
+
+
+def test_changed_code_forces_a_rerun(run):
+    run()
+    run.script.write_text("print('v2')\n", encoding="utf-8")
+
+    assert run() is None
+
+
+def test_force_always_reruns(run):
+    run()
+
+    args = Namespace(input=str(run.source), sheet="Sheet1", force=True)
+    assert RunManifest("demo", run.script, args, [run.source], run.output).cached_exit_code() is None
+
+
+@pytest.mark.parametrize("damage", ["delete", "alter"])
+def test_missing_or_altered_output_is_not_reported_as_cached(run, damage):
+    run()
+    run.capsys.readouterr()
+    if damage == "delete":
+        run.output.unlink()
+    else:
+        run.output.write_bytes(b"edited by hand")
+
+    assert run() is None
+    assert CACHED_PREFIX not in run.capsys.readouterr().out
+    assert run.output.read_bytes().startswith(b"result of ")
+
+
+def test_recorded_exit_code_is_replayed(tmp_path, capsys):
+    source = tmp_path / "input.csv"
+    source.write_text("x\n", encoding="utf-8")
+    output = tmp_path / "out"
+    output.mkdir()
+    (output / "part.txt").write_text("done", encoding="utf-8")
+    args = Namespace(force=False)
+
+    RunManifest("demo", __file__, args, [source], output).save(exit_code=2)
+
+    assert RunManifest("demo", __file__, args, [source], output).cached_exit_code() == 2
+    (output / "extra.txt").write_text("new", encoding="utf-8")
+    assert RunManifest("demo", __file__, args, [source], output).cached_exit_code() is None
+
+
+def test_program_rerun_is_served_from_the_manifest(tmp_path, capsys):
+    lease = load_program("lease")
+    source = tmp_path / "leases.csv"
+    source.write_text(
+        "contract_id,lease_start,lease_end,payment_amount,payment_frequency,discount_rate,payment_timing\n"
+        "L1,2024-01-01,2024-12-31,1000,M,5,end\n",
+        encoding="utf-8",
+    )
+    argv = ["--input", str(source), "--output", str(tmp_path / "out.xlsx")]
+
+    assert lease.main(argv) == 0
+    assert CACHED_PREFIX not in capsys.readouterr().out
+    assert lease.main(argv) == 0
+    assert CACHED_PREFIX in capsys.readouterr().out
+    assert lease.main([*argv, "--sheet", "Other"]) == 0
+    assert CACHED_PREFIX not in capsys.readouterr().out
@@ -0,0 +1,50 @@
+from audit_common.reader import HeaderIndex, iter_records, normalize_header
+from audit_common.tabular import open_csv
+
+
+def test_exact_match_beats_an_earlier_partial_match():
+    index = HeaderIndex({"amount": ["amount", "金额"]})
+
+    assert index.resolve(["Original amount", "Amount"])["amount"] == 1
+
+
+def test_exact_matches_follow_the_alias_order():
+    index = HeaderIndex({"amount": ["amount", "金额"]})
+
+    assert index.resolve(["金额", "AMOUNT"])["amount"] == 1
+    assert index.resolve(["金额", "Balance"])["amount"] == 0
+
+
+def test_partial_match_takes_the_first_matching_header():
+    index = HeaderIndex({"amount": ["amount", "金额"]})
+
+    assert index.resolve(["期末金额", "Amount due", "期初金额"])["amount"] == 0
+
+
+def test_duplicate_headers_resolve_to_the_first():
+    index = HeaderIndex({"party_name": ["party_name", "单位名称"]})
+
+    assert index.resolve(["单位名称", "单位名称"])["party_name"] == 0
+
+
+def test_headers_are_normalized_before_matching():
+    index = HeaderIndex({"rate": ["rate(%)"], "date": ["期末日期"]})
+
+    assert normalize_header(" Rate （%） ") == "rate"
+    columns = index.resolve(["Rate （%）", "期末 日期"])
+    assert (columns["rate"], columns["date"]) == (0, 1)
+
+
+def test_missing_columns_and_short_rows(tmp_path):
+    index = HeaderIndex({"name": ["name"], "amount": ["amount"], "note": ["note"]})
+    columns = index.resolve(["amount", "name"])
+
+    assert columns.missing(["name", "note"]) == ["note"]
+    assert columns.has("name", "amount")
+    source = tmp_path / "rows.csv"
+    source.write_text("amount,name\n5,A\n,\n7\n", encoding="utf-8")
+    records = list(iter_records(open_csv(source).active, columns))
+    assert [(row_idx, tuple(record)) for row_idx, record in records] == [
+        (2, ("A", "5", None)),
+        (4, (None, "7", None)),
+    ]
@@ -0,0 +1,335 @@
+import os
+import re
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook
+
+from audit_common.programs import load_program
+
+
+def make_files(folder, names):
+    folder.mkdir(exist_ok=True)
+    for name in names:
+        (folder / name).write_text(name, encoding="utf-8")
+
+
+def interrupted_rename(rename, folder, plan, fail_at, monkeypatch):
+    # Path.rename fails on its fail_at-th call: the stage step makes one call
+    # per file, then the commit step one more per file.
+    original = Path.rename
+    calls = []
+
+    def flaky(self, target):
+        calls.append(self)
+        if len(calls) == fail_at:
+            raise OSError("network share dropped")
+        return original(self, target)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Path, "rename", flaky)
+        with pytest.raises(OSError):
+            journal = rename.RenameJournal(folder / rename.JOURNAL_NAME)
+            rename.rename_files(rename.validate_plan(plan, False), False, journal)
+
+
+def contents(folder):
+    return {path.name: path.read_text(encoding="utf-8") for path in folder.iterdir()}
+
+
+def names(folder):
+    return sorted(path.name for path in folder.iterdir())
+
+
+def contents_bytes(folder):
+    return {path.name: path.read_bytes() for path in folder.iterdir()}
+
+
+def test_resume_after_interrupt_between_stage_and_commit(tmp_path, monkeypatch, capsys):
+    rename = load_program("rename")
+    folder = tmp_path / "files"
+    make_files(folder, [f"a{i}.txt" for i in range(10)])
+    plan = [(folder / f"a{i}.txt", folder / f"b{i}.txt") for i in range(10)]
+
+    interrupted_rename(rename, folder, plan, 11, monkeypatch)
+    assert len([name for name in contents(folder) if ".renametmp_" in name]) == 10
+    assert rename.main(["--folder", str(folder)]) == 1
+
+    assert rename.main(["--folder", str(folder), "--resume"]) == 0
+    assert "Resumed 10 file(s)." in capsys.readouterr().out
+    assert contents(folder) == {f"b{i}.txt": f"a{i}.txt" for i in range(10)}
+
+
+def test_resume_after_some_commits(tmp_path, monkeypatch, capsys):
+    rename = load_program("rename")
+    folder = tmp_path / "files"
+    make_files(folder, [f"a{i}.txt" for i in range(10)])
+    plan = [(folder / f"a{i}.txt", folder / f"b{i}.txt") for i in range(10)]
+
+    interrupted_rename(rename, folder, plan, 14, monkeypatch)
+
+    assert rename.main(["--folder", str(folder), "--resume"]) == 0
+    assert "Resumed 7 file(s)." in capsys.readouterr().out
+    assert contents(folder) == {f"b{i}.txt": f"a{i}.txt" for i in range(10)}
+
+
+def test_rollback_after_some_commits(tmp_path, monkeypatch, capsys):
+    rename = load_program("rename")
+    folder = tmp_path / "files"
+    make_files(folder, [f"a{i}.txt" for i in range(10)])
+    plan = [(folder / f"a{i}.txt", folder / f"b{i}.txt") for i in range(10)]
+
+    interrupted_rename(rename, folder, plan, 14, monkeypatch)
+
+    assert rename.main(["--folder", str(folder), "--rollback"]) == 0
+    assert "Rolled back 10 file(s)." in capsys.readouterr().out
+    assert contents(folder) == {f"a{i}.txt": f"a{i}.txt" for i in range(10)}
+
+
+@pytest.mark.parametrize("fail_at", [2, 3, 4])
+def test_swap_recovers_either_way(tmp_path, monkeypatch, fail_at):
+    rename = load_program("rename")
+    for mode, expected in (("--resume", {"a.txt": "b.txt", "b.txt": "a.txt"}), ("--rollback", None)):
+        folder = tmp_path / mode.strip("-")
+        make_files(folder, ["a.txt", "b.txt"])
+        plan = [(folder / "a.txt", folder / "b.txt"), (folder / "b.txt", folder / "a.txt")]
+
+        interrupted_rename(rename, folder, plan, fail_at, monkeypatch)
+
+        assert rename.main(["--folder", str(folder), mode]) == 0
+        assert contents(folder) == (expected or {"a.txt": "a.txt", "b.txt": "b.txt"})
+
+
+def test_clean_run_leaves_no_journal(tmp_path, capsys):
+    rename = load_program("rename")
+    folder = tmp_path / "files"
+    make_files(folder, ["a.txt", "b.txt"])
+    mapping = tmp_path / "map.csv"
+    mapping.write_text("old_name,new_name\na.txt,b.txt\nb.txt,a.txt\n", encoding="utf-8")
+
+    assert rename.main(["--input", str(mapping), "--folder", str(folder)]) == 0
+
+    assert contents(folder) == {"a.txt": "b.txt", "b.txt": "a.txt"}
+    assert rename.main(["--folder", str(folder), "--rollback"]) == 1
+    assert "No interrupted rename" in capsys.readouterr().err
+
+
+def test_folder_index_reads_each_directory_once(tmp_path, monkeypatch):
+    rename = load_program("rename")
+    make_files(tmp_path, ["a.txt", "b.txt"])
+    (tmp_path / "sub").mkdir()
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    index = rename.FolderIndex()
+
+    assert index.lookup(rename.path_key(tmp_path / "a.txt")) is False
+    assert index.lookup(rename.path_key(tmp_path / "sub")) is True
+    assert index.lookup(rename.path_key(tmp_path / "missing.txt")) is None
+    assert index.lookup(rename.path_key(tmp_path / "nowhere" / "a.txt")) is None
+    assert len(scans) == 2
+
+
+def test_validate_plan_checks_the_whole_plan(tmp_path):
+    rename = load_program("rename")
+    make_files(tmp_path, ["a.txt", "b.txt", "c.txt"])
+    (tmp_path / "dir").mkdir()
+
+    def check(pairs, overwrite=False):
+        return rename.validate_plan([(tmp_path / old, tmp_path / new) for old, new in pairs], overwrite)
+
+    assert check([("a.txt", "a.txt"), ("a.txt", "x.txt")]) == [(tmp_path / "a.txt", tmp_path / "x.txt")]
+    with pytest.raises(FileNotFoundError):
+        check([("missing.txt", "x.txt")])
+    with pytest.raises(IsADirectoryError):
+        check([("dir", "x.txt")])
+    with pytest.raises(FileExistsError):
+        check([("a.txt", "b.txt")])
+    assert check([("a.txt", "b.txt")], overwrite=True)
+    with pytest.raises(IsADirectoryError):
+        check([("a.txt", "dir")], overwrite=True)
+    with pytest.raises(ValueError, match="Duplicate source"):
+        check([("a.txt", "x.txt"), ("a.txt", "y.txt")])
+    with pytest.raises(ValueError, match="Duplicate target"):
+        check([("a.txt", "x.txt"), ("b.txt", "x.txt")])
+    # A swap frees each target by the time it is written.
+    assert len(check([("a.txt", "b.txt"), ("b.txt", "c.txt"), ("c.txt", "a.txt")])) == 3
+
+
+def test_validate_plan_folds_case_like_the_filesystem(tmp_path, monkeypatch):
+    rename = load_program("rename")
+    make_files(tmp_path, ["a.txt", "b.txt"])
+
+    def normcase(path):
+        # Case-folds file names as Windows does, leaving tmp_path as it is.
+        return os.path.join(os.path.dirname(path), os.path.basename(path).lower())
+
+    monkeypatch.setattr(os.path, "normcase", normcase)
+
+    def check(pairs):
+        return rename.validate_plan([(tmp_path / old, tmp_path / new) for old, new in pairs], False)
+
+    with pytest.raises(FileExistsError):
+        check([("a.txt", "B.TXT")])
+    with pytest.raises(ValueError, match="Duplicate target"):
+        check([("a.txt", "X.txt"), ("b.txt", "x.TXT")])
+    with pytest.raises(ValueError, match="Duplicate source"):
+        check([("a.txt", "x.txt"), ("A.TXT", "y.txt")])
+    assert len(check([("A.txt", "b.txt"), ("B.txt", "a.txt")])) == 2
+
+
+def run_match_content(rename, tmp_path, folder, rows, *options):
+    mapping = tmp_path / "map.csv"
+    mapping.write_text("old_name,new_name\n" + "".join(f"{old},{new}\n" for old, new in rows), encoding="utf-8")
+    return rename.main(["--input", str(mapping), "--folder", str(folder), "--match-content", *options])
+
+
+def test_match_content_resolves_marked_hashes_and_reference_files(tmp_path, capsys):
+    rename = load_program("rename")
+    folder = tmp_path / "files"
+    folder.mkdir()
+    (folder / "scan_001.pdf").write_bytes(b"invoice")
+    (folder / "scan_002.pdf").write_bytes(b"contract")
+    reference = tmp_path / "last_year_contract.pdf"
+    reference.write_bytes(b"contract")
+    digest = rename.content_digest(folder / "scan_001.pdf")
+
+    rows = [(f"blake2:{digest.upper()}", "invoice.pdf"), (str(reference), "contract.pdf")]
+    assert run_match_content(rename, tmp_path, folder, rows) == 0
+
+    assert sorted(contents_bytes(folder)) == [".rename_hashes.json", "contract.pdf", "invoice.pdf"]
+    # The index remembers the old names for the next run.
+    assert run_match_content(rename, tmp_path, folder, [("scan_001.pdf", "invoice_2024.pdf")]) == 0
+    assert (folder / "invoice_2024.pdf").read_bytes() == b"invoice"
+
+
+def test_match_content_treats_unmarked_hex_names_as_files(tmp_path):
+    rename = load_program("rename")
+    folder = tmp_path / "files"
+    folder.mkdir()
+    (folder / "x.bin").write_bytes(b"x")
+    # A file whose name is the digest of x.bin.
+    name = rename.content_digest(folder / "x.bin")
+    (folder / name).write_bytes(b"named like a hash")
+
+    assert run_match_content(rename, tmp_path, folder, [(name, "renamed.bin")]) == 0
+
+    assert (folder / "renamed.bin").read_bytes() == b"named like a hash"
+    assert (folder / "x.bin").read_bytes() == b"x"
+
+
+def test_match_content_rejects_ambiguous_content(tmp_path, capsys):
+    rename = load_program("rename")
+    folder = tmp_path / "files"
+    folder.mkdir()
+    (folder / "a.pdf").write_bytes(b"same")
+    (folder / "b.pdf").write_bytes(b"same")
+    digest = rename.content_digest(folder / "a.pdf")
+
+    assert run_match_content(rename, tmp_path, folder, [(f"blake2:{digest}", "c.pdf")], "--dry-run") == 1
+    assert "matches several files" in capsys.readouterr().err
+
+
+def test_match_content_lists_the_folder_once_and_reuses_hashes(tmp_path, monkeypatch):
+    rename = load_program("rename")
+    folder = tmp_path / "files"
+    folder.mkdir()
+    for i in range(5):
+        (folder / f"f{i}.bin").write_bytes(bytes([i]) * 10)
+    digest = rename.content_digest(folder / "f3.bin")
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    hashed = []
+    digest_of = rename.content_digest
+    monkeypatch.setattr(rename, "content_digest", lambda path: hashed.append(path) or digest_of(path))
+
+    assert run_match_content(rename, tmp_path, folder, [(f"blake2:{digest}", "three.bin")]) == 0
+    assert len(scans) == 1
+    assert len(hashed) == 5
+
+    hashed.clear()
+    assert run_match_content(rename, tmp_path, folder, [(f"blake2:{digest}", "drei.bin")]) == 0
+    assert hashed == []
+    assert (folder / "drei.bin").read_bytes() == bytes([3]) * 10
+
+
+
+def test_rename_rule_applies_groups_prefix_and_suffix():
+    rename = load_program("rename")
+    lookups = rename.Lookups()
+    rule = rename.RenameRule(2, r"(?P<year>\d{4})-(?P<no>\d+)\.pdf", r"V\g<no>_\g<year>.pdf", "2024_", "_final")
+
+    assert rule.apply("2024-17.pdf", lookups) == "2024_V17_2024_final.pdf"
+    assert rule.apply("2024-17.pdf.bak", lookups) is None
+    assert rename.RenameRule(3, "", "", "old_", "").apply("any name.txt", lookups) == "old_any name.txt"
+    with pytest.raises(ValueError, match="Row 4 has an invalid pattern"):
+        rename.RenameRule(4, "(unclosed", "", "", "")
+    with pytest.raises(ValueError, match="invalid file name"):
+        rename.RenameRule(5, r"(\w+)\.txt", r"sub/\1.txt", "", "").apply("a.txt", lookups)
+
+
+def rules_workbook(path, rules, lookup_rows):
+    wb = Workbook()
+    wb.active.title = "Rules"
+    wb.active.append(["pattern", "replacement", "prefix", "suffix"])
+    for rule in rules:
+        wb.active.append(rule)
+    parties = wb.create_sheet("Parties")
+    for row in lookup_rows:
+        parties.append(row)
+    wb.save(path)
+
+
+def test_rules_fill_lookups_and_keep_files_in_their_folder(tmp_path, capsys):
+    rename = load_program("rename")
+    folder = tmp_path / "scans"
+    make_files(folder, ["007_scan.pdf", "012_scan.pdf", "readme.txt", "notes.doc"])
+    make_files(folder / "2023", ["007_scan.pdf"])
+    rules = tmp_path / "rules.xlsx"
+    rules_workbook(
+        rules,
+        [[r"(?P<voucher>\d+)_scan\.pdf", r"{party}_\g<voucher>.pdf", None, None], [r".*\.txt", None, "old_", None]],
+        # Voucher 7 typed into Excel as a number still matches "007".
+        [["voucher", "party"], [7, "ACME"], ["012", "Globex"]],
+    )
+
+    argv = ["--input", str(rules), "--folder", str(folder), "--rules"]
+    assert rename.main([*argv, "--recursive"]) == 0
+
+    assert names(folder) == ["2023", "ACME_007.pdf", "Globex_012.pdf", "notes.doc", "old_readme.txt"]
+    assert names(folder / "2023") == ["ACME_007.pdf"]
+
+
+def test_rules_without_recursive_leave_subfolders_alone(tmp_path):
+    rename = load_program("rename")
+    folder = tmp_path / "scans"
+    make_files(folder, ["a.txt"])
+    make_files(folder / "sub", ["b.txt"])
+    rules = tmp_path / "rules.xlsx"
+    rules_workbook(rules, [[None, None, "x_", None]], [])
+
+    assert rename.main(["--input", str(rules), "--folder", str(folder), "--rules"]) == 0
+
+    assert names(folder) == ["sub", "x_a.txt"]
+    assert names(folder / "sub") == ["b.txt"]
+
+
+@pytest.mark.parametrize(
+    "pattern, message",
+    [
+        (r"(?P<voucher>\d+)_scan\.pdf", r"No party for voucher=099 \(099_scan\.pdf\)"),
+        (r"(\d+)_scan\.pdf", r"needs a \(\?P<voucher>...\) group"),
+    ],
+)
+def test_rules_report_lookup_errors_before_renaming(tmp_path, capsys, pattern, message):
+    rename = load_program("rename")
+    folder = tmp_path / "scans"
+    make_files(folder, ["099_scan.pdf"])
+    rules = tmp_path / "rules.xlsx"
+    rules_workbook(rules, [[pattern, "{party}.pdf", None, None]], [["voucher", "party"], ["007", "ACME"]])
+
+    assert rename.main(["--input", str(rules), "--folder", str(folder), "--rules"]) == 1
+
+    assert re.search(message, capsys.readouterr().err)
+    assert names(folder) == ["099_scan.pdf"]
@@ -0,0 +1,74 @@
+import csv
+import io
+
+import pytest
+
+from audit_common.tabular import SNIFF_BYTES, open_tabular, sniff_encoding
+
+
+ROWS = [("科目编码", "科目名称", "期末余额"), ("1001", "库存现金", "1,000.00"), ("2202", "应付账款", None)]
+
+
+def write_csv(path, delimiter, encoding):
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=delimiter).writerows(ROWS)
+    path.write_bytes(buffer.getvalue().encode(encoding))
+
+
+def read_rows(path):
+    wb = open_tabular(path)
+    try:
+        return list(wb.active.iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+@pytest.mark.parametrize(
+    "encoding, expected",
+    [("utf-8", "utf-8"), ("utf-8-sig", "utf-8-sig"), ("utf-16", "utf-16"), ("gb18030", "gb18030")],
+)
+def test_encoding_is_sniffed(tmp_path, encoding, expected):
+    source = tmp_path / "tb.csv"
+    write_csv(source, ",", encoding)
+
+    assert sniff_encoding(source) == expected
+    assert read_rows(source) == ROWS
+
+
+def test_utf8_character_cut_by_the_sample_is_still_utf8(tmp_path):
+    source = tmp_path / "tb.csv"
+    # A three-byte character straddles the end of the sniffed sample.
+    source.write_bytes(b"a" * (SNIFF_BYTES - 1) + "现".encode("utf-8"))
+
+    assert sniff_encoding(source) == "utf-8"
+
+
+@pytest.mark.parametrize("delimiter", [",", "\t", ";", "|"])
+def test_delimiter_is_sniffed(tmp_path, delimiter):
+    source = tmp_path / "tb.csv"
+    write_csv(source, delimiter, "utf-8")
+
+    assert read_rows(source) == ROWS
+
+
+def test_sheet_is_named_after_the_file(tmp_path):
+    source = tmp_path / "Parameters.csv"
+    write_csv(source, ",", "utf-8")
+
+    wb = open_tabular(source)
+
+    assert wb.sheetnames == ["Parameters"]
+    assert "Parameters" in wb
+    assert list(wb["Parameters"].iter_rows(min_row=2, max_row=2, values_only=True)) == [ROWS[1]]
+    with pytest.raises(KeyError):
+        wb["Sheet1"]
+
+
+def test_parquet_rows_match_the_csv(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    source = tmp_path / "tb.parquet"
+    columns = list(zip(*ROWS[1:]))
+    pq.write_table(pa.table({name: list(values) for name, values in zip(ROWS[0], columns)}), source)
+
+    assert read_rows(source) == ROWS
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+from openpyxl import load_workbook
+
+from audit_common.writer import OutputWorkbook
+
+
+def test_saved_rows_round_trip(tmp_path):
+    path = tmp_path / "out.xlsx"
+
+    with OutputWorkbook(path) as out:
+        ws = out.add_sheet("Summary", ["name", "amount"])
+        ws.append(["A", 1.5])
+        out.save()
+
+    wb = load_workbook(path, read_only=True)
+    assert list(wb["Summary"].iter_rows(values_only=True)) == [("name", "amount"), ("A", 1.5)]
+    wb.close()
+
+
+def test_failed_save_removes_the_partial_file(tmp_path, monkeypatch):
+    path = tmp_path / "out.xlsx"
+    path.write_bytes(b"previous output")
+    out = OutputWorkbook(path)
+    out.add_sheet("Summary", ["name"])
+
+    def broken_save(filename):
+        with open(filename, "wb") as handle:
+            handle.write(b"PK half a zip")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(out._wb, "save", broken_save)
+    with pytest.raises(OSError, match="disk full"):
+        with out:
+            out.save()
+
+    assert not path.exists()
+
+
+def test_error_while_streaming_leaves_no_output_or_temp_files(tmp_path):
+    path = tmp_path / "out.xlsx"
+
+    with pytest.raises(ValueError):
+        with OutputWorkbook(path) as out:
+            ws = out.add_sheet("Schedule", ["period"])
+            for period in range(100):
+                ws.append([period])
+            writer = ws._writer
+            raise ValueError("bad row")
+
+    assert not path.exists()
+    assert ws.closed
+    assert not os.path.exists(writer.out)